@@ -0,0 +1,135 @@
+"""关键词直触发匹配的微基准：对比逐个触发词 find 的旧写法与预编译的 KeywordMatcher。
+
+用法：python benchmarks/bench_keyword_matcher.py [--messages 20000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from typing import Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plugin  # noqa: E402
+
+CHAT_LINES = (
+    "今天下班好早啊",
+    "有人打游戏吗",
+    "这个 bug 我看了一下午还是没找到原因",
+    "哈哈哈哈哈",
+    "明天几点开会？",
+    "我刚刚把 PR 提交了，帮忙 review 一下",
+    "外面下雨了记得带伞",
+    "晚饭吃什么",
+    "草，又掉线了",
+    "OK 没问题",
+    "周末去爬山吗，天气预报说是晴天",
+    "那个视频你看了没有，笑死我了",
+)
+TRIGGER_LINES = (
+    "再说一句：晚安，明天见",
+    "用语音说 大家早上好",
+    "帮我朗读一下这段话：春眠不觉晓，处处闻啼鸟。",
+    "来一句语音",
+    "你好呀，念出来",
+    "发语音 内容是今天也要加油哦",
+    "麻烦再来一句语音吧",
+)
+
+
+class _FakeVitsConfig:
+    keyword_trigger_phrases = ",".join(plugin._DEFAULT_KEYWORD_TRIGGER_PHRASES)
+    keyword_default_text = "行吧，就再说一句。"
+
+
+class _FakeConfig:
+    vits = _FakeVitsConfig()
+
+
+def build_corpus(count: int, trigger_ratio: float, seed: int = 20240501) -> list[str]:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        lines = TRIGGER_LINES if rng.random() < trigger_ratio else CHAT_LINES
+        corpus.append(rng.choice(lines))
+    return corpus
+
+
+def legacy_extract(raw_text: str, phrases_config: str, default_text: str) -> Optional[str]:
+    """改造前的实现：每条消息重新切分配置并逐个触发词查找。"""
+    text = (raw_text or "").strip()
+    if not text or text.startswith("/"):
+        return None
+    phrases = sorted({p.strip() for p in re.split(r"[,，\n]+", phrases_config) if p.strip()}, key=len, reverse=True)
+    lowered = text.lower()
+    for phrase in phrases:
+        index = lowered.find(phrase.lower())
+        if index < 0:
+            continue
+        payload = legacy_normalize(text[index + len(phrase) :])
+        if payload:
+            return payload
+        payload = legacy_normalize(text[:index], strip_leading=True)
+        if payload and not plugin.GPTSoVITSV2TTSPlugin._is_keyword_request_fluff(payload):
+            return payload
+        return default_text or None
+    return None
+
+
+def legacy_normalize(text: str, strip_leading: bool = False) -> str:
+    value = (text or "").strip().strip(plugin._KEYWORD_PUNCTUATION)
+    prefixes = plugin._KEYWORD_PAYLOAD_PREFIXES
+    if strip_leading:
+        prefixes = plugin._KEYWORD_LEADING_PREFIXES + prefixes
+    changed = True
+    while changed:
+        changed = False
+        for prefix in prefixes:
+            if value.startswith(prefix):
+                value = value[len(prefix) :].strip(plugin._KEYWORD_PUNCTUATION)
+                changed = True
+                break
+    return "" if plugin.GPTSoVITSV2TTSPlugin._is_keyword_request_fluff(value) else value
+
+
+def timed(func, corpus: list[str], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for message in corpus:
+            func(message)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--trigger-ratio", type=float, default=0.05)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.messages, args.trigger_ratio)
+    tts = plugin.GPTSoVITSV2TTSPlugin.__new__(plugin.GPTSoVITSV2TTSPlugin)
+    tts.config = _FakeConfig()
+    tts._keyword_matcher = plugin.KeywordMatcher(plugin._split_config_list(_FakeVitsConfig.keyword_trigger_phrases))
+
+    phrases_config = _FakeVitsConfig.keyword_trigger_phrases
+    default_text = _FakeVitsConfig.keyword_default_text
+    mismatches = sum(
+        1 for message in corpus if legacy_extract(message, phrases_config, default_text) != tts._extract_keyword_tts_text(message)
+    )
+
+    legacy = timed(lambda m: legacy_extract(m, phrases_config, default_text), corpus, args.repeat)
+    compiled = timed(tts._extract_keyword_tts_text, corpus, args.repeat)
+    per_message = 1e6 / len(corpus)
+    print(f"messages={len(corpus)} trigger_ratio={args.trigger_ratio} mismatches={mismatches}")
+    print(f"legacy   {legacy * per_message:8.2f} us/msg")
+    print(f"compiled {compiled * per_message:8.2f} us/msg  ({legacy / compiled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""音频后处理的微基准：统计不同配置下语音体积（含 base64 后的发送量）减少多少，以及增加的 CPU 时间。
+
+用法：python benchmarks/bench_postprocess.py [--seconds 6] [--repeat 5] [--ffmpeg ffmpeg]
+
+输入模拟 GPT-SoVITS 的输出：32 kHz 16 位单声道 WAV，首尾带静音。找到 ffmpeg 时另外测 opus/mp3 转码，
+转码在子进程中进行，CPU 时间按子进程的 user+sys 统计。
+"""
+
+import argparse
+import base64
+import math
+import os
+import random
+import resource
+import shutil
+import struct
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plugin  # noqa: E402
+
+TTS = plugin.GPTSoVITSV2TTSPlugin
+
+
+def make_speech_like_wav(seconds: float, sample_rate: int = 32000, silence: float = 0.6, seed: int = 0) -> bytes:
+    """生成带首尾静音、音高和响度起伏的单声道 16 位 WAV，比纯正弦波更接近语音的频谱和包络。"""
+    rng = random.Random(seed)
+    frames = int(seconds * sample_rate)
+    lead = int(silence * sample_rate)
+    pcm = bytearray(struct.pack("<h", 0) * lead)
+    phase = 0.0
+    for i in range(frames):
+        t = i / sample_rate
+        pitch = 180 + 40 * math.sin(2 * math.pi * 1.3 * t)
+        phase += 2 * math.pi * pitch / sample_rate
+        envelope = 0.5 + 0.5 * math.sin(2 * math.pi * 3.0 * t) ** 2
+        value = envelope * (0.5 * math.sin(phase) + 0.25 * math.sin(3 * phase) + 0.1 * math.sin(7 * phase))
+        value += rng.uniform(-0.02, 0.02)
+        pcm += struct.pack("<h", int(max(-1.0, min(1.0, value * 0.4)) * 32767))
+    pcm += struct.pack("<h", 0) * lead
+    fmt_chunk = struct.pack("<HHIIHH", 1, 1, sample_rate, sample_rate * 2, 2, 16)
+    return TTS._build_wav(fmt_chunk, bytes(pcm))
+
+
+def make_config(**overrides) -> plugin.PostprocessConfig:
+    config = plugin.PostprocessConfig()
+    config.enabled = True
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    return config
+
+
+def child_cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def encode(ffmpeg: str, codec: str, bitrate: int, data: bytes) -> bytes:
+    """与插件相同的 ffmpeg 参数，通过标准输入输出转码。"""
+    _, codec_args = plugin._POSTPROCESS_CODECS[codec]
+    command = [ffmpeg, "-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-vn", *codec_args, "-b:a", f"{bitrate}k", "pipe:1"]
+    return subprocess.run(command, input=data, capture_output=True, check=True).stdout
+
+
+def run_case(name: str, wav: bytes, config: plugin.PostprocessConfig, ffmpeg: str, repeat: int) -> None:
+    best_cpu = best_encode_cpu = float("inf")
+    output = wav
+    for _ in range(repeat):
+        started = time.process_time()
+        output = TTS._process_wav(wav, config)
+        best_cpu = min(best_cpu, time.process_time() - started)
+        codec = (config.output_codec or "wav").lower()
+        if codec != "wav" and ffmpeg:
+            started = child_cpu_seconds()
+            output = encode(ffmpeg, codec, config.bitrate_kbps, output)
+            best_encode_cpu = min(best_encode_cpu, child_cpu_seconds() - started)
+    raw_b64 = len(base64.b64encode(wav))
+    out_b64 = len(base64.b64encode(output))
+    encode_ms = f"{best_encode_cpu * 1000:8.1f}" if best_encode_cpu != float("inf") else "       -"
+    print(
+        f"{name:<26} {len(output) / 1024:9.1f} KB {out_b64 / 1024:9.1f} KB  {1 - out_b64 / raw_b64:6.1%}"
+        f"  {best_cpu * 1000:8.1f} {encode_ms}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=6.0, help="有声部分时长（秒），首尾另加 0.6 秒静音")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="ffmpeg 路径，找不到时跳过 opus/mp3")
+    args = parser.parse_args()
+
+    if plugin.np is None:
+        sys.exit("需要安装 numpy")
+    ffmpeg = shutil.which(args.ffmpeg) or ""
+    wav = make_speech_like_wav(args.seconds)
+    print(f"输入 {len(wav) / 1024:.1f} KB WAV，base64 后 {len(base64.b64encode(wav)) / 1024:.1f} KB；ffmpeg: {ffmpeg or '未找到'}")
+    print(f"{'配置':<24} {'输出':>12} {'base64':>12}  {'节省':>6}  {'numpy ms':>8} {'编码 ms':>8}")
+
+    cases = [
+        ("仅裁剪静音", make_config(normalize="off", sample_rate=0)),
+        ("裁剪+峰值归一化", make_config(sample_rate=0)),
+        ("裁剪+归一化+24kHz", make_config(sample_rate=24000)),
+        ("裁剪+归一化+16kHz", make_config(sample_rate=16000)),
+        ("rms 归一化+16kHz", make_config(normalize="rms", sample_rate=16000)),
+        ("opus 24kHz 32kbps", make_config(sample_rate=24000, output_codec="opus", bitrate_kbps=32)),
+        ("mp3 24kHz 48kbps", make_config(sample_rate=24000, output_codec="mp3", bitrate_kbps=48)),
+    ]
+    for name, config in cases:
+        if (config.output_codec or "wav") != "wav" and not ffmpeg:
+            print(f"{name:<26} 跳过（未找到 ffmpeg）")
+            continue
+        run_case(name, wav, config, ffmpeg, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
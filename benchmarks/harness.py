@@ -0,0 +1,263 @@
+"""离线压测用的替身环境：假的插件上下文、模拟 GPT-SoVITS 接口的本地 aiohttp 服务，以及事件循环延迟和内存的测量工具。
+
+不需要 GPU 和外网，只需要能导入插件本身（maibot_sdk、aiohttp、aiofiles）。
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+from typing import Any, Optional
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plugin  # noqa: E402
+
+
+def make_wav(seconds: float, sample_rate: int = 32000) -> bytes:
+    """生成单声道 16 位正弦波 WAV。"""
+    frames = max(1, int(seconds * sample_rate))
+    period = [struct.pack("<h", int(8000 * math.sin(2 * math.pi * 440 * i / sample_rate))) for i in range(sample_rate // 440)]
+    pcm = b"".join(period[i % len(period)] for i in range(frames))
+    fmt_chunk = struct.pack("<HHIIHH", 1, 1, sample_rate, sample_rate * 2, 2, 16)
+    return b"".join(
+        (
+            b"RIFF",
+            struct.pack("<I", 4 + 8 + len(fmt_chunk) + 8 + len(pcm)),
+            b"WAVE",
+            b"fmt ",
+            struct.pack("<I", len(fmt_chunk)),
+            fmt_chunk,
+            b"data",
+            struct.pack("<I", len(pcm)),
+            pcm,
+        )
+    )
+
+
+class FakeLogger:
+    """默认丢弃日志；verbose 时转发到标准 logging。"""
+
+    def __init__(self, verbose: bool = False) -> None:
+        self._logger = logging.getLogger("tts_bench") if verbose else None
+
+    def _log(self, level: int, msg: str, *args: Any) -> None:
+        if self._logger is not None:
+            self._logger.log(level, msg, *args)
+
+    def debug(self, msg: str, *args: Any) -> None:
+        self._log(logging.DEBUG, msg, *args)
+
+    def info(self, msg: str, *args: Any) -> None:
+        self._log(logging.INFO, msg, *args)
+
+    def warning(self, msg: str, *args: Any) -> None:
+        self._log(logging.WARNING, msg, *args)
+
+    def error(self, msg: str, *args: Any) -> None:
+        self._log(logging.ERROR, msg, *args)
+
+
+class FakeSend:
+    def __init__(self, latency: float = 0.0) -> None:
+        self.latency = latency
+        self.voices = 0
+        self.voice_bytes = 0
+        self.texts: list[str] = []
+
+    async def custom(self, kind: str, data: str, stream_id: str, **kwargs: Any) -> bool:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.voices += 1
+        self.voice_bytes += len(data)
+        return True
+
+    async def text(self, text: str, stream_id: str, **kwargs: Any) -> bool:
+        self.texts.append(text)
+        return True
+
+
+class FakeLLM:
+    """按固定延迟返回改写结果：单条原样返回原文，合并请求按 JSON 数组逐条返回。"""
+
+    def __init__(self, latency: float = 0.5) -> None:
+        self.latency = latency
+        self.calls = 0
+
+    async def generate(self, prompt: str, **kwargs: Any) -> dict[str, Any]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        source = prompt.rsplit("原文：", 1)[-1]
+        if source.startswith("["):
+            try:
+                return {"success": True, "response": json.dumps(json.loads(source), ensure_ascii=False)}
+            except ValueError:
+                pass
+        return {"success": True, "response": source}
+
+
+class FakeContext:
+    def __init__(self, llm_latency: float = 0.5, send_latency: float = 0.0, verbose: bool = False) -> None:
+        self.logger = FakeLogger(verbose)
+        self.send = FakeSend(send_latency)
+        self.llm = FakeLLM(llm_latency)
+
+
+class StandInServer:
+    """模拟 GPT-SoVITS 的 api.py（POST /）和 api_v2.py（POST /tts）。
+
+    latency 为每次合成的耗时（秒），另按文本长度乘以 per_char_latency；error_rate 为返回 500 的概率；
+    root_404 为 True 时根路径返回 404，插件需要回退到 /tts。
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.2,
+        per_char_latency: float = 0.0,
+        wav_seconds: float = 3.0,
+        error_rate: float = 0.0,
+        root_404: bool = False,
+        max_concurrency: int = 0,
+        seed: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.per_char_latency = per_char_latency
+        self.wav = make_wav(wav_seconds)
+        self.error_rate = error_rate
+        self.root_404 = root_404
+        self.requests = 0
+        self.errors = 0
+        self.busy = 0
+        self.max_busy = 0
+        self._gpu = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self._random = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/", self._handle_root)
+        app.router.add_post("/tts", self._handle_tts)
+        app.router.add_get("/", self._handle_health)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_health(self, request: web.Request) -> web.Response:
+        return web.Response(text="ok")
+
+    async def _handle_root(self, request: web.Request) -> web.Response:
+        if self.root_404:
+            return web.json_response({"detail": "Not Found"}, status=404)
+        return await self._handle_tts(request)
+
+    async def _handle_tts(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.requests += 1
+        text = str(body.get("text") or "")
+        if self._gpu is not None:
+            await self._gpu.acquire()
+        self.busy += 1
+        self.max_busy = max(self.max_busy, self.busy)
+        try:
+            await asyncio.sleep(self.latency + self.per_char_latency * len(text))
+        finally:
+            self.busy -= 1
+            if self._gpu is not None:
+                self._gpu.release()
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=500, text="stand-in server error")
+        return web.Response(body=self.wav, content_type="audio/wav")
+
+
+class LoopLagMonitor:
+    """定时 sleep 并记录实际唤醒比预期晚了多少，用来衡量事件循环是否被阻塞。"""
+
+    def __init__(self, interval: float = 0.01) -> None:
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - expected))
+
+
+def peak_rss_mb() -> Optional[float]:
+    """进程迄今为止的峰值常驻内存（MB）；不支持的平台返回 None。"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 计，macOS 以字节计
+    return peak / 1048576 if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values: list[float], quantile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(quantile * len(ordered)) - 1)]
+
+
+async def build_plugin(
+    api_url: str,
+    workdir: Optional[str] = None,
+    ctx: Optional[FakeContext] = None,
+    **vits_overrides: Any,
+) -> "plugin.GPTSoVITSV2TTSPlugin":
+    """创建并加载插件，缓存目录和参考音频放在临时目录，不会写入插件目录。"""
+    workdir = workdir or tempfile.mkdtemp(prefix="tts_bench_")
+    ref_path = os.path.join(workdir, "ref.wav")
+    with open(ref_path, "wb") as f:
+        f.write(make_wav(3.0))
+    cache_dir = os.path.join(workdir, "cache")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    tts = plugin.create_plugin()
+    tts.ctx = ctx or FakeContext()
+    tts._cache_dir = cache_dir
+    tts._rewrite_cache.persist_path = os.path.join(workdir, "rewrite_cache.json")
+    tts.config.vits.api_url = api_url
+    tts.config.vits.ref_audio_path = ref_path
+    tts.config.backends.health_check_interval = 0
+    # 预热会向替身服务发请求并调用 LLM，压测只统计场景本身的请求
+    tts.config.warmup.enabled = False
+    # 准入控制会拒绝突发的关键词请求，默认关闭以便比较整条流水线的吞吐；run_benchmarks.py --admission 可开启
+    tts.config.admission.enabled = False
+    for name, value in vits_overrides.items():
+        setattr(tts.config.vits, name, value)
+    await tts.on_load()
+    return tts
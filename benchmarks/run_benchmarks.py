@@ -0,0 +1,239 @@
+"""插件端到端压测：用替身 GPT-SoVITS 服务和假上下文驱动 GPTSoVITSV2TTSPlugin，报告吞吐、尾延迟、峰值内存和事件循环延迟。
+
+用法：
+    python benchmarks/run_benchmarks.py                      # 运行全部场景
+    python benchmarks/run_benchmarks.py burst_keyword --requests 200
+    python benchmarks/run_benchmarks.py --json result.json   # 保存结果作为基线
+    python benchmarks/run_benchmarks.py --baseline result.json
+
+峰值内存是整个进程的峰值，比较内存时建议每次只跑一个场景。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from harness import FakeContext, LoopLagMonitor, StandInServer, build_plugin, peak_rss_mb, percentile  # noqa: E402
+
+JAPANESE_LINES = (
+    "今日はいい天気ですね。",
+    "お疲れさまでした、また明日ね。",
+    "それはちょっと面白いかもしれない。",
+    "ごめんね、今は手が離せないの。",
+    "本当にありがとう、助かったよ。",
+)
+CHINESE_LINES = (
+    "今天的天气真不错",
+    "晚上一起去吃饭吧",
+    "这个问题我再想一想",
+    "谢谢你的帮助",
+)
+
+
+async def run_requests(
+    calls: list[Callable[[], Awaitable[Any]]],
+    concurrency: int,
+) -> tuple[list[float], int, float]:
+    """以固定并发执行请求，返回 (每个请求的耗时, 成功数, 总耗时)。"""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    latencies: list[float] = []
+    succeeded = 0
+
+    async def one(call: Callable[[], Awaitable[Any]]) -> None:
+        nonlocal succeeded
+        async with semaphore:
+            started = time.perf_counter()
+            result = await call()
+            latencies.append(time.perf_counter() - started)
+            if result and result[0]:
+                succeeded += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(call) for call in calls))
+    return latencies, succeeded, time.perf_counter() - started
+
+
+def scenario_burst_keyword(tts, args) -> tuple[list[Callable[[], Awaitable[Any]]], int]:
+    """大量关键词触发同时到达，文本互不相同，主要压调度和 LLM 改写。"""
+    tts.config.vits.language = "ja"
+    calls = []
+    for index in range(args.requests):
+        line = CHINESE_LINES[index % len(CHINESE_LINES)]
+        text = f"用语音说 {line}，第{index}次"
+        calls.append(lambda text=text, index=index: tts.handle_vits_keyword_command(text=text, stream_id=f"stream{index % 8}"))
+    return calls, args.requests
+
+
+def scenario_long_text(tts, args) -> tuple[list[Callable[[], Awaitable[Any]]], int]:
+    """长文本分句合成后拼接。"""
+    tts.config.vits.long_text_mode = "chunk"
+    tts.config.vits.max_text_length = 2000
+    count = max(1, args.requests // 10)
+    calls = []
+    for index in range(count):
+        text = "".join(JAPANESE_LINES[(index + i) % len(JAPANESE_LINES)] for i in range(24)) + f"{index}番目。"
+        calls.append(lambda text=text, index=index: tts._synthesize_and_send(text, f"stream{index % 4}"))
+    return calls, max(1, args.concurrency // 4)
+
+
+def scenario_cache_repeat(tts, args) -> tuple[list[Callable[[], Awaitable[Any]]], int]:
+    """少量文本反复请求，大部分应命中合成缓存或合并到进行中的请求。"""
+    calls = []
+    for index in range(args.requests):
+        text = JAPANESE_LINES[index % len(JAPANESE_LINES)]
+        calls.append(lambda text=text, index=index: tts._synthesize_and_send(text, f"stream{index % 8}"))
+    return calls, args.concurrency
+
+
+def scenario_native_rewrite(tts, args) -> tuple[list[Callable[[], Awaitable[Any]]], int]:
+    """文本已是目标语言但仍交给 LLM 改写（关闭本地跳过），配合 --speculative 比较推测合成前后的延迟。"""
+    tts.config.vits.language = "ja"
+    tts.config.vits.local_language_detection = False
+    calls = []
+    for index in range(args.requests):
+        text = f"{JAPANESE_LINES[index % len(JAPANESE_LINES)]}{index}回目。"
+        calls.append(lambda text=text, index=index: tts._synthesize_and_send(text, f"stream{index % 8}"))
+    return calls, args.concurrency
+
+
+def scenario_supersede_repeat(tts, args) -> tuple[list[Callable[[], Awaitable[Any]]], int]:
+    """同一聊天流相隔 0.3 秒两次触发相同文本，准入控制以 latest 取代前一个请求。
+
+    第二个请求不能加入正在取消的旧合成任务，应当重新合成并发出语音：succeeded 和 voices_sent 应为请求数的一半。
+    """
+    tts.config.vits.language = "ja"
+    tts.config.admission.enabled = True
+    tts.config.admission.stream_burst = 1
+    tts.config.admission.overflow_policy = "latest"
+    tts._configure_admission()
+
+    async def delayed(text: str, stream_id: str, delay: float) -> Any:
+        await asyncio.sleep(delay)
+        return await tts.handle_vits_keyword_command(text=text, stream_id=stream_id)
+
+    calls = []
+    for index in range(max(1, args.requests // 2)):
+        text = f"用语音说 {CHINESE_LINES[index % len(CHINESE_LINES)]}，第{index}次"
+        for delay in (0.0, 0.3):
+            calls.append(lambda text=text, index=index, delay=delay: delayed(text, f"stream{index}", delay))
+    return calls, len(calls)
+
+
+SCENARIOS = {
+    "burst_keyword": scenario_burst_keyword,
+    "long_text": scenario_long_text,
+    "cache_repeat": scenario_cache_repeat,
+    "native_rewrite": scenario_native_rewrite,
+    "supersede_repeat": scenario_supersede_repeat,
+}
+
+
+async def run_scenario(name: str, args) -> dict[str, Any]:
+    server = StandInServer(
+        latency=args.server_latency,
+        per_char_latency=args.server_per_char,
+        wav_seconds=args.wav_seconds,
+        error_rate=args.error_rate,
+        root_404=args.root_404,
+        max_concurrency=args.server_concurrency,
+    )
+    url = await server.start()
+    ctx = FakeContext(llm_latency=args.llm_latency, verbose=args.verbose)
+    tts = await build_plugin(url, ctx=ctx)
+    if args.admission:
+        tts.config.admission.enabled = True
+        tts._configure_admission()
+    if args.speculative:
+        tts.config.vits.speculative_synthesis = True
+    monitor = LoopLagMonitor()
+    try:
+        calls, concurrency = SCENARIOS[name](tts, args)
+        monitor.start()
+        latencies, succeeded, elapsed = await run_requests(calls, concurrency)
+    finally:
+        await monitor.stop()
+        await tts.on_unload()
+        await server.stop()
+
+    return {
+        "scenario": name,
+        "requests": len(calls),
+        "succeeded": succeeded,
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(calls) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": max(latencies, default=0.0) * 1000,
+        "loop_lag_p99_ms": percentile(monitor.samples, 0.99) * 1000,
+        "loop_lag_max_ms": max(monitor.samples, default=0.0) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+        "backend_requests": server.requests,
+        "backend_max_busy": server.max_busy,
+        "llm_calls": ctx.llm.calls,
+        "speculative_hits": tts._stats.counters.get("speculative_hits", 0),
+        "speculative_wasted": tts._stats.counters.get("speculative_wasted", 0),
+        "shed": sum(value for name, value in tts._stats.counters.items() if name.startswith("shed_")),
+        "voices_sent": ctx.send.voices,
+    }
+
+
+def print_result(result: dict[str, Any], baseline: Optional[dict[str, Any]]) -> None:
+    print(f"== {result['scenario']} ==")
+    for key, value in result.items():
+        if key == "scenario":
+            continue
+        line = f"  {key:<18} {value:>10.2f}" if isinstance(value, float) else f"  {key:<18} {value!s:>10}"
+        previous = (baseline or {}).get(key)
+        if isinstance(value, (int, float)) and isinstance(previous, (int, float)) and previous:
+            line += f"   ({(value - previous) / previous:+.1%} vs baseline)"
+        print(line)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("scenarios", nargs="*", help=f"要运行的场景，默认全部：{', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--server-latency", type=float, default=0.2, help="替身服务每次合成的基础耗时（秒）")
+    parser.add_argument("--server-per-char", type=float, default=0.002, help="替身服务每个字符额外耗时（秒）")
+    parser.add_argument("--server-concurrency", type=int, default=2, help="替身服务同时处理的请求数，模拟单卡，0 为不限")
+    parser.add_argument("--wav-seconds", type=float, default=3.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--root-404", action="store_true", help="根路径返回 404，只有 /tts 可用")
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--admission", action="store_true", help="开启准入控制（默认配置），统计被拒绝或取代的请求数")
+    parser.add_argument("--speculative", action="store_true", help="开启推测合成（vits.speculative_synthesis）")
+    parser.add_argument("--json", dest="json_path", help="把结果写入 JSON 文件")
+    parser.add_argument("--baseline", help="与之前保存的 JSON 结果对比")
+    parser.add_argument("--verbose", action="store_true", help="输出插件日志")
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+
+    baseline: dict[str, dict[str, Any]] = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = {item["scenario"]: item for item in json.load(f)}
+
+    results = []
+    for name in args.scenarios or list(SCENARIOS):
+        result = await run_scenario(name, args)
+        print_result(result, baseline.get(name))
+        results.append(result)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
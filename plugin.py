@@ -1,17 +1,177 @@
 import asyncio
 import base64
+import hashlib
+import heapq
+import json
+import math
 import os
+import random
 import re
+import shutil
+import struct
 import time
 import uuid
-from typing import Any, Optional
-from urllib.parse import urlsplit, urlunsplit
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import astuple, dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional
+from urllib.parse import urljoin, urlsplit, urlunsplit
 
 import aiofiles
 import aiohttp
 from maibot_sdk import CONFIG_RELOAD_SCOPE_SELF, Action, Command, Field, MaiBotPlugin, PluginConfigBase
 from maibot_sdk.types import ActivationType
 
+try:
+    import numpy as np
+except ImportError:  # 音频后处理是可选功能，未安装 numpy 时只做转码或原样发送
+    np = None
+
+try:
+    import tomllib
+except ImportError:  # Python 3.10 及以下没有 tomllib，关键词命令只匹配默认触发词
+    tomllib = None
+
+# 长文本按句末标点切分；英文句点只在其后是空白或结尾时才视为句末，避免切开小数
+_SENTENCE_RE = re.compile(r".+?(?:[。！？!?…；;\n]+|\.(?=\s|$))[」』”’）)\]\"']*|.+$", re.S)
+_CLAUSE_RE = re.compile(r".+?[，,、：:]+|.+$", re.S)
+
+# 下载与读取音频时的分块大小，取 3 的倍数便于增量 base64 编码
+_STREAM_CHUNK_SIZE = 48 * 1024
+# 参考音频的 stat 结果缓存时长（秒），期间不再逐个请求访问磁盘
+_REF_AUDIO_STAT_TTL = 5.0
+
+# 合成调度优先级，数值越小越优先
+PRIORITY_COMMAND = 0
+PRIORITY_ACTION = 1
+PRIORITY_KEYWORD = 2
+PRIORITY_BACKGROUND = 3
+
+# 预热和预合成请求在调度器中使用的聊天流；预热合成未指定文本时按音色语言使用的短句
+_WARMUP_STREAM_ID = "__warmup__"
+_WARMUP_TEXTS = {"zh": "你好。", "ja": "こんにちは。", "en": "Hello.", "ko": "안녕하세요."}
+
+# 准入控制拒绝或取代请求时返回的说明，关键词触发不会把这些结果作为失败提示发到聊天中
+_ADMISSION_MESSAGES = {
+    "rate_limited": "语音请求过于频繁，已忽略",
+    "queue_full": "语音合成排队已满，请稍后再试",
+    "superseded": "已被同一聊天中更新的语音请求取代",
+}
+
+# 音频后处理可选的压缩编码：(文件扩展名, ffmpeg 编码参数)
+_POSTPROCESS_CODECS = {
+    "opus": ("ogg", ("-c:a", "libopus", "-application", "voip", "-f", "ogg")),
+    "mp3": ("mp3", ("-c:a", "libmp3lame", "-f", "mp3")),
+}
+# 降采样低通滤波器的单侧长度（采样点），以及归一化允许的最大增益，避免把近乎静音的音频放大成噪声
+_RESAMPLE_HALF_TAPS = 32
+_NORMALIZE_MAX_GAIN = 10.0
+
+# 显式关键词直触发的默认触发词；插件目录下的 config.toml 未配置触发词时，关键词命令的匹配正则由它生成
+_DEFAULT_KEYWORD_TRIGGER_PHRASES = (
+    "再发一句语音",
+    "再来一句语音",
+    "发语音",
+    "发一句语音",
+    "来句语音",
+    "来一句语音",
+    "再说一句",
+    "再说句话",
+    "说句话",
+    "说一句",
+    "念一句",
+    "朗读",
+    "念出来",
+    "用语音说",
+    "语音说",
+)
+
+# 触发词前后需要去掉的请求措辞，同一前缀的长词需排在短词之前
+_KEYWORD_PAYLOAD_PREFIXES = (
+    "内容是",
+    "内容为",
+    "内容",
+    "说一下",
+    "说下",
+    "说",
+    "读一下",
+    "读下",
+    "读",
+    "念一下",
+    "念下",
+    "念",
+    "一下",
+    "下",
+    "一段",
+    "一句",
+    "这段话",
+    "这句话",
+    "这个",
+)
+_KEYWORD_LEADING_PREFIXES = ("请", "麻烦", "帮我", "帮忙", "把", "将", "让", "来", "再", "能不能", "能")
+_KEYWORD_PUNCTUATION = " \t\r\n,，。.:：;；!！?？"
+
+# 语言改写提示词中单条与合并请求共用的要求
+_REWRITE_RULES = (
+    "2. 保留原文含义、角色口吻、情绪、称呼和语气，不要添加新信息。\n"
+    "3. 如果原文已经是目标语言，只做轻微口语化润色。\n"
+    "4. 如果目标语言是日语，必须输出标准自然日语，不要把中文按日语读音硬转写。\n"
+    "5. 数字、符号、缩写改成适合朗读的表达。\n"
+)
+
+# 本地语言判断按文字类别计数；拉丁字母按单词计数，避免夹杂的英文名词压过中日文
+_SCRIPT_RES = {
+    "hiragana": re.compile(r"[\u3040-\u309f]"),
+    "katakana": re.compile(r"[\u30a0-\u30ff\u31f0-\u31ff\uff66-\uff9d]"),
+    "han": re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]"),
+    "hangul": re.compile(r"[\u1100-\u11ff\u3130-\u318f\uac00-\ud7af]"),
+    "cyrillic": re.compile(r"[\u0400-\u04ff]"),
+    "latin": re.compile(r"[A-Za-z\u00c0-\u024f]+(?:'[A-Za-z]+)?"),
+}
+_ENGLISH_HINT_WORDS = frozenset(
+    "the a an and or but is are was were be to of in on at for with it this that you i we they he she not do".split()
+)
+
+# 文本已是目标语言时在本地完成的朗读规范化
+_URL_RE = re.compile(r"https?://\S+")
+_MARKDOWN_RE = re.compile(r"(?m)^\s*(?:#{1,6}|>|[-*+]\s)\s*|[*_`~]{2,}|`")
+_PERCENT_RE = re.compile(r"(\d+(?:\.\d+)?)\s*[%％]")
+_FULLWIDTH_DIGITS = str.maketrans("０１２３４５６７８９", "0123456789")
+_SYMBOL_WORDS = {
+    "ja": {"&": "アンド", "+": "プラス", "=": "イコール", "@": "アット", "℃": "度"},
+    "zh": {"&": "和", "+": "加", "=": "等于", "@": "艾特", "℃": "摄氏度"},
+    "en": {"&": " and ", "+": " plus ", "=": " equals ", "@": " at ", "℃": " degrees Celsius"},
+    "ko": {"&": "앤드", "+": "플러스", "=": "이퀄", "@": "골뱅이", "℃": "도"},
+}
+
+
+def _split_config_list(raw: str) -> list[str]:
+    """拆分逗号或换行分隔的配置项。"""
+    return [item.strip() for item in re.split(r"[,，\n]+", raw or "") if item.strip()]
+
+
+def _configured_keyword_phrases() -> list[str]:
+    """读取插件目录下 config.toml 中的 vits.keyword_trigger_phrases，读取失败或未配置时返回默认触发词。"""
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.toml")
+    if tomllib is not None:
+        try:
+            with open(config_path, "rb") as f:
+                raw = tomllib.load(f).get("vits", {}).get("keyword_trigger_phrases")
+        except (OSError, ValueError):
+            raw = None
+        if isinstance(raw, str) and _split_config_list(raw):
+            return _split_config_list(raw)
+    return list(_DEFAULT_KEYWORD_TRIGGER_PHRASES)
+
+
+def _keyword_command_pattern(phrases: Iterable[str]) -> str:
+    alternatives = sorted({phrase.lower() for phrase in phrases}, key=len, reverse=True)
+    return r"(?i)(?<!/)(?:" + "|".join(re.escape(phrase) for phrase in alternatives) + ")"
+
+
+# 组件的匹配正则在注册时就已固定：按导入时 config.toml 中的触发词生成，重载配置后新增的触发词需要重启插件才能生效
+_KEYWORD_COMMAND_PATTERN = _keyword_command_pattern(_configured_keyword_phrases())
+
 
 class PluginSectionConfig(PluginConfigBase):
     __ui_label__ = "插件"
@@ -30,6 +190,7 @@ class ComponentsConfig(PluginConfigBase):
     action_enabled: bool = Field(default=True, description="是否启用关键词触发")
     command_enabled: bool = Field(default=True, description="是否启用 /vits 命令")
     mode_command_enabled: bool = Field(default=False, description="新版暂不支持旧自动模式")
+    stats_command_enabled: bool = Field(default=True, description="是否启用 /vitsstats 统计命令")
 
 
 class VitsConfig(PluginConfigBase):
@@ -37,24 +198,56 @@ class VitsConfig(PluginConfigBase):
     __ui_icon__ = "volume-2"
     __ui_order__ = 2
 
-    api_url: str = Field(default="http://localhost:9880/", description="GPT-SoVITS API 地址")
+    api_url: str = Field(
+        default="http://localhost:9880/",
+        description="GPT-SoVITS API 地址，多个后端用逗号或换行分隔，可附加 ;weight=2;max_concurrency=4",
+    )
     default_voice_id: str = Field(default="0", description="默认音色 ID")
     language: str = Field(default="zh", description="文本与参考音频语言")
     ref_audio_path: str = Field(default="", description="参考音频绝对路径")
     prompt_text: str = Field(default="", description="参考音频文本")
+    voice_profiles: str = Field(
+        default="",
+        description="命名音色，每行一个：名称;ref=参考音频;prompt=参考文本;lang=语言;speed=语速;gpt=GPT 权重;sovits=SoVITS 权重",
+    )
+    default_voice_profile: str = Field(default="", description="默认使用的命名音色，留空时使用 ref_audio_path、prompt_text 和 language")
+    pin_reference_audio: bool = Field(default=True, description="音色变化时先在后端设置参考音频（api.py 的 /change_refer，api_v2.py 的 /set_refer_audio）")
     timeout: int = Field(default=60, description="请求超时时间（秒）")
     max_text_length: int = Field(default=500, description="单次合成最大文本长度")
     retry_count: int = Field(default=2, description="失败重试次数")
+    deadline_seconds: int = Field(default=0, description="单次合成（含排队与全部重试）的总截止时间（秒），0 表示与 timeout 相同")
+    retry_backoff_base: float = Field(default=0.5, description="重试退避的初始等待时间（秒），之后按指数增长并加入随机抖动")
+    retry_backoff_max: float = Field(default=8.0, description="重试退避的最长等待时间（秒）")
+    stale_after_seconds: int = Field(default=120, description="原消息超过该时间（秒）仍未发出语音时放弃，0 为不限制")
     audio_format: str = Field(default="wav", description="音频文件格式")
+    api_flavor: str = Field(default="auto", description="接口类型：auto 自动识别，api 为 api.py，api_v2 为 api_v2.py，compat 为兼容旧版的请求格式")
     auto_language_rewrite: bool = Field(default=True, description="发送到 TTS 前按 language 自动改写语言")
     language_rewrite_model: str = Field(default="utils", description="语言改写使用的模型任务")
     block_on_language_rewrite_failure: bool = Field(default=True, description="语言改写失败时阻止继续合成")
+    local_language_detection: bool = Field(default=True, description="本地判断文本已是目标语言时跳过 LLM 改写，只在本地规范数字和符号")
+    local_detection_confidence: float = Field(default=0.85, description="本地语言判断的置信度阈值（0~1），越高越保守")
+    rewrite_batch_window_ms: int = Field(
+        default=80,
+        description="合并语言改写请求的最长等待（毫秒）：没有进行中的改写时立即请求，改写进行中到达的请求攒成一批，0 为不合并",
+    )
+    rewrite_batch_max_items: int = Field(default=8, description="单次合并改写的最大条数")
+    speculative_synthesis: bool = Field(default=False, description="原文看起来已是目标语言时，在 LLM 改写的同时先合成原文，改写几乎没改动时直接使用")
+    speculative_min_confidence: float = Field(default=0.5, description="本地语言判断的置信度达到该值才进行推测合成（0~1）")
+    speculative_max_edit_ratio: float = Field(default=0.1, description="改写结果与原文的归一化编辑距离不超过该值时使用推测合成的音频")
     keyword_trigger_enabled: bool = Field(default=True, description="是否启用显式关键词直触发")
     keyword_trigger_phrases: str = Field(
-        default="再发一句语音,再来一句语音,发语音,发一句语音,来句语音,来一句语音,再说一句,再说句话,说句话,说一句,念一句,朗读,念出来,用语音说,语音说",
+        default=",".join(_DEFAULT_KEYWORD_TRIGGER_PHRASES),
         description="逗号分隔的显式触发关键词",
     )
     keyword_default_text: str = Field(default="行吧，就再说一句。测试到这里差不多了。", description="只有触发词没有朗读内容时使用的默认文本")
+    long_text_mode: str = Field(default="truncate", description="长文本处理方式：truncate 截断，chunk 分句合成后拼接")
+    chunk_max_length: int = Field(default=120, description="分句合成时单段最大长度")
+    chunk_parallelism: int = Field(default=2, description="分句合成时同时合成的段数")
+    chunk_silence_ms: int = Field(default=200, description="分段之间插入的静音时长（毫秒）")
+    chunk_max_total_length: int = Field(default=3000, description="分句合成模式下允许的最大总文本长度")
+    delivery_mode: str = Field(default="single", description="发送方式：single 合成完整后发送，progressive 逐段合成逐段发送")
+    progressive_backend_streaming: bool = Field(default=True, description="逐段发送时优先使用 GPT-SoVITS 的 streaming_mode")
+    progressive_min_segment_seconds: float = Field(default=1.5, description="流式逐段发送时每段最短时长（秒）")
 
 
 class CacheConfig(PluginConfigBase):
@@ -64,6 +257,107 @@ class CacheConfig(PluginConfigBase):
 
     expire_minutes: int = Field(default=30, description="缓存保留时间（分钟）")
     max_size_mb: int = Field(default=100, description="缓存最大容量（MB）")
+    janitor_interval_seconds: float = Field(default=60.0, description="后台缓存清理的运行间隔（秒）")
+    synthesis_cache_enabled: bool = Field(default=True, description="相同合成请求直接复用已缓存的音频")
+    rewrite_cache_enabled: bool = Field(default=True, description="缓存 LLM 语言改写结果")
+    rewrite_cache_max_entries: int = Field(default=512, description="语言改写缓存最大条目数")
+    rewrite_cache_ttl_minutes: int = Field(default=1440, description="语言改写缓存有效期（分钟）")
+    rewrite_cache_persist: bool = Field(default=False, description="是否把语言改写缓存保存到磁盘")
+
+
+class SchedulerConfig(PluginConfigBase):
+    __ui_label__ = "调度"
+    __ui_icon__ = "list-ordered"
+    __ui_order__ = 4
+
+    max_concurrency_per_backend: int = Field(default=2, description="每个 GPT-SoVITS 后端同时处理的请求数")
+    slow_wait_log_seconds: float = Field(default=3.0, description="排队超过该时间（秒）时记录日志")
+    voice_affinity_max_skips: int = Field(
+        default=4, description="同优先级内优先放行与正在合成的音色相同的请求，最多连续插队的次数，0 为关闭"
+    )
+
+
+class BackendsConfig(PluginConfigBase):
+    __ui_label__ = "后端"
+    __ui_icon__ = "server"
+    __ui_order__ = 5
+
+    health_check_interval: float = Field(default=15.0, description="后端健康检查间隔（秒），0 为关闭")
+    health_check_timeout: float = Field(default=3.0, description="健康检查超时时间（秒）")
+    failure_threshold: int = Field(default=3, description="连续超时或 5xx 达到该次数后暂停使用该后端")
+    recovery_seconds: float = Field(default=30.0, description="后端被暂停后至少等待多久才允许健康检查恢复（秒）")
+    connect_timeout: float = Field(default=5.0, description="与后端建立 TCP 连接的超时时间（秒），0 为不单独限制")
+    read_timeout: float = Field(default=0.0, description="等待后端返回下一段数据的最长时间（秒），0 为只受 vits.timeout 限制")
+    keepalive_seconds: float = Field(default=30.0, description="空闲连接保留多久（秒）后关闭")
+    dns_cache_seconds: int = Field(default=300, description="DNS 解析结果缓存时间（秒），0 为不缓存")
+
+
+class StatsConfig(PluginConfigBase):
+    __ui_label__ = "统计"
+    __ui_icon__ = "activity"
+    __ui_order__ = 6
+
+    enabled: bool = Field(default=True, description="是否记录各阶段耗时统计")
+    window_size: int = Field(default=1024, description="每个阶段保留的最近样本数，分位数按这些样本计算")
+    prometheus_path: str = Field(default="", description="定期写出 Prometheus 文本格式快照的文件路径，留空不写")
+    prometheus_interval_seconds: float = Field(default=30.0, description="写出 Prometheus 快照的间隔（秒）")
+
+
+class WarmupConfig(PluginConfigBase):
+    __ui_label__ = "预热"
+    __ui_icon__ = "flame"
+    __ui_order__ = 7
+
+    enabled: bool = Field(default=True, description="加载或重载配置后在后台预热：建立连接、为每个音色合成一次短句、预先合成固定短语")
+    warmup_text: str = Field(default="", description="预热合成使用的短句，留空时按音色语言自动选择")
+    canned_phrases: str = Field(default="", description="预先合成并长期保存的固定短语，每行一条，使用默认音色")
+    include_keyword_default_text: bool = Field(default=True, description="是否把 vits.keyword_default_text 也作为固定短语预先合成")
+
+
+class PostprocessConfig(PluginConfigBase):
+    __ui_label__ = "音频后处理"
+    __ui_icon__ = "audio-waveform"
+    __ui_order__ = 8
+
+    enabled: bool = Field(default=False, description="合成后、发送前处理音频以减小语音体积，需要安装 numpy，转码需要 ffmpeg")
+    trim_silence: bool = Field(default=True, description="裁掉首尾静音")
+    silence_threshold_db: float = Field(default=-45.0, description="低于该电平（dBFS）视为静音")
+    keep_silence_ms: int = Field(default=120, description="裁剪后首尾保留的静音（毫秒）")
+    normalize: str = Field(default="peak", description="音量归一化：off 关闭，peak 按峰值，rms 按平均响度（同时限制峰值）")
+    peak_target_db: float = Field(default=-1.0, description="归一化后的峰值（dBFS）")
+    loudness_target_db: float = Field(default=-20.0, description="rms 模式下的目标平均响度（dBFS）")
+    downmix_mono: bool = Field(default=True, description="多声道混合为单声道")
+    sample_rate: int = Field(default=24000, description="重采样的目标采样率，0 为保持原采样率")
+    output_codec: str = Field(default="wav", description="输出编码：wav、opus（OGG 封装）或 mp3，找不到 ffmpeg 时输出 WAV")
+    bitrate_kbps: int = Field(default=32, description="opus/mp3 的码率（kbps）")
+    ffmpeg_path: str = Field(default="ffmpeg", description="ffmpeg 可执行文件路径或命令名")
+
+
+class AdmissionConfig(PluginConfigBase):
+    __ui_label__ = "准入控制"
+    __ui_icon__ = "shield"
+    __ui_order__ = 9
+
+    enabled: bool = Field(default=True, description="过载时限制关键词和 Action 触发的合成请求，/vits 命令保留一部分排队份额")
+    stream_rate_per_minute: float = Field(default=6.0, description="每个聊天流每分钟允许的自动触发次数，0 为不限制")
+    stream_burst: int = Field(default=3, description="每个聊天流允许的突发次数")
+    user_rate_per_minute: float = Field(default=3.0, description="每个用户每分钟允许的自动触发次数，0 为不限制")
+    user_burst: int = Field(default=2, description="每个用户允许的突发次数")
+    max_queued_audio_seconds: float = Field(default=180.0, description="已受理未完成的请求按文本长度估计的语音总时长上限（秒），0 为不限制")
+    chars_per_second: float = Field(default=5.0, description="估计语音时长时每秒朗读的字数")
+    command_reserved_share: float = Field(default=0.25, description="排队时长上限中只留给 /vits 命令的比例（0~1）")
+    overflow_policy: str = Field(default="latest", description="自动触发超限时：latest 取代同一聊天流中尚未发送的旧请求，reject 直接拒绝")
+
+
+class BroadcastConfig(PluginConfigBase):
+    __ui_label__ = "广播"
+    __ui_icon__ = "megaphone"
+    __ui_order__ = 10
+
+    command_enabled: bool = Field(default=False, description="是否启用 /vitsbroadcast 命令：合成一次语音，发送到多个聊天流")
+    allowed_users: str = Field(default="", description="允许使用广播命令的用户 ID，逗号分隔，留空时任何人都不能使用")
+    default_targets: str = Field(default="", description="命令未指定 to= 时发送到的聊天流 stream_id，逗号或换行分隔")
+    max_parallel_sends: int = Field(default=4, description="同时向多少个聊天流发送")
 
 
 class GPTSoVITSConfig(PluginConfigBase):
@@ -71,6 +365,932 @@ class GPTSoVITSConfig(PluginConfigBase):
     components: ComponentsConfig = Field(default_factory=ComponentsConfig)
     vits: VitsConfig = Field(default_factory=VitsConfig)
     cache: CacheConfig = Field(default_factory=CacheConfig)
+    scheduler: SchedulerConfig = Field(default_factory=SchedulerConfig)
+    backends: BackendsConfig = Field(default_factory=BackendsConfig)
+    stats: StatsConfig = Field(default_factory=StatsConfig)
+    warmup: WarmupConfig = Field(default_factory=WarmupConfig)
+    postprocess: PostprocessConfig = Field(default_factory=PostprocessConfig)
+    admission: AdmissionConfig = Field(default_factory=AdmissionConfig)
+    broadcast: BroadcastConfig = Field(default_factory=BroadcastConfig)
+
+
+class PrefixTrie:
+    """前缀树，用于一次遍历找出文本开头能匹配的最长词。"""
+
+    _END = ""
+
+    def __init__(self, words: Iterable[str]) -> None:
+        self._root: dict[str, Any] = {}
+        for word in words:
+            if not word:
+                continue
+            node = self._root
+            for char in word:
+                node = node.setdefault(char, {})
+            node[self._END] = True
+
+    def longest_prefix(self, text: str) -> int:
+        """返回 text 开头匹配到的最长词的长度，没有匹配时返回 0。"""
+        node = self._root
+        longest = 0
+        for index, char in enumerate(text):
+            node = node.get(char)
+            if node is None:
+                break
+            if self._END in node:
+                longest = index + 1
+        return longest
+
+
+class KeywordMatcher:
+    """触发词的 Aho–Corasick 自动机，扫描一遍文本即可找到所有出现的触发词。
+
+    匹配规则与逐个触发词查找一致：最长的触发词优先，同样长度时取最靠前的位置。
+    """
+
+    def __init__(self, phrases: Iterable[str]) -> None:
+        self.phrases = sorted({phrase.strip() for phrase in phrases if phrase.strip()}, key=len, reverse=True)
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._lengths: list[tuple[int, ...]] = [()]
+        for phrase in self.phrases:
+            self._insert(phrase.lower())
+        self._build_fail_links()
+
+    def __bool__(self) -> bool:
+        return bool(self.phrases)
+
+    def _insert(self, phrase: str) -> None:
+        node = 0
+        for char in phrase:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._lengths.append(())
+            node = next_node
+        if len(phrase) not in self._lengths[node]:
+            self._lengths[node] += (len(phrase),)
+
+    def _build_fail_links(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                # 合并后缀节点上的匹配，保证出现在其他触发词内部的短词也能被找到
+                self._lengths[child] += self._lengths[self._fail[child]]
+                queue.append(child)
+
+    def find(self, lowered: str) -> Optional[tuple[int, int]]:
+        """在已转为小写的文本中查找，返回 (起始位置, 长度)，没有触发词时返回 None。"""
+        best: Optional[tuple[int, int]] = None
+        node = 0
+        for index, char in enumerate(lowered):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length in self._lengths[node]:
+                if best is None or length > best[1]:
+                    best = (index - length + 1, length)
+        return best
+
+
+_KEYWORD_PAYLOAD_TRIE = PrefixTrie(_KEYWORD_PAYLOAD_PREFIXES)
+_KEYWORD_LEADING_TRIE = PrefixTrie(_KEYWORD_LEADING_PREFIXES + _KEYWORD_PAYLOAD_PREFIXES)
+
+
+class AudioCacheIndex:
+    """音频缓存目录的内存索引，记录每个文件的大小和最近使用时间。
+
+    只在加载时扫描一次目录，之后随文件写入和命中增量更新；淘汰按最久未使用的顺序进行，
+    被 pin 住（正在发送或拼接）的文件不会被淘汰。
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[str, tuple[int, float]] = {}
+        self._heap: list[tuple[float, str]] = []
+        self._pins: dict[str, int] = {}
+        self._touched: set[str] = set()
+        self.total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, path: object) -> bool:
+        return path in self._entries
+
+    @staticmethod
+    def scan(cache_dir: str) -> list[tuple[str, int, float]]:
+        """阻塞地扫描缓存目录，返回 [(路径, 大小, mtime)]，应在线程中调用。"""
+        files = []
+        with os.scandir(cache_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files.append((entry.path, stat.st_size, stat.st_mtime))
+                except OSError:
+                    continue
+        return files
+
+    def rebuild(self, files: list[tuple[str, int, float]]) -> None:
+        self._entries.clear()
+        self._heap.clear()
+        self._touched.clear()
+        self.total_bytes = 0
+        for path, size, mtime in files:
+            self.add(path, size, mtime)
+
+    def add(self, path: str, size: int, used_at: Optional[float] = None) -> None:
+        used_at = time.time() if used_at is None else used_at
+        previous = self._entries.get(path)
+        if previous is not None:
+            self.total_bytes -= previous[0]
+        self._entries[path] = (size, used_at)
+        self.total_bytes += size
+        heapq.heappush(self._heap, (used_at, path))
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            # 命中时旧的堆条目只做惰性失效，堆明显大于索引时重建一次
+            self._heap = [(entry_used_at, p) for p, (_, entry_used_at) in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def touch(self, path: str) -> bool:
+        """标记文件刚被使用，返回文件是否在索引中。"""
+        entry = self._entries.get(path)
+        if entry is None:
+            return False
+        self.add(path, entry[0])
+        self._touched.add(path)
+        return True
+
+    def discard(self, path: str) -> None:
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.total_bytes -= entry[0]
+        self._touched.discard(path)
+
+    @contextmanager
+    def pinned(self, *paths: Optional[str]):
+        pinned_paths = [path for path in paths if path]
+        for path in pinned_paths:
+            self._pins[path] = self._pins.get(path, 0) + 1
+        try:
+            yield
+        finally:
+            for path in pinned_paths:
+                count = self._pins[path] - 1
+                if count:
+                    self._pins[path] = count
+                else:
+                    del self._pins[path]
+
+    def collect(self, expire_seconds: float, max_bytes: int, now: Optional[float] = None) -> list[str]:
+        """把过期或超出容量的文件移出索引并返回其路径，由调用方负责删除。"""
+        now = time.time() if now is None else now
+        victims: list[str] = []
+        skipped: list[tuple[float, str]] = []
+        while self._heap:
+            used_at, path = self._heap[0]
+            entry = self._entries.get(path)
+            if entry is None or entry[1] != used_at:
+                heapq.heappop(self._heap)
+                continue
+            if now - used_at <= expire_seconds and self.total_bytes <= max_bytes:
+                break
+            heapq.heappop(self._heap)
+            if path in self._pins:
+                skipped.append((used_at, path))
+                continue
+            self.discard(path)
+            victims.append(path)
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        return victims
+
+    def drain(self) -> list[str]:
+        """把所有未被 pin 住的文件移出索引并返回其路径。"""
+        victims = [path for path in self._entries if path not in self._pins]
+        for path in victims:
+            self.discard(path)
+        return victims
+
+    def take_touched(self) -> list[str]:
+        touched = list(self._touched)
+        self._touched.clear()
+        return touched
+
+
+class LatencyStats:
+    """各阶段耗时的滚动统计：每个阶段保留最近 window_size 个样本，按需计算分位数；另有累计计数器。"""
+
+    # 阶段名与 /vitsstats 中显示的名称，按处理顺序排列
+    STAGES = {
+        "keyword_extract": "关键词解析",
+        "llm_rewrite": "LLM 改写",
+        "scheduler_wait": "排队等待",
+        "ttfb": "首字节",
+        "download": "响应下载",
+        "disk_write": "写入磁盘",
+        "base64_encode": "base64 编码",
+        "postprocess": "音频后处理",
+        "speculative_wasted": "推测合成作废",
+        "file_read": "读取缓存文件",
+        "send": "发送语音",
+        "synthesis": "合成总耗时",
+        "total": "请求总耗时",
+    }
+
+    def __init__(self, window_size: int = 1024) -> None:
+        self.window_size = max(1, int(window_size))
+        self.enabled = True
+        self._samples: dict[str, deque] = {}
+        self._counts: dict[str, int] = {}
+        self.counters: dict[str, int] = {}
+        self.started_at = time.time()
+
+    def configure(self, enabled: bool, window_size: int) -> None:
+        self.enabled = bool(enabled)
+        window_size = max(1, int(window_size))
+        if window_size != self.window_size:
+            self.window_size = window_size
+            self._samples = {stage: deque(samples, maxlen=window_size) for stage, samples in self._samples.items()}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        if not self.enabled:
+            return
+        samples = self._samples.get(stage)
+        if samples is None:
+            samples = self._samples[stage] = deque(maxlen=self.window_size)
+        samples.append(seconds)
+        self._counts[stage] = self._counts.get(stage, 0) + 1
+
+    @contextmanager
+    def timer(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def incr(self, name: str, value: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self) -> list[tuple[str, int, float, float, float]]:
+        """返回 [(阶段, 累计次数, p50, p95, p99)]，耗时单位为秒。"""
+        rows = []
+        ordered = list(self.STAGES) + sorted(set(self._samples) - set(self.STAGES))
+        for stage in ordered:
+            samples = self._samples.get(stage)
+            if not samples:
+                continue
+            values = sorted(samples)
+            rows.append(
+                (
+                    stage,
+                    self._counts[stage],
+                    self._percentile(values, 0.50),
+                    self._percentile(values, 0.95),
+                    self._percentile(values, 0.99),
+                )
+            )
+        return rows
+
+    @staticmethod
+    def _percentile(values: list[float], quantile: float) -> float:
+        return values[max(0, math.ceil(quantile * len(values)) - 1)]
+
+    def render_prometheus(self, extra_gauges: Optional[dict[str, float]] = None) -> str:
+        lines = [
+            "# HELP tts_stage_seconds Rolling latency quantiles per synthesis stage.",
+            "# TYPE tts_stage_seconds summary",
+        ]
+        for stage, count, p50, p95, p99 in self.summary():
+            for quantile, value in (("0.5", p50), ("0.95", p95), ("0.99", p99)):
+                lines.append(f'tts_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {value:.6f}')
+            lines.append(f'tts_stage_seconds_count{{stage="{stage}"}} {count}')
+        for name, value in sorted(self.counters.items()):
+            metric, _, label = name.partition(":")
+            if label:
+                escaped = label.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'tts_{metric}_total{{backend="{escaped}"}} {value}')
+            else:
+                lines.append(f"tts_{metric}_total {value}")
+        for name, value in sorted((extra_gauges or {}).items()):
+            lines.append(f"tts_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class RewriteCache:
+    """LLM 语言改写结果的 LRU 缓存，条目带过期时间，可选持久化到 JSON 文件。"""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 86400.0, persist_path: Optional[str] = None) -> None:
+        self._entries: OrderedDict[tuple[str, str, str], tuple[str, float]] = OrderedDict()
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = max(0.0, float(ttl_seconds))
+        self.persist_path = persist_path
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def configure(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = max(0.0, float(ttl_seconds))
+        self._trim()
+
+    def get(self, key: tuple[str, str, str]) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, created_at = entry
+        if self._is_expired(created_at):
+            del self._entries[key]
+            self.dirty = True
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: tuple[str, str, str], value: str) -> None:
+        if not value:
+            return
+        self._entries[key] = (value, time.time())
+        self._entries.move_to_end(key)
+        self._trim()
+        self.dirty = True
+
+    def clear(self) -> None:
+        if self._entries:
+            self.dirty = True
+        self._entries.clear()
+
+    def load(self) -> None:
+        if not self.persist_path or not os.path.isfile(self.persist_path):
+            return
+        with open(self.persist_path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        for item in items if isinstance(items, list) else []:
+            try:
+                text, code, model, value, created_at = item
+            except (TypeError, ValueError):
+                continue
+            if value and not self._is_expired(float(created_at)):
+                self._entries[(str(text), str(code), str(model))] = (str(value), float(created_at))
+        self._trim()
+        self.dirty = False
+
+    def save(self) -> None:
+        if not self.persist_path:
+            return
+        items = [
+            [text, code, model, value, created_at]
+            for (text, code, model), (value, created_at) in self._entries.items()
+            if not self._is_expired(created_at)
+        ]
+        temp_path = f"{self.persist_path}.{uuid.uuid4().hex[:8]}.part"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(items, f, ensure_ascii=False)
+        os.replace(temp_path, self.persist_path)
+        self.dirty = False
+
+    def _is_expired(self, created_at: float) -> bool:
+        return bool(self.ttl_seconds) and time.time() - created_at > self.ttl_seconds
+
+    def _trim(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+@dataclass
+class SynthesizedAudio:
+    """一次合成的结果。audio_base64 已就绪时发送端直接使用，否则从 path 读取。"""
+
+    path: Optional[str]
+    audio_base64: Optional[str] = None
+    size: int = 0
+
+
+@dataclass(frozen=True)
+class VoiceProfile:
+    """一套命名音色：参考音频、参考文本、语言、语速，以及可选的 GPT/SoVITS 模型权重。"""
+
+    name: str
+    ref_audio_path: str
+    prompt_text: str = ""
+    language: str = "zh"
+    speed: float = 1.0
+    gpt_weights: str = ""
+    sovits_weights: str = ""
+
+    @property
+    def weights(self) -> Optional[tuple[str, str]]:
+        """需要后端加载的 (GPT 权重, SoVITS 权重)；未指定时返回 None，表示使用后端当前加载的模型。"""
+        if not self.gpt_weights and not self.sovits_weights:
+            return None
+        return self.gpt_weights, self.sovits_weights
+
+
+class Base64Encoder:
+    """增量 base64 编码，音频边下载边编码，不需要保留完整的原始字节。"""
+
+    def __init__(self) -> None:
+        self._pieces: list[str] = []
+        self._tail = b""
+
+    def update(self, data: bytes) -> None:
+        if self._tail:
+            data = self._tail + data
+        cut = len(data) - len(data) % 3
+        if cut:
+            self._pieces.append(base64.b64encode(data[:cut]).decode("ascii"))
+        self._tail = data[cut:]
+
+    def finish(self) -> str:
+        if self._tail:
+            self._pieces.append(base64.b64encode(self._tail).decode("ascii"))
+            self._tail = b""
+        encoded = "".join(self._pieces)
+        self._pieces = [encoded]
+        return encoded
+
+
+@dataclass(eq=False)
+class AdmissionTicket:
+    """一个已受理的请求。完成后交给 AdmissionController.release 归还排队时长；sending 之后不再被取代。"""
+
+    stream_id: str
+    priority: int
+    seconds: float
+    task: Optional[asyncio.Task] = None
+    sending: bool = False
+    superseded: bool = False
+    released: bool = False
+
+
+class AdmissionController:
+    """合成请求的准入控制，在语言改写和调度排队之前决定是否受理。
+
+    关键词和 Action 等自动触发的请求按聊天流和用户各用一个令牌桶限速；已受理、尚未完成的请求按文本长度估计语音时长，
+    总和不超过 max_queued_seconds，其中 command_reserved_share 的份额只留给 /vits 命令。
+    自动触发的请求超限时，若同一聊天流里已有尚未开始发送的自动请求，latest_wins 为 True 时取消旧请求、由新请求顶替，否则拒绝。
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.stream_rate = 0.0
+        self.stream_burst = 1.0
+        self.user_rate = 0.0
+        self.user_burst = 1.0
+        self.max_queued_seconds = 0.0
+        self.command_reserved_share = 0.0
+        self.latest_wins = True
+        self.queued_seconds = 0.0
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._pending: dict[str, AdmissionTicket] = {}
+
+    def configure(
+        self,
+        enabled: bool,
+        stream_rate_per_minute: float,
+        stream_burst: int,
+        user_rate_per_minute: float,
+        user_burst: int,
+        max_queued_seconds: float,
+        command_reserved_share: float,
+        latest_wins: bool,
+    ) -> None:
+        self.enabled = bool(enabled)
+        self.stream_rate = max(0.0, float(stream_rate_per_minute)) / 60.0
+        self.stream_burst = float(max(1, int(stream_burst)))
+        self.user_rate = max(0.0, float(user_rate_per_minute)) / 60.0
+        self.user_burst = float(max(1, int(user_burst)))
+        self.max_queued_seconds = max(0.0, float(max_queued_seconds))
+        self.command_reserved_share = min(1.0, max(0.0, float(command_reserved_share)))
+        self.latest_wins = bool(latest_wins)
+        self._buckets.clear()
+
+    def admit(
+        self,
+        stream_id: str,
+        user_id: str,
+        priority: int,
+        seconds: float,
+        now: Optional[float] = None,
+    ) -> tuple[Optional[AdmissionTicket], str]:
+        """返回 (票据, 原因)。票据为 None 时原因为 rate_limited 或 queue_full；
+        原因为 superseded 表示受理了本请求并取消了同一聊天流中较早的自动请求。"""
+        if not self.enabled:
+            return AdmissionTicket(stream_id, priority, 0.0), ""
+        if priority <= PRIORITY_COMMAND:
+            if not self._fits(seconds, self.max_queued_seconds):
+                return None, "queue_full"
+            ticket = AdmissionTicket(stream_id, priority, seconds)
+            self.queued_seconds += seconds
+            return ticket, ""
+
+        now = time.monotonic() if now is None else now
+        buckets = []
+        if self.stream_rate > 0:
+            buckets.append((f"s:{stream_id}", self.stream_rate, self.stream_burst))
+        if self.user_rate > 0 and user_id:
+            buckets.append((f"u:{user_id}", self.user_rate, self.user_burst))
+        reason = ""
+        if not self._fits(seconds, self.max_queued_seconds * (1.0 - self.command_reserved_share)):
+            reason = "queue_full"
+        elif not self._take_tokens(buckets, now):
+            reason = "rate_limited"
+        if reason:
+            previous = self._pending.get(stream_id)
+            if not self.latest_wins or previous is None or previous.sending:
+                return None, reason
+            # 顶替的请求沿用被取消请求的令牌和排队额度
+            self.release(previous)
+            previous.superseded = True
+            if previous.task is not None:
+                previous.task.cancel()
+            reason = "superseded"
+
+        ticket = AdmissionTicket(stream_id, priority, seconds)
+        self.queued_seconds += seconds
+        self._pending[stream_id] = ticket
+        return ticket, reason
+
+    def release(self, ticket: AdmissionTicket) -> None:
+        if ticket.released:
+            return
+        ticket.released = True
+        self.queued_seconds = max(0.0, self.queued_seconds - ticket.seconds)
+        if self._pending.get(ticket.stream_id) is ticket:
+            del self._pending[ticket.stream_id]
+
+    def _fits(self, seconds: float, limit: float) -> bool:
+        if self.max_queued_seconds <= 0:
+            return True
+        # 队列为空时总是受理，估计时长超过上限的单个请求也能执行
+        return self.queued_seconds + seconds <= limit or (self.queued_seconds < 1e-6 and limit > 0)
+
+    def _take_tokens(self, buckets: list[tuple[str, float, float]], now: float) -> bool:
+        """所有令牌桶都至少有一个令牌时各取走一个；任何一个不足则都不扣。"""
+        levels = []
+        for key, rate, burst in buckets:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            levels.append((key, min(burst, tokens + (now - updated) * rate)))
+        granted = all(tokens >= 1.0 for _, tokens in levels)
+        for key, tokens in levels:
+            self._buckets[key] = (tokens - 1.0 if granted else tokens, now)
+        if len(self._buckets) > 4096:
+            self._prune(now)
+        return granted
+
+    def _prune(self, now: float) -> None:
+        """丢弃已经回满的令牌桶，回满的桶与不存在的桶等价。"""
+        for key, (tokens, updated) in list(self._buckets.items()):
+            rate, burst = (self.stream_rate, self.stream_burst) if key[0] == "s" else (self.user_rate, self.user_burst)
+            if tokens + (now - updated) * rate >= burst:
+                del self._buckets[key]
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "queued_seconds": self.queued_seconds,
+            "max_queued_seconds": self.max_queued_seconds,
+            "pending_streams": len(self._pending),
+        }
+
+
+class SynthesisScheduler:
+    """限制单个后端的并发请求数，按优先级排队，同一优先级内按 stream_id 轮转。
+
+    请求可带上音色（affinity），轮到的聊天流与正在合成的音色不同时，优先放行排头请求音色相同的聊天流，
+    让后端尽量少切换模型；连续插队次数受 affinity_max_skips 限制，避免其他音色一直排不上。
+    """
+
+    def __init__(self, max_concurrency: int = 2, affinity_max_skips: int = 0) -> None:
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.affinity_max_skips = max(0, int(affinity_max_skips))
+        self._running = 0
+        self._waiting = 0
+        self._queues: dict[int, OrderedDict[str, deque[tuple[asyncio.Future, str]]]] = {}
+        self._running_affinities: dict[str, int] = {}
+        self._last_affinity = ""
+        self._affinity_skips = 0
+        self.dispatched = 0
+        self.affinity_reorders = 0
+        self.max_queue_depth = 0
+        self._wait_times: deque[float] = deque(maxlen=256)
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def configure(self, max_concurrency: int, affinity_max_skips: Optional[int] = None) -> None:
+        self.max_concurrency = max(1, int(max_concurrency))
+        if affinity_max_skips is not None:
+            self.affinity_max_skips = max(0, int(affinity_max_skips))
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        stream_id: str = "",
+        priority: int = PRIORITY_ACTION,
+        timeout: Optional[float] = None,
+        affinity: str = "",
+    ) -> AsyncIterator[float]:
+        """占用一个并发名额，返回排队耗时（秒）；排队超过 timeout 时抛出 asyncio.TimeoutError。"""
+        started = time.monotonic()
+        if timeout is None:
+            await self._acquire(stream_id, priority, affinity)
+        else:
+            await asyncio.wait_for(self._acquire(stream_id, priority, affinity), max(0.0, timeout))
+        waited = time.monotonic() - started
+        self._wait_times.append(waited)
+        self.dispatched += 1
+        try:
+            yield waited
+        finally:
+            self._release(affinity)
+
+    def snapshot(self) -> dict[str, Any]:
+        waits = list(self._wait_times)
+        return {
+            "running": self._running,
+            "queued": self._waiting,
+            "max_queued": self.max_queue_depth,
+            "dispatched": self.dispatched,
+            "affinity_reorders": self.affinity_reorders,
+            "avg_wait": sum(waits) / len(waits) if waits else 0.0,
+            "max_wait": max(waits) if waits else 0.0,
+        }
+
+    async def _acquire(self, stream_id: str, priority: int, affinity: str) -> None:
+        if self._running < self.max_concurrency and not self._waiting:
+            self._start(affinity)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, affinity)
+        self._queues.setdefault(priority, OrderedDict()).setdefault(stream_id, deque()).append(entry)
+        self._waiting += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._waiting)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 名额已经分配给本请求，但等待方被取消，转交给下一个请求
+                self._release(affinity)
+            else:
+                self._discard(priority, stream_id, entry)
+            raise
+
+    def _start(self, affinity: str) -> None:
+        self._running += 1
+        self._running_affinities[affinity] = self._running_affinities.get(affinity, 0) + 1
+        self._last_affinity = affinity
+
+    def _release(self, affinity: str) -> None:
+        self._running -= 1
+        remaining = self._running_affinities.get(affinity, 0) - 1
+        if remaining > 0:
+            self._running_affinities[affinity] = remaining
+        else:
+            self._running_affinities.pop(affinity, None)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._running < self.max_concurrency:
+            entry = self._next_waiter()
+            if entry is None:
+                return
+            future, affinity = entry
+            self._start(affinity)
+            future.set_result(None)
+
+    def _next_waiter(self) -> Optional[tuple[asyncio.Future, str]]:
+        for priority in sorted(self._queues):
+            streams = self._queues[priority]
+            while streams:
+                stream_id = self._affine_stream(streams)
+                waiters = streams[stream_id]
+                entry = waiters.popleft()
+                if waiters:
+                    streams.move_to_end(stream_id)
+                else:
+                    del streams[stream_id]
+                self._waiting -= 1
+                if not entry[0].done():
+                    return entry
+        return None
+
+    def _affine_stream(self, streams: OrderedDict[str, deque[tuple[asyncio.Future, str]]]) -> str:
+        """返回本次放行的聊天流：默认是轮转到的第一个，必要时换成排头请求音色与后端当前音色相同的聊天流。"""
+        head = next(iter(streams))
+        if not self.affinity_max_skips:
+            return head
+        warm = set(self._running_affinities) or {self._last_affinity}
+        if streams[head][0][1] in warm or self._affinity_skips >= self.affinity_max_skips:
+            self._affinity_skips = 0
+            return head
+        for stream_id, waiters in streams.items():
+            if waiters[0][1] in warm:
+                self._affinity_skips += 1
+                self.affinity_reorders += 1
+                return stream_id
+        self._affinity_skips = 0
+        return head
+
+    def _discard(self, priority: int, stream_id: str, entry: tuple[asyncio.Future, str]) -> None:
+        streams = self._queues.get(priority)
+        waiters = streams.get(stream_id) if streams else None
+        if not waiters or entry not in waiters:
+            return
+        waiters.remove(entry)
+        self._waiting -= 1
+        if not waiters:
+            del streams[stream_id]
+
+
+@dataclass
+class BackendState:
+    """单个 GPT-SoVITS 后端的负载、熔断与延迟统计。"""
+
+    url: str
+    weight: float = 1.0
+    max_concurrency: int = 2
+    outstanding: int = 0
+    consecutive_failures: int = 0
+    ejected_at: Optional[float] = None
+    latency_ewma: Optional[float] = None
+    requests: int = 0
+    failures: int = 0
+    endpoint: Optional[str] = None
+    api_flavor: Optional[str] = None
+    flavor_probed: bool = False
+    detected_endpoint: Optional[tuple[str, str]] = None
+    # 后端当前加载的模型权重和设置过的参考音频，None 表示未知
+    loaded_weights: Optional[tuple[str, str]] = None
+    pinned_ref: Optional[tuple[str, str, str]] = None
+    active_voice: str = ""
+    weight_users: int = 0
+    weights_supported: Optional[bool] = None
+    ref_pinning_supported: Optional[bool] = None
+    voice_changed: asyncio.Condition = field(default_factory=asyncio.Condition, repr=False)
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejected_at is not None
+
+    @property
+    def base_url(self) -> str:
+        parsed = urlsplit(self.url)
+        return f"{parsed.scheme}://{parsed.netloc}/" if parsed.netloc else self.url
+
+    def forget_endpoint(self) -> None:
+        self.endpoint = None
+        self.api_flavor = None
+        self.flavor_probed = False
+        self.detected_endpoint = None
+        # 后端可能已重启或更换版本，之前加载的模型和参考音频不再可信
+        self.loaded_weights = None
+        self.pinned_ref = None
+        self.weights_supported = None
+        self.ref_pinning_supported = None
+
+    @contextmanager
+    def claimed(self):
+        """占用一个并发名额，从选中后端起一直到请求结束，包括切换模型和设置参考音频的等待。"""
+        self.outstanding += 1
+        try:
+            yield self
+        finally:
+            self.outstanding -= 1
+
+
+class BackendPool:
+    """多后端负载均衡：选择未熔断且未满载的后端中按权重计算未完成请求最少的一个。"""
+
+    def __init__(self) -> None:
+        self.backends: list[BackendState] = []
+        self.failure_threshold = 3
+        self.recovery_seconds = 30.0
+
+    def configure(
+        self,
+        specs: list[tuple[str, float, int]],
+        failure_threshold: int,
+        recovery_seconds: float,
+    ) -> None:
+        """按新配置重建后端列表，URL 不变的后端保留其运行状态。"""
+        existing = {backend.url: backend for backend in self.backends}
+        backends = []
+        for url, weight, max_concurrency in specs:
+            backend = existing.get(url) or BackendState(url=url)
+            backend.weight = weight
+            backend.max_concurrency = max_concurrency
+            backend.forget_endpoint()
+            backends.append(backend)
+        self.backends = backends
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.recovery_seconds = max(0.0, float(recovery_seconds))
+
+    @property
+    def capacity(self) -> int:
+        """未熔断后端的并发容量之和；全部熔断时仍保留一个名额用于探测恢复。"""
+        return max(1, sum(backend.max_concurrency for backend in self.backends if not backend.ejected))
+
+    def pick(
+        self,
+        avoid: Optional[set[str]] = None,
+        weights: Optional[tuple[str, str]] = None,
+    ) -> Optional[BackendState]:
+        """avoid 中的后端（通常是本次请求已失败过的）只在没有其他可用后端时才会被选中；
+        指定 weights 时优先选择已加载该模型的后端，减少模型切换。"""
+        candidates = [b for b in self.backends if not b.ejected and b.outstanding < b.max_concurrency]
+        preferred = [b for b in candidates if b.url not in (avoid or ())]
+        if preferred:
+            candidates = preferred
+        if not candidates:
+            # 所有后端都熔断或满载时退回到全部后端中选择，避免请求完全无处可发
+            candidates = self.backends
+        if not candidates:
+            return None
+        return min(
+            candidates,
+            key=lambda b: (
+                b.ejected,
+                weights is not None and b.loaded_weights is not None and b.loaded_weights != weights,
+                b.outstanding / max(b.weight, 0.01),
+                b.latency_ewma or 0.0,
+            ),
+        )
+
+    def record_success(self, backend: BackendState, latency: Optional[float] = None) -> bool:
+        """记录后端正常响应（latency 为合成耗时，非音频响应不计），返回后端是否因此从熔断中恢复。"""
+        backend.requests += 1
+        backend.consecutive_failures = 0
+        if latency is not None:
+            if backend.latency_ewma is None:
+                backend.latency_ewma = latency
+            else:
+                backend.latency_ewma = backend.latency_ewma * 0.8 + latency * 0.2
+        return self._restore(backend)
+
+    def record_failure(self, backend: BackendState) -> bool:
+        """记录超时、连接错误或 5xx，返回后端是否因此被熔断。"""
+        backend.requests += 1
+        backend.failures += 1
+        backend.consecutive_failures += 1
+        if backend.ejected or backend.consecutive_failures < self.failure_threshold:
+            return False
+        backend.ejected_at = time.monotonic()
+        return True
+
+    def record_probe(self, backend: BackendState, healthy: bool) -> Optional[bool]:
+        """记录健康检查结果，返回 True/False 表示后端被恢复/熔断，None 表示状态未变。"""
+        if healthy:
+            if backend.ejected and time.monotonic() - backend.ejected_at >= self.recovery_seconds:
+                backend.consecutive_failures = 0
+                return True if self._restore(backend) else None
+            return None
+        backend.consecutive_failures += 1
+        if not backend.ejected and backend.consecutive_failures >= self.failure_threshold:
+            backend.ejected_at = time.monotonic()
+            return False
+        return None
+
+    def snapshot(self) -> list[dict[str, Any]]:
+        return [
+            {
+                "url": backend.url,
+                "weight": backend.weight,
+                "max_concurrency": backend.max_concurrency,
+                "outstanding": backend.outstanding,
+                "ejected": backend.ejected,
+                "latency_ewma": backend.latency_ewma,
+                "requests": backend.requests,
+                "failures": backend.failures,
+                "endpoint": backend.endpoint,
+                "api_flavor": backend.api_flavor,
+                "voice": backend.active_voice,
+            }
+            for backend in self.backends
+        ]
+
+    @staticmethod
+    def _restore(backend: BackendState) -> bool:
+        if not backend.ejected:
+            return False
+        backend.ejected_at = None
+        return True
 
 
 class GPTSoVITSV2TTSPlugin(MaiBotPlugin):
@@ -79,82 +1299,711 @@ class GPTSoVITSV2TTSPlugin(MaiBotPlugin):
     def __init__(self) -> None:
         super().__init__()
         self._session: Optional[aiohttp.ClientSession] = None
+        self._session_signature: Optional[tuple] = None
+        self._retiring_sessions: set[asyncio.Task] = set()
         self._cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_audio_cache")
         os.makedirs(self._cache_dir, exist_ok=True)
+        self._ref_audio_digests: dict[str, tuple[int, int, str]] = {}
+        self._ref_audio_stats: dict[str, tuple[float, Optional[tuple[int, int]]]] = {}
+        self._voice_profiles: dict[str, VoiceProfile] = {}
+        self._synthesis_cache_hits = 0
+        self._synthesis_cache_misses = 0
+        self._rewrite_cache = RewriteCache(
+            persist_path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_rewrite_cache.json")
+        )
+        self._rewrite_cache_signature: Optional[tuple[str, str]] = None
+        self._inflight_syntheses: dict[str, asyncio.Task] = {}
+        self._inflight_waiters: dict[asyncio.Task, int] = {}
+        self._admission = AdmissionController()
+        self._scheduler = SynthesisScheduler()
+        self._backend_pool = BackendPool()
+        self._health_task: Optional[asyncio.Task] = None
+        self._backend_streaming_supported: Optional[bool] = None
+        self._cache_index = AudioCacheIndex()
+        self._janitor_task: Optional[asyncio.Task] = None
+        self._janitor_wakeup = asyncio.Event()
+        self._keyword_matcher: Optional[KeywordMatcher] = None
+        self._rewrites_avoided = 0
+        self._rewrite_batches: dict[tuple[str, str], list[tuple[str, int, asyncio.Future]]] = {}
+        self._rewrite_batch_tasks: set[asyncio.Task] = set()
+        self._rewrite_inflight: dict[tuple[str, str], int] = {}
+        self._rewrite_batch_calls = 0
+        self._rewrite_batched_items = 0
+        self._stats = LatencyStats()
+        self._stats_task: Optional[asyncio.Task] = None
+        self._warmup_task: Optional[asyncio.Task] = None
+        self._warmup_status = "未启用"
+        self._canned_audio: dict[str, SynthesizedAudio] = {}
+        self._postprocess_encoder: Optional[str] = None
 
     async def on_load(self) -> None:
+        await self._configure_rewrite_cache(load=True)
+        await self._rebuild_cache_index()
+        self._start_cache_janitor()
+        self._configure_keyword_matcher()
+        self._configure_voice_profiles()
+        self._configure_backends()
+        self._configure_stats()
+        self._configure_postprocess()
+        self._configure_admission()
         if self.config.plugin.enabled:
             await self._ensure_session()
+            self._start_health_checks()
+            self._start_warmup()
         self.ctx.logger.info("GPT-SoVITS TTS 插件加载完成")
 
     async def on_unload(self) -> None:
+        await self._stop_warmup()
+        await self._stop_health_checks()
+        await self._stop_cache_janitor()
+        await self._stop_stats_export()
+        for task in list(self._inflight_syntheses.values()):
+            task.cancel()
+        self._inflight_syntheses.clear()
+        for task in list(self._rewrite_batch_tasks):
+            task.cancel()
+        for batch in self._rewrite_batches.values():
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_result("")
+        self._rewrite_batches.clear()
+        self._rewrite_inflight.clear()
         await self._close_session()
+        await self._save_rewrite_cache()
         self.ctx.logger.info("GPT-SoVITS TTS 插件已卸载")
 
     async def on_config_update(self, scope: str, config_data: dict[str, object], version: str) -> None:
         del config_data, version
         if scope == CONFIG_RELOAD_SCOPE_SELF:
-            await self._close_session()
+            await self._stop_warmup()
+            await self._configure_rewrite_cache()
+            # 让清理任务按新的容量和过期时间立即跑一轮
+            self._janitor_wakeup.set()
+            self._configure_keyword_matcher()
+            self._ref_audio_stats.clear()
+            self._configure_voice_profiles()
+            await self._stop_stats_export()
+            self._configure_stats()
+            self._configure_postprocess()
+            self._configure_admission()
+            await self._stop_health_checks()
+            self._configure_backends()
+            self._backend_streaming_supported = None
             if self.config.plugin.enabled:
-                await self._ensure_session()
+                await self._refresh_session()
+                self._start_health_checks()
+                self._start_warmup()
+            else:
+                await self._close_session()
 
-    @Action(
-        "vits_tts_action",
-        description="使用 GPT-SoVITS 语音合成将文本转换为语音发送",
-        activation_type=ActivationType.KEYWORD,
-        activation_keywords=["语音", "说话", "朗读", "念出来", "用语音说", "vits", "tts"],
-        action_parameters={
-            "text": "需要朗读的文本内容。优先按插件 config.toml 中 vits.language 指定的语言组织原句，例如 language=ja 时应传入自然日语。",
-            "voice_id": "音色 ID，可选",
-        },
-        action_require=["用户明确要求语音、朗读、念出文本时使用", "待朗读文本应尽量使用 TTS 配置的目标语言"],
-        associated_types=["text"],
-    )
-    async def handle_vits_action(self, stream_id: str = "", text: str = "", voice_id: str = "", **kwargs: Any):
-        del kwargs
-        if not self.config.components.action_enabled:
-            return False, "关键词语音触发未启用"
-        success, message, _ = await self._synthesize_and_send(
-            text=text,
-            stream_id=stream_id,
-            voice_id=voice_id or None,
+    def _configure_backends(self) -> None:
+        default_concurrency = max(1, int(self.config.scheduler.max_concurrency_per_backend))
+        self._backend_pool.configure(
+            self._parse_backends(self.config.vits.api_url, default_concurrency),
+            failure_threshold=int(self.config.backends.failure_threshold),
+            recovery_seconds=float(self.config.backends.recovery_seconds),
+        )
+        self._scheduler.configure(
+            self._backend_pool.capacity,
+            affinity_max_skips=int(self.config.scheduler.voice_affinity_max_skips),
         )
-        return success, message
-
-    @Command("vits_tts_command", description="手动语音合成", pattern=r"^/vits\s+(?P<text>.+?)(?:\s+(?P<voice_id>\d+))?$")
-    async def handle_vits_command(self, stream_id: str = "", **kwargs: Any):
-        if not self.config.components.command_enabled:
-            return False, "/vits 命令未启用", True
 
-        matched_groups = kwargs.get("matched_groups")
-        if not isinstance(matched_groups, dict):
-            matched_groups = {}
+    @staticmethod
+    def _parse_backends(api_url: str, default_concurrency: int) -> list[tuple[str, float, int]]:
+        """解析 api_url，返回 [(url, weight, max_concurrency)]。
 
-        text = str(matched_groups.get("text") or "").strip()
-        voice_id = str(matched_groups.get("voice_id") or "").strip() or None
-        return await self._synthesize_and_send(text=text, stream_id=stream_id, voice_id=voice_id)
+        多个后端用逗号或换行分隔，每个后端可附加参数，例如
+        ``http://10.0.0.2:9880/;weight=2;max_concurrency=4``。
+        """
+        specs: list[tuple[str, float, int]] = []
+        seen: set[str] = set()
+        for entry in re.split(r"[,，\n]+", api_url or ""):
+            parts = [part.strip() for part in entry.split(";") if part.strip()]
+            if not parts or parts[0] in seen:
+                continue
+            url = parts[0]
+            weight = 1.0
+            max_concurrency = default_concurrency
+            for option in parts[1:]:
+                name, _, value = option.partition("=")
+                name = name.strip().lower()
+                try:
+                    if name == "weight":
+                        weight = max(0.01, float(value))
+                    elif name in {"max_concurrency", "max"}:
+                        max_concurrency = max(1, int(value))
+                except ValueError:
+                    continue
+            seen.add(url)
+            specs.append((url, weight, max_concurrency))
+        return specs
 
-    @Command(
-        "vits_keyword_command",
-        description="显式关键词直接触发语音",
-        pattern=r"(?<!/)(?:再发一句语音|再来一句语音|发语音|发一句语音|来句语音|来一句语音|再说一句|再说句话|说句话|说一句|念一句|朗读|念出来|用语音说|语音说)",
-    )
-    async def handle_vits_keyword_command(self, text: str = "", stream_id: str = "", **kwargs: Any):
-        del kwargs
-        if (
-            not self.config.plugin.enabled
-            or not self.config.components.action_enabled
-            or not self.config.vits.keyword_trigger_enabled
-        ):
-            return False, None, False
+    def _configure_voice_profiles(self) -> None:
+        profiles: dict[str, VoiceProfile] = {}
+        for profile in self._parse_voice_profiles(self.config.vits.voice_profiles, self.config.vits.language):
+            if profile.name.isdigit() or ":" in profile.name:
+                self.ctx.logger.warning("TTS 音色名称不能是纯数字或包含冒号，已忽略: %s", profile.name)
+                continue
+            if not profile.ref_audio_path:
+                self.ctx.logger.warning("TTS 音色 %s 未配置参考音频 ref，已忽略", profile.name)
+                continue
+            if self._ref_audio_stat(profile.ref_audio_path) is None:
+                self.ctx.logger.warning("TTS 音色 %s 的参考音频不存在: %s", profile.name, profile.ref_audio_path)
+            profiles[profile.name.lower()] = profile
+        self._voice_profiles = profiles
+        default_name = (self.config.vits.default_voice_profile or "").strip()
+        if default_name and default_name.lower() not in profiles:
+            self.ctx.logger.warning("默认音色 %s 不存在，使用 vits.ref_audio_path", default_name)
+        if profiles:
+            self.ctx.logger.info("TTS 已加载 %s 个命名音色: %s", len(profiles), "，".join(p.name for p in profiles.values()))
 
-        tts_text = self._extract_keyword_tts_text(text)
+    @staticmethod
+    def _parse_voice_profiles(raw: str, default_language: str) -> list[VoiceProfile]:
+        """解析 voice_profiles，每行一个音色，名称后附加参数，例如
+        ``yuki;ref=D:/ref/yuki.wav;prompt=こんにちは;lang=ja;speed=1.1;gpt=D:/w/yuki.ckpt;sovits=D:/w/yuki.pth``。
+        """
+        profiles: list[VoiceProfile] = []
+        seen: set[str] = set()
+        for line in (raw or "").splitlines():
+            parts = [part.strip() for part in line.split(";") if part.strip()]
+            if not parts or parts[0].startswith("#") or parts[0].lower() in seen:
+                continue
+            options: dict[str, str] = {}
+            for option in parts[1:]:
+                name, _, value = option.partition("=")
+                options[name.strip().lower()] = value.strip()
+            try:
+                speed = max(0.1, float(options.get("speed") or 1.0))
+            except ValueError:
+                speed = 1.0
+            seen.add(parts[0].lower())
+            profiles.append(
+                VoiceProfile(
+                    name=parts[0],
+                    ref_audio_path=options.get("ref", ""),
+                    prompt_text=options.get("prompt", ""),
+                    language=options.get("lang") or default_language,
+                    speed=speed,
+                    gpt_weights=options.get("gpt", ""),
+                    sovits_weights=options.get("sovits", ""),
+                )
+            )
+        return profiles
+
+    def _default_voice_profile(self) -> VoiceProfile:
+        vits_config = self.config.vits
+        profile = self._voice_profiles.get((vits_config.default_voice_profile or "").strip().lower())
+        if profile is not None:
+            return profile
+        return VoiceProfile(
+            name="",
+            ref_audio_path=vits_config.ref_audio_path,
+            prompt_text=vits_config.prompt_text or "",
+            language=vits_config.language,
+        )
+
+    def _resolve_voice(self, voice_id: Optional[str]) -> tuple[int, Optional[VoiceProfile]]:
+        """voice_id 可以是音色 ID、命名音色，或 "命名音色:音色 ID"，返回 (speaker_id, 音色)。
+
+        指定的命名音色不存在时返回的音色为 None。
+        """
+        value = (voice_id or "").strip()
+        name, speaker = "", value
+        if ":" in value:
+            name, _, speaker = value.rpartition(":")
+        elif value and not value.isdigit():
+            name, speaker = value, ""
+        spk_id = self._resolve_speaker_id(speaker.strip() or None, self.config.vits.default_voice_id)
+        if not name.strip():
+            return spk_id, self._default_voice_profile()
+        return spk_id, self._voice_profiles.get(name.strip().lower())
+
+    def _start_health_checks(self) -> None:
+        interval = float(self.config.backends.health_check_interval)
+        if interval <= 0 or not self._backend_pool.backends:
+            return
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_check_loop(interval))
+
+    def _configure_stats(self) -> None:
+        self._stats.configure(self.config.stats.enabled, self.config.stats.window_size)
+        path = (self.config.stats.prometheus_path or "").strip()
+        if self.config.stats.enabled and path and (self._stats_task is None or self._stats_task.done()):
+            interval = max(1.0, float(self.config.stats.prometheus_interval_seconds))
+            self._stats_task = asyncio.create_task(self._stats_export_loop(path, interval))
+
+    def _configure_admission(self) -> None:
+        config = self.config.admission
+        self._admission.configure(
+            enabled=config.enabled,
+            stream_rate_per_minute=config.stream_rate_per_minute,
+            stream_burst=config.stream_burst,
+            user_rate_per_minute=config.user_rate_per_minute,
+            user_burst=config.user_burst,
+            max_queued_seconds=config.max_queued_audio_seconds,
+            command_reserved_share=config.command_reserved_share,
+            latest_wins=(config.overflow_policy or "").strip().lower() != "reject",
+        )
+
+    def _estimate_audio_seconds(self, text: str) -> float:
+        """按文本长度粗略估计语音时长（秒），用于准入控制的排队时长上限。"""
+        chars_per_second = max(0.5, float(self.config.admission.chars_per_second))
+        return max(1.0, len((text or "").strip()) / chars_per_second)
+
+    def _configure_postprocess(self) -> None:
+        """检查音频后处理所需的 numpy 和 ffmpeg，缺少时降级并记录日志。"""
+        config = self.config.postprocess
+        self._postprocess_encoder = None
+        if not config.enabled:
+            return
+        if np is None:
+            self.ctx.logger.warning("未安装 numpy，音频后处理跳过静音裁剪、归一化和重采样")
+        codec = (config.output_codec or "wav").strip().lower()
+        if codec == "wav":
+            return
+        if codec not in _POSTPROCESS_CODECS:
+            self.ctx.logger.warning("不支持的音频编码 %s，音频后处理输出 WAV", codec)
+            return
+        self._postprocess_encoder = shutil.which((config.ffmpeg_path or "ffmpeg").strip())
+        if self._postprocess_encoder is None:
+            self.ctx.logger.warning("未找到 ffmpeg (%s)，音频后处理输出 WAV", config.ffmpeg_path)
+
+    def _postprocess_signature(self) -> Optional[str]:
+        """当前后处理参数的摘要，用于区分缓存文件和合并请求；未启用或无法处理时返回 None。"""
+        config = self.config.postprocess
+        if not config.enabled or (np is None and self._postprocess_encoder is None):
+            return None
+        key_data = [
+            np is not None,
+            bool(config.trim_silence),
+            float(config.silence_threshold_db),
+            int(config.keep_silence_ms),
+            (config.normalize or "off").strip().lower(),
+            float(config.peak_target_db),
+            float(config.loudness_target_db),
+            bool(config.downmix_mono),
+            int(config.sample_rate),
+            self._output_format(),
+            int(config.bitrate_kbps),
+        ]
+        return hashlib.sha256(json.dumps(key_data).encode("utf-8")).hexdigest()[:8]
+
+    def _output_format(self) -> str:
+        """最终发送的音频格式，也是缓存和预合成文件的扩展名。"""
+        if self._postprocess_encoder is not None:
+            return _POSTPROCESS_CODECS[(self.config.postprocess.output_codec or "").strip().lower()][0]
+        if self.config.postprocess.enabled and np is not None:
+            return "wav"
+        return self.config.vits.audio_format or "wav"
+
+    async def _stop_stats_export(self) -> None:
+        task, self._stats_task = self._stats_task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _stats_export_loop(self, path: str, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            content = self._stats.render_prometheus(self._stats_gauges())
+            try:
+                await asyncio.to_thread(self._write_text_atomic, path, content)
+            except OSError as exc:
+                self.ctx.logger.warning("写出 TTS Prometheus 快照失败: %s", exc)
+
+    @staticmethod
+    def _write_text_atomic(path: str, content: str) -> None:
+        temp_path = f"{path}.{uuid.uuid4().hex[:8]}.part"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+    def _stats_gauges(self) -> dict[str, float]:
+        scheduler = self._scheduler.snapshot()
+        return {
+            "scheduler_running": scheduler["running"],
+            "scheduler_queued": scheduler["queued"],
+            "cache_files": len(self._cache_index),
+            "cache_bytes": self._cache_index.total_bytes,
+            "backends_ejected": sum(1 for backend in self._backend_pool.backends if backend.ejected),
+            "warmup_ready": int(self._warmup_status.startswith("已完成")),
+            "canned_phrases": len(self._canned_audio),
+            "admission_queued_seconds": self._admission.queued_seconds,
+        }
+
+    def _start_warmup(self) -> None:
+        if not self.config.warmup.enabled:
+            self._warmup_status = "未启用"
+            self._canned_audio = {}
+            return
+        if self._warmup_task is None or self._warmup_task.done():
+            self._warmup_status = "进行中"
+            self._warmup_task = asyncio.create_task(self._run_warmup())
+
+    async def _stop_warmup(self) -> None:
+        task, self._warmup_task = self._warmup_task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run_warmup(self) -> None:
+        """后台预热：建立到各后端的连接并识别接口，为每个音色合成一次短句，再预先合成固定短语。"""
+        started = time.monotonic()
+        try:
+            backends = [backend for backend in self._backend_pool.backends if not backend.ejected]
+            profiles = self._warmup_profiles()
+            results = await asyncio.gather(*(self._warm_backend(backend, profiles) for backend in backends))
+            canned_ready, canned_total = await self._prepare_canned_audio()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            self._warmup_status = "失败"
+            self.ctx.logger.error("TTS 预热出错: %r", exc)
+            return
+        elapsed = time.monotonic() - started
+        self._warmup_status = f"已完成（{elapsed:.1f}s）"
+        self.ctx.logger.info(
+            "TTS 预热完成（%.1fs）：音色预热 %s/%s，固定短语 %s/%s 就绪",
+            elapsed,
+            sum(results),
+            len(backends) * len(profiles),
+            canned_ready,
+            canned_total,
+        )
+
+    def _warmup_profiles(self) -> list[VoiceProfile]:
+        """需要预热的音色：默认音色和全部命名音色，按模型权重排序以减少预热时的模型切换。"""
+        profiles: dict[str, VoiceProfile] = {}
+        for profile in (self._default_voice_profile(), *self._voice_profiles.values()):
+            if profile.name in profiles or not profile.ref_audio_path:
+                continue
+            if self._ref_audio_stat(profile.ref_audio_path) is None:
+                continue
+            profiles[profile.name] = profile
+        return sorted(profiles.values(), key=lambda profile: profile.weights or ("", ""))
+
+    async def _warm_backend(self, backend: BackendState, profiles: list[VoiceProfile]) -> int:
+        """依次为每个音色向该后端直接发送一次短句合成（不读写缓存），返回成功的音色数。"""
+        await self._ensure_session()
+        if not self._session:
+            return 0
+        await self._resolve_endpoints(backend)
+        spk_id = self._resolve_speaker_id(None, self.config.vits.default_voice_id)
+        warmed = 0
+        for profile in profiles:
+            text = (self.config.warmup.warmup_text or "").strip()
+            text = text or _WARMUP_TEXTS.get(self._normalize_language(profile.language)[0], "Hello.")
+            payload = self._build_tts_payload(text, spk_id, profile)
+            deadline = self._synthesis_deadline()
+            audio = None
+            try:
+                async with self._scheduler.slot(
+                    _WARMUP_STREAM_ID, PRIORITY_BACKGROUND, timeout=deadline - time.monotonic(), affinity=profile.name
+                ):
+                    with backend.claimed():
+                        async with self._backend_voice(backend, profile, deadline) as (error, _):
+                            if error is None:
+                                audio, error, _ = await self._request_backend(backend, payload, None, 1, 1, deadline)
+            except asyncio.TimeoutError:
+                error = "排队超过截止时间"
+            if audio is None:
+                self.ctx.logger.warning("TTS 预热失败: 后端 %s 音色 %s: %s", backend.url, profile.name or "默认", error)
+                continue
+            warmed += 1
+        return warmed
+
+    async def _prepare_canned_audio(self) -> tuple[int, int]:
+        """预先合成固定短语，保存在缓存目录下的 canned/ 中，不参与缓存过期和容量淘汰，返回 (就绪数, 总数)。
+
+        文件名由合成参数决定，重启后直接从磁盘载入；配置变化后不再需要的文件会被删除。
+        """
+        phrases = [line.strip() for line in (self.config.warmup.canned_phrases or "").splitlines() if line.strip()]
+        default_text = (self.config.vits.keyword_default_text or "").strip()
+        if self.config.warmup.include_keyword_default_text and default_text:
+            phrases.append(default_text)
+        audio_format = self._output_format()
+        wanted: dict[str, tuple[str, str]] = {}
+        for phrase in phrases:
+            key = self._synthesis_flight_key(phrase, None)
+            filename = f"{hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]}.{audio_format}"
+            wanted[key] = (phrase, filename)
+
+        canned_dir = os.path.join(self._cache_dir, "canned")
+        stored = await asyncio.to_thread(self._sync_canned_dir, canned_dir, {name for _, name in wanted.values()})
+        canned: dict[str, SynthesizedAudio] = {}
+        for key, (_, filename) in wanted.items():
+            content = stored.get(filename)
+            if content:
+                canned[key] = SynthesizedAudio(
+                    path=os.path.join(canned_dir, filename),
+                    audio_base64=base64.b64encode(content).decode("ascii"),
+                    size=len(content),
+                )
+        self._canned_audio = dict(canned)
+
+        for key, (phrase, filename) in wanted.items():
+            if key in canned:
+                continue
+            audio = await self._synthesize_audio(
+                phrase, stream_id=_WARMUP_STREAM_ID, priority=PRIORITY_BACKGROUND, write_file=False
+            )
+            if audio is None:
+                self.ctx.logger.warning("TTS 固定短语预合成失败: %s", phrase[:80])
+                continue
+            if audio.audio_base64 is None:
+                audio.audio_base64 = await self._read_file_base64(audio.path)
+            content = base64.b64decode(audio.audio_base64)
+            path = os.path.join(canned_dir, filename)
+            await asyncio.to_thread(self._write_bytes_atomic, path, content)
+            canned[key] = SynthesizedAudio(path=path, audio_base64=audio.audio_base64, size=len(content))
+            self._canned_audio[key] = canned[key]
+        return len(canned), len(wanted)
+
+    @staticmethod
+    def _sync_canned_dir(canned_dir: str, keep: set[str]) -> dict[str, bytes]:
+        """读取 canned 目录中仍需要的音频并删除其余文件，返回 {文件名: 内容}。"""
+        os.makedirs(canned_dir, exist_ok=True)
+        contents: dict[str, bytes] = {}
+        with os.scandir(canned_dir) as entries:
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                try:
+                    if entry.name in keep:
+                        with open(entry.path, "rb") as f:
+                            contents[entry.name] = f.read()
+                    else:
+                        os.remove(entry.path)
+                except OSError:
+                    continue
+        return contents
+
+    @staticmethod
+    def _write_bytes_atomic(path: str, content: bytes) -> None:
+        temp_path = f"{path}.{uuid.uuid4().hex[:8]}.part"
+        with open(temp_path, "wb") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+    def _lookup_canned_audio(self, text: str, voice_id: Optional[str]) -> Optional[SynthesizedAudio]:
+        if not self._canned_audio:
+            return None
+        audio = self._canned_audio.get(self._synthesis_flight_key(text, voice_id))
+        if audio is not None:
+            self._stats.incr("canned_hits")
+        return audio
+
+    async def _stop_health_checks(self) -> None:
+        task, self._health_task = self._health_task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _health_check_loop(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.gather(*(self._probe_backend(backend) for backend in self._backend_pool.backends))
+            except Exception as exc:
+                self.ctx.logger.warning("TTS 后端健康检查出错: %r", exc)
+
+    async def _probe_backend(self, backend: BackendState) -> None:
+        """轻量探测：GET 后端根路径，只要能收到非 5xx 的 HTTP 响应就视为存活。"""
+        if not self._session or self._session.closed:
+            return
+        timeout = aiohttp.ClientTimeout(total=max(0.1, float(self.config.backends.health_check_timeout)))
+        try:
+            async with self._session.get(backend.base_url, timeout=timeout) as resp:
+                healthy = resp.status < 500
+        except Exception:
+            healthy = False
+
+        changed = self._backend_pool.record_probe(backend, healthy)
+        if changed is True:
+            self.ctx.logger.info("TTS 后端已恢复: %s", backend.url)
+        elif changed is False:
+            self.ctx.logger.warning("TTS 后端健康检查连续失败，暂停使用: %s", backend.url)
+        if changed is not None:
+            self._scheduler.configure(self._backend_pool.capacity)
+
+    def _record_backend_result(self, backend: BackendState, healthy: bool, latency: Optional[float] = None) -> None:
+        if healthy:
+            if self._backend_pool.record_success(backend, latency):
+                self.ctx.logger.info("TTS 后端已恢复: %s", backend.url)
+                self._scheduler.configure(self._backend_pool.capacity)
+        elif self._backend_pool.record_failure(backend):
+            self.ctx.logger.warning(
+                "TTS 后端连续失败 %s 次，暂停使用: %s", backend.consecutive_failures, backend.url
+            )
+            self._scheduler.configure(self._backend_pool.capacity)
+
+    async def _configure_rewrite_cache(self, load: bool = False) -> None:
+        cache_config = self.config.cache
+        self._rewrite_cache.configure(
+            max_entries=int(cache_config.rewrite_cache_max_entries),
+            ttl_seconds=int(cache_config.rewrite_cache_ttl_minutes) * 60,
+        )
+
+        signature = (
+            str(self.config.vits.language_rewrite_model or ""),
+            self._normalize_language(self.config.vits.language)[0],
+        )
+        if self._rewrite_cache_signature is not None and signature != self._rewrite_cache_signature:
+            self._rewrite_cache.clear()
+            self.ctx.logger.info("TTS 语言改写模型或目标语言已变更，改写缓存已清空")
+        self._rewrite_cache_signature = signature
+
+        if load and cache_config.rewrite_cache_enabled and cache_config.rewrite_cache_persist:
+            try:
+                await asyncio.to_thread(self._rewrite_cache.load)
+            except Exception as exc:
+                self.ctx.logger.warning("读取 TTS 语言改写缓存失败: %s", exc)
+        elif not load:
+            await self._save_rewrite_cache()
+
+    async def _save_rewrite_cache(self) -> None:
+        cache_config = self.config.cache
+        if not (cache_config.rewrite_cache_persist and self._rewrite_cache.dirty):
+            return
+        try:
+            await asyncio.to_thread(self._rewrite_cache.save)
+        except Exception as exc:
+            self.ctx.logger.warning("保存 TTS 语言改写缓存失败: %s", exc)
+
+    @Action(
+        "vits_tts_action",
+        description="使用 GPT-SoVITS 语音合成将文本转换为语音发送",
+        activation_type=ActivationType.KEYWORD,
+        activation_keywords=["语音", "说话", "朗读", "念出来", "用语音说", "vits", "tts"],
+        action_parameters={
+            "text": "需要朗读的文本内容。优先按插件 config.toml 中 vits.language 指定的语言组织原句，例如 language=ja 时应传入自然日语。",
+            "voice_id": "音色 ID 或 config.toml 中配置的命名音色，可选",
+        },
+        action_require=["用户明确要求语音、朗读、念出文本时使用", "待朗读文本应尽量使用 TTS 配置的目标语言"],
+        associated_types=["text"],
+    )
+    async def handle_vits_action(self, stream_id: str = "", text: str = "", voice_id: str = "", **kwargs: Any):
+        if not self.config.components.action_enabled:
+            return False, "关键词语音触发未启用"
+        success, message, _ = await self._synthesize_and_send(
+            text=text,
+            stream_id=stream_id,
+            voice_id=voice_id or None,
+            priority=PRIORITY_ACTION,
+            requested_at=self._message_timestamp(kwargs),
+            user_id=self._message_user_id(kwargs),
+        )
+        return success, message
+
+    @Command(
+        "vits_tts_command",
+        description="手动语音合成",
+        pattern=r"^/vits(?:@(?P<profile>\S+))?\s+(?P<text>.+?)(?:\s+(?P<voice_id>\d+))?$",
+    )
+    async def handle_vits_command(self, stream_id: str = "", **kwargs: Any):
+        if not self.config.components.command_enabled:
+            return False, "/vits 命令未启用", True
+
+        matched_groups = kwargs.get("matched_groups")
+        if not isinstance(matched_groups, dict):
+            matched_groups = {}
+
+        text = str(matched_groups.get("text") or "").strip()
+        voice_id = str(matched_groups.get("voice_id") or "").strip()
+        profile = str(matched_groups.get("profile") or "").strip()
+        if profile:
+            voice_id = f"{profile}:{voice_id}"
+        return await self._synthesize_and_send(
+            text=text,
+            stream_id=stream_id,
+            voice_id=voice_id or None,
+            priority=PRIORITY_COMMAND,
+            requested_at=self._message_timestamp(kwargs),
+            user_id=self._message_user_id(kwargs),
+        )
+
+    @Command(
+        "vits_broadcast_command",
+        description="合成一次语音并发送到多个聊天流",
+        pattern=r"^/vitsbroadcast(?:@(?P<profile>\S+))?(?:\s+to=(?P<targets>\S+))?\s+(?P<text>.+)$",
+    )
+    async def handle_vits_broadcast_command(self, stream_id: str = "", **kwargs: Any):
+        config = self.config.broadcast
+        if not config.command_enabled:
+            return False, "广播命令未启用", True
+        user_id = self._message_user_id(kwargs)
+        if not user_id or user_id not in _split_config_list(config.allowed_users):
+            self.ctx.logger.info("TTS 广播命令被拒绝: user_id=%s", user_id)
+            return False, "没有使用广播命令的权限", True
+
+        matched_groups = kwargs.get("matched_groups")
+        if not isinstance(matched_groups, dict):
+            matched_groups = {}
+        text = str(matched_groups.get("text") or "").strip()
+        targets = _split_config_list(str(matched_groups.get("targets") or config.default_targets))
+        if not targets:
+            message = "没有指定广播目标，请使用 to=<stream_id,...> 或配置 broadcast.default_targets"
+            if stream_id:
+                await self.ctx.send.text(message, stream_id)
+            return False, message, True
+
+        results = await self.broadcast_voice(
+            text,
+            targets,
+            voice_id=str(matched_groups.get("profile") or "").strip() or None,
+            requested_at=self._message_timestamp(kwargs),
+            user_id=user_id,
+        )
+        succeeded = sum(1 for sent in results.values() if sent)
+        message = f"语音广播完成：{succeeded}/{len(results)} 个聊天流发送成功"
+        failed = [target for target, sent in results.items() if not sent]
+        if failed:
+            message += f"，失败：{', '.join(failed[:10])}" + (" 等" if len(failed) > 10 else "")
+        if stream_id:
+            await self.ctx.send.text(message, stream_id)
+        return bool(results) and not failed, message, True
+
+    @Command(
+        "vits_keyword_command",
+        description="显式关键词直接触发语音",
+        pattern=_KEYWORD_COMMAND_PATTERN,
+    )
+    async def handle_vits_keyword_command(self, text: str = "", stream_id: str = "", **kwargs: Any):
+        requested_at = self._message_timestamp(kwargs)
+        if (
+            not self.config.plugin.enabled
+            or not self.config.components.action_enabled
+            or not self.config.vits.keyword_trigger_enabled
+        ):
+            return False, None, False
+
+        with self._stats.timer("keyword_extract"):
+            tts_text = self._extract_keyword_tts_text(text)
         if not tts_text:
             return False, None, False
 
         self.ctx.logger.info("TTS keyword trigger matched: raw=%s, tts_text=%s", (text or "")[:120], tts_text[:120])
-        success, message, _ = await self._synthesize_and_send(text=tts_text, stream_id=stream_id)
-        if not success and stream_id:
+        success, message, _ = await self._synthesize_and_send(
+            text=tts_text,
+            stream_id=stream_id,
+            priority=PRIORITY_KEYWORD,
+            requested_at=requested_at,
+            user_id=self._message_user_id(kwargs),
+        )
+        # 被准入控制拒绝或取代的请求不回复失败提示，避免过载时再刷屏
+        if not success and stream_id and not self._is_stale(requested_at) and message not in _ADMISSION_MESSAGES.values():
             await self.ctx.send.text(f"语音发送失败：{message}", stream_id)
         return success, message, True
 
@@ -166,6 +2015,87 @@ class GPTSoVITSV2TTSPlugin(MaiBotPlugin):
             await self.ctx.send.text("缓存已清理", stream_id)
         return True, "缓存已清理", True
 
+    @Command("vits_stats_command", description="查看 TTS 各阶段耗时统计", pattern=r"^/vitsstats$")
+    async def handle_vits_stats_command(self, stream_id: str = "", **kwargs: Any):
+        del kwargs
+        if not self.config.components.stats_command_enabled:
+            return False, "TTS 统计命令未启用", False
+        report = self._format_stats_report()
+        if stream_id:
+            await self.ctx.send.text(report, stream_id)
+        return True, report, True
+
+    def _format_stats_report(self) -> str:
+        if not self.config.stats.enabled:
+            return "TTS 耗时统计未启用"
+        lines = [f"TTS 统计（最近 {self._stats.window_size} 个样本，单位 ms）", "阶段 次数 p50 p95 p99"]
+        for stage, count, p50, p95, p99 in self._stats.summary():
+            name = LatencyStats.STAGES.get(stage, stage)
+            lines.append(f"{name} {count} {p50 * 1000:.0f} {p95 * 1000:.0f} {p99 * 1000:.0f}")
+        if len(lines) == 2:
+            lines.append("暂无数据")
+
+        counters = self._stats.counters
+        lines.append(
+            "请求 {requests} 失败 {failed} 重试 {retries} | 合成缓存命中 {hits}/{lookups} | 改写缓存命中 {rewrite_hits} 本地跳过 {skipped}".format(
+                requests=counters.get("requests", 0),
+                failed=counters.get("requests_failed", 0),
+                retries=counters.get("retries", 0),
+                hits=counters.get("synthesis_cache_hits", 0),
+                lookups=counters.get("synthesis_cache_hits", 0) + counters.get("synthesis_cache_misses", 0),
+                rewrite_hits=counters.get("rewrite_cache_hits", 0),
+                skipped=counters.get("rewrite_skipped_local", 0),
+            )
+        )
+        traffic = "接收 {received:.1f} MB 发送 {sent:.1f} MB (base64)".format(
+            received=counters.get("bytes_received", 0) / 1048576,
+            sent=counters.get("bytes_sent", 0) / 1048576,
+        )
+        if counters.get("postprocess_bytes_in"):
+            traffic += " | 后处理 {before:.1f} MB → {after:.1f} MB".format(
+                before=counters["postprocess_bytes_in"] / 1048576,
+                after=counters.get("postprocess_bytes_out", 0) / 1048576,
+            )
+        if counters.get("broadcasts"):
+            traffic += f" | 广播 {counters['broadcasts']} 次 {counters.get('broadcast_targets', 0)} 个聊天流"
+        lines.append(traffic)
+        if counters.get("speculative_started"):
+            lines.append(
+                "推测合成 发起 {started} 命中 {hits} 作废 {wasted}".format(
+                    started=counters["speculative_started"],
+                    hits=counters.get("speculative_hits", 0),
+                    wasted=counters.get("speculative_wasted", 0),
+                )
+            )
+        admission = self._admission.snapshot()
+        lines.append(
+            "准入 排队语音 {queued:.0f}/{limit} 秒 | 拒绝 限流 {rate} 队列满 {full} | 取代 {superseded}".format(
+                queued=admission["queued_seconds"],
+                limit=f"{admission['max_queued_seconds']:.0f}" if admission["max_queued_seconds"] else "不限",
+                rate=counters.get("shed_rate_limited", 0),
+                full=counters.get("shed_queue_full", 0),
+                superseded=counters.get("shed_superseded", 0),
+            )
+        )
+        lines.append(f"预热 {self._warmup_status} 固定短语 {len(self._canned_audio)} 条 命中 {counters.get('canned_hits', 0)}")
+        scheduler = self._scheduler.snapshot()
+        lines.append(
+            f"调度 运行中 {scheduler['running']} 排队 {scheduler['queued']} 最大排队 {scheduler['max_queued']} "
+            f"音色插队 {scheduler['affinity_reorders']} 模型切换 {counters.get('weight_switches', 0)}"
+        )
+        for backend in self._backend_pool.snapshot():
+            latency = backend["latency_ewma"]
+            lines.append(
+                "后端 {url} 请求 {requests} 失败 {failures} 平均耗时 {latency} {state}".format(
+                    url=backend["url"],
+                    requests=counters.get(f"backend_requests:{backend['url']}", 0),
+                    failures=backend["failures"],
+                    latency=f"{latency * 1000:.0f}ms" if latency is not None else "-",
+                    state="已摘除" if backend["ejected"] else "正常",
+                )
+            )
+        return "\n".join(lines)
+
     @Command("vits_mode_command", description="旧版自动 TTS 模式提示", pattern=r"^/vitsmode\s*(?P<mode>on|off)?\s*$")
     async def handle_vits_mode_command(self, stream_id: str = "", **kwargs: Any):
         del kwargs
@@ -173,261 +2103,1847 @@ class GPTSoVITSV2TTSPlugin(MaiBotPlugin):
             await self.ctx.send.text("新版 MaiBot 插件运行时暂不支持旧版全局自动 TTS 拦截，请使用 /vits <文本>。", stream_id)
         return False, "新版暂不支持旧版全局自动 TTS 拦截", True
 
-    async def _synthesize_and_send(self, text: str, stream_id: str, voice_id: Optional[str] = None):
+    async def _synthesize_and_send(
+        self,
+        text: str,
+        stream_id: str,
+        voice_id: Optional[str] = None,
+        priority: int = PRIORITY_ACTION,
+        requested_at: Optional[float] = None,
+        user_id: str = "",
+    ):
+        # 无效或已过期的请求在准入之前返回，不消耗令牌，也不会取代同一聊天流中有效的请求
         if not self.config.plugin.enabled:
             return False, "TTS 插件未启用", True
-
         text = (text or "").strip()
         if not text:
             return False, "没有提供需要朗读的文本", True
         if not stream_id:
             return False, "缺少聊天流 stream_id", True
+        requested_at = requested_at or time.time()
+        if self._is_stale(requested_at):
+            self.ctx.logger.info("TTS 请求已过期，放弃合成: stream_id=%s", stream_id)
+            return False, "请求已过期，放弃合成语音", True
+
+        ticket, reason = self._admission.admit(stream_id, user_id, priority, self._estimate_audio_seconds(text))
+        if ticket is None:
+            self._stats.incr(f"shed_{reason}")
+            self.ctx.logger.info("TTS 请求超出准入限制，已拒绝: reason=%s, stream_id=%s, user_id=%s", reason, stream_id, user_id)
+            return False, _ADMISSION_MESSAGES[reason], True
+        if reason == "superseded":
+            self._stats.incr("shed_superseded")
+            self.ctx.logger.info("TTS 请求超出准入限制，取代同一聊天流中尚未发送的请求: stream_id=%s", stream_id)
+
+        started = time.perf_counter()
+        # 单独的任务便于被同一聊天流中更新的请求取消，取消调用方时也会一并取消该任务
+        ticket.task = asyncio.create_task(self._deliver_voice(text, stream_id, voice_id, priority, requested_at, ticket))
+        try:
+            result = await ticket.task
+        except asyncio.CancelledError:
+            if not ticket.superseded:
+                raise
+            return False, _ADMISSION_MESSAGES["superseded"], True
+        finally:
+            self._admission.release(ticket)
+        self._stats.incr("requests")
+        if not result[0]:
+            self._stats.incr("requests_failed")
+        self._stats.observe("total", time.perf_counter() - started)
+        return result
+
+    async def _deliver_voice(
+        self,
+        text: str,
+        stream_id: str,
+        voice_id: Optional[str],
+        priority: int,
+        requested_at: float,
+        ticket: Optional[AdmissionTicket] = None,
+    ):
+        """合成并发送已通过校验和准入的请求。"""
+        if self._is_stale(requested_at):
+            self.ctx.logger.info("TTS 请求已过期，放弃合成: stream_id=%s", stream_id)
+            return False, "请求已过期，放弃合成语音", True
+        deadline = self._synthesis_deadline(requested_at)
+
+        # 预先合成好的固定短语直接发送，不经过改写和合成
+        audio = self._lookup_canned_audio(text, voice_id)
+        if audio is None and (self.config.vits.delivery_mode or "").strip().lower() == "progressive":
+            return await self._synthesize_and_send_progressive(
+                text,
+                stream_id,
+                voice_id=voice_id,
+                priority=priority,
+                requested_at=requested_at,
+                deadline=deadline,
+                ticket=ticket,
+            )
+
+        if audio is None:
+            with self._stats.timer("synthesis"):
+                audio = await self._synthesize_shared(
+                    text,
+                    voice_id=voice_id,
+                    stream_id=stream_id,
+                    priority=priority,
+                    deadline=deadline,
+                )
+        if not audio:
+            return False, "语音合成失败", True
+        if self._is_stale(requested_at):
+            self.ctx.logger.info("TTS 语音已合成但请求已过期，放弃发送: stream_id=%s", stream_id)
+            return False, "请求已过期，放弃发送语音", True
+
+        if ticket is not None:
+            ticket.sending = True
+        with self._cache_index.pinned(audio.path):
+            sent = await self._send_audio(audio, stream_id=stream_id, text=text)
+        if not sent:
+            return False, "语音已合成但发送失败", True
+        return True, "语音发送成功", True
+
+    async def broadcast_voice(
+        self,
+        text: str,
+        stream_ids: Iterable[str],
+        voice_id: Optional[str] = None,
+        requested_at: Optional[float] = None,
+        user_id: str = "",
+    ) -> dict[str, bool]:
+        """把同一段文本合成一次、编码一次，再以有限并发发送到多个聊天流，返回 {stream_id: 是否发送成功}。"""
+        targets = list(dict.fromkeys(target.strip() for target in stream_ids if target and target.strip()))
+        text = (text or "").strip()
+        if not targets:
+            return {}
+        if not self.config.plugin.enabled or not text:
+            return {target: False for target in targets}
+
+        ticket, reason = self._admission.admit(targets[0], user_id, PRIORITY_COMMAND, self._estimate_audio_seconds(text))
+        if ticket is None:
+            self._stats.incr(f"shed_{reason}")
+            self.ctx.logger.info("TTS 广播超出准入限制，已拒绝: reason=%s", reason)
+            return {target: False for target in targets}
+        try:
+            audio = self._lookup_canned_audio(text, voice_id)
+            if audio is None:
+                with self._stats.timer("synthesis"):
+                    audio = await self._synthesize_shared(
+                        text,
+                        voice_id=voice_id,
+                        stream_id=targets[0],
+                        priority=PRIORITY_COMMAND,
+                        deadline=self._synthesis_deadline(requested_at),
+                    )
+            if audio is None:
+                return {target: False for target in targets}
+
+            audio_base64 = audio.audio_base64
+            if audio_base64 is None:
+                try:
+                    with self._cache_index.pinned(audio.path), self._stats.timer("file_read"):
+                        audio_base64 = await self._read_file_base64(audio.path)
+                except Exception as exc:
+                    self.ctx.logger.error("读取 TTS 音频失败: %s", exc)
+                    return {target: False for target in targets}
+
+            ticket.sending = True
+            semaphore = asyncio.Semaphore(max(1, int(self.config.broadcast.max_parallel_sends)))
+
+            async def send(target: str) -> bool:
+                async with semaphore:
+                    try:
+                        return await self._send_voice_payload(audio_base64, stream_id=target, text=text)
+                    except Exception as exc:
+                        self.ctx.logger.error("TTS 广播发送失败: stream_id=%s, %r", target, exc)
+                        return False
+
+            sent = await asyncio.gather(*(send(target) for target in targets))
+        finally:
+            self._admission.release(ticket)
+        self._stats.incr("broadcasts")
+        self._stats.incr("broadcast_targets", len(targets))
+        self.ctx.logger.info("TTS 语音广播完成: %s/%s 个聊天流发送成功", sum(sent), len(targets))
+        return dict(zip(targets, sent))
+
+    async def _synthesize_and_send_progressive(
+        self,
+        text: str,
+        stream_id: str,
+        voice_id: Optional[str] = None,
+        priority: int = PRIORITY_ACTION,
+        requested_at: Optional[float] = None,
+        deadline: Optional[float] = None,
+        ticket: Optional[AdmissionTicket] = None,
+    ):
+        """边合成边发送：每段语音合成完成后立即按顺序发出，同时继续合成后续内容。"""
+        requested_at = requested_at or time.time()
+        deadline = deadline or self._synthesis_deadline(requested_at)
+        # 相同的逐段发送请求共用一次语言改写，分句合成的各段也各自合并
+        prepared = await self._join_inflight(
+            "prepare:" + self._synthesis_flight_key(text, voice_id),
+            lambda: self._prepare_synthesis(text, voice_id, allow_long_text=True),
+            text,
+        )
+        if prepared is None:
+            return False, "语音合成失败", True
+        tts_text, spk_id, profile = prepared
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, int(self.config.vits.chunk_parallelism)))
+        producer = asyncio.create_task(
+            self._produce_progressive_segments(
+                queue, tts_text, spk_id, profile, stream_id, priority, deadline
+            )
+        )
+        sent_count = 0
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if self._is_stale(requested_at):
+                    self.ctx.logger.info("TTS 请求已过期，停止逐段发送: stream_id=%s", stream_id)
+                    return False, f"请求已过期，已发送 {sent_count} 段语音", True
+                segment_text, audio_base64 = item
+                if ticket is not None:
+                    ticket.sending = True
+                sent = await self._send_voice_payload(audio_base64, stream_id=stream_id, text=segment_text)
+                if not sent:
+                    return False, f"第 {sent_count + 1} 段语音发送失败", True
+                sent_count += 1
+            failed = await producer
+        finally:
+            await self._stop_progressive_producer(producer, queue)
+
+        if failed:
+            if sent_count:
+                return False, f"语音已发送 {sent_count} 段，后续合成失败", True
+            return False, "语音合成失败", True
+        return True, f"语音分 {sent_count} 段发送成功", True
+
+    @staticmethod
+    async def _stop_progressive_producer(producer: asyncio.Task, queue: asyncio.Queue) -> None:
+        """取消生产者并等待它结束。
+
+        取消可能恰好与后端响应同时到达而被网络读取吞掉，生产者会继续放入队列；
+        因此一边取走并丢弃队列中的段落、一边重复取消，保证它不会阻塞在已满的队列上。
+        """
+        while not producer.done():
+            producer.cancel()
+            getter = asyncio.ensure_future(queue.get())
+            try:
+                await asyncio.wait({producer, getter}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                getter.cancel()
+        if not producer.cancelled():
+            producer.exception()
+
+    async def _produce_progressive_segments(
+        self,
+        queue: asyncio.Queue,
+        tts_text: str,
+        spk_id: int,
+        profile: VoiceProfile,
+        stream_id: str,
+        priority: int,
+        deadline: float,
+    ) -> bool:
+        """把 (段落文本, base64 音频) 依次放入队列，结束时放入 None；返回是否出现合成失败。
+
+        被取消时不放入结束标记：消费方已经提前返回，队列可能已满，等待放入会让任务一直挂起。
+        """
+        failed = True
+        cancelled = False
+        try:
+            if self.config.vits.progressive_backend_streaming and self._backend_streaming_supported is not False:
+                streamed = await self._produce_streaming_segments(
+                    queue, tts_text, spk_id, profile, stream_id, priority, deadline
+                )
+                if streamed is not None:
+                    failed = not streamed
+                    return failed
+
+            segments = self._split_tts_text(tts_text, max(1, int(self.config.vits.chunk_max_length)))
+            semaphore = asyncio.Semaphore(max(1, int(self.config.vits.chunk_parallelism)))
+
+            async def synthesize(segment: str) -> Optional[SynthesizedAudio]:
+                audio = await self._synthesize_segment(
+                    segment,
+                    spk_id,
+                    profile,
+                    stream_id,
+                    priority,
+                    write_file=self.config.cache.synthesis_cache_enabled,
+                    deadline=deadline,
+                )
+                return await self._postprocess_audio(audio) if audio else None
+
+            async def render(segment: str) -> Optional[SynthesizedAudio]:
+                async with semaphore:
+                    return await self._join_inflight(
+                        self._segment_flight_key(segment, spk_id, profile), lambda: synthesize(segment), segment
+                    )
+
+            tasks = [asyncio.create_task(render(segment)) for segment in segments]
+            try:
+                for segment, task in zip(segments, tasks):
+                    audio = await task
+                    if not audio:
+                        return failed
+                    audio_base64 = audio.audio_base64
+                    if audio_base64 is None:
+                        audio_base64 = await self._read_file_base64(audio.path)
+                    await queue.put((segment, audio_base64))
+            finally:
+                for task in tasks:
+                    task.cancel()
+            failed = False
+            return failed
+        except asyncio.CancelledError:
+            cancelled = True
+            raise
+        except Exception as exc:
+            self.ctx.logger.error("TTS 分段合成出错: %r", exc)
+            return failed
+        finally:
+            if not cancelled:
+                await queue.put(None)
+
+    async def _produce_streaming_segments(
+        self,
+        queue: asyncio.Queue,
+        tts_text: str,
+        spk_id: int,
+        profile: VoiceProfile,
+        stream_id: str,
+        priority: int,
+        deadline: float,
+    ) -> Optional[bool]:
+        """使用 GPT-SoVITS 的 streaming_mode，按到达的 HTTP 分块累积到足够时长后切段。
+
+        返回 None 表示后端未能开始流式输出，调用方应改用分句合成；否则返回是否完整成功。
+        """
+        payload = self._build_tts_payload(tts_text, spk_id, profile)
+        payload["streaming_mode"] = True
+        min_seconds = max(0.0, float(self.config.vits.progressive_min_segment_seconds))
+
+        try:
+            async with self._scheduler.slot(
+                stream_id, priority, timeout=deadline - time.monotonic(), affinity=profile.name
+            ) as waited:
+                self._stats.observe("scheduler_wait", waited)
+                backend = self._backend_pool.pick(weights=profile.weights)
+                if backend is None:
+                    return None
+                # 选中后立即占用名额，同时调度的请求不会在设置参考音频期间把它当成空闲后端
+                with backend.claimed():
+                    async with self._backend_voice(backend, profile, deadline) as (voice_error, _):
+                        if voice_error is not None:
+                            return None
+                        return await self._stream_backend_segments(
+                            queue, backend, payload, tts_text, min_seconds, deadline
+                        )
+        except asyncio.TimeoutError:
+            self.ctx.logger.warning("TTS 排队超过截止时间，放弃流式合成")
+            return False
+
+    async def _stream_backend_segments(
+        self,
+        queue: asyncio.Queue,
+        backend: BackendState,
+        payload: dict[str, Any],
+        tts_text: str,
+        min_seconds: float,
+        deadline: float,
+    ) -> Optional[bool]:
+        for api_url, flavor in await self._resolve_endpoints(backend):
+            if flavor == "api":
+                # api.py 的流式输出由服务端启动参数决定，请求体无法开启
+                return None
+            emitted = 0
+
+            async def emit(fmt_chunk: bytes, pcm: bytearray, block_align: int) -> None:
+                nonlocal emitted
+                usable = len(pcm) - len(pcm) % max(1, block_align)
+                if not usable:
+                    return
+                audio = SynthesizedAudio(
+                    path=None,
+                    audio_base64=base64.b64encode(self._build_wav(fmt_chunk, bytes(pcm[:usable]))).decode("ascii"),
+                    size=usable,
+                )
+                del pcm[:usable]
+                # 与分句合成一样逐段做后处理；未启用时原样返回
+                audio = await self._postprocess_audio(audio)
+                await queue.put((tts_text if not emitted else "", audio.audio_base64))
+                emitted += 1
+
+            try:
+                started = time.monotonic()
+                async with self._session.post(
+                    api_url,
+                    json=self._payload_for_flavor(payload, flavor),
+                    timeout=self._attempt_timeout(deadline),
+                ) as resp:
+                    content_type = resp.headers.get("Content-Type", "").lower()
+                    if resp.status != 200 or "application/json" in content_type or "text/" in content_type:
+                        self.ctx.logger.info("TTS 流式合成不可用: url=%s, HTTP %s", api_url, resp.status)
+                        if resp.status >= 500:
+                            self._record_backend_result(backend, healthy=False)
+                            return None
+                        continue
+                    if resp.headers.get("Transfer-Encoding", "").lower() != "chunked":
+                        # 后端忽略了 streaming_mode，本次按整段处理，之后直接走分句合成
+                        self._backend_streaming_supported = False
+
+                    header = b""
+                    fmt_chunk = None
+                    pcm = bytearray()
+                    byte_rate = block_align = 1
+                    async for data, end_of_chunk in resp.content.iter_chunks():
+                        if fmt_chunk is None:
+                            header += data
+                            parsed = self._parse_wav_stream_header(header)
+                            if parsed is None:
+                                continue
+                            fmt_chunk, data_offset = parsed
+                            _, _, _, byte_rate, block_align, _ = struct.unpack_from("<HHIIHH", fmt_chunk)
+                            data = header[data_offset:]
+                        pcm.extend(data)
+                        if end_of_chunk and len(pcm) >= byte_rate * min_seconds:
+                            await emit(fmt_chunk, pcm, block_align)
+
+                    if fmt_chunk is None:
+                        self.ctx.logger.warning("TTS 流式响应不是 WAV 音频: url=%s", api_url)
+                        continue
+                    await emit(fmt_chunk, pcm, block_align)
+
+                self._remember_endpoint(backend, api_url, flavor)
+                self._record_backend_result(backend, healthy=True, latency=time.monotonic() - started)
+                if emitted and self._backend_streaming_supported is None:
+                    self._backend_streaming_supported = True
+                return bool(emitted)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                self.ctx.logger.warning("TTS 流式合成出错: %r", exc)
+                if isinstance(exc, (asyncio.TimeoutError, aiohttp.ClientError)):
+                    self._record_backend_result(backend, healthy=False)
+                if emitted:
+                    return False
+        return None
+
+    async def _synthesize_shared(
+        self,
+        text: str,
+        voice_id: Optional[str] = None,
+        stream_id: str = "",
+        priority: int = PRIORITY_ACTION,
+        deadline: Optional[float] = None,
+    ) -> Optional[SynthesizedAudio]:
+        """合并参数相同且仍在进行中的合成请求，所有调用方等待同一个任务。"""
+        return await self._join_inflight(
+            self._synthesis_flight_key(text, voice_id),
+            lambda: self._synthesize_audio(
+                text,
+                voice_id=voice_id,
+                stream_id=stream_id,
+                priority=priority,
+                write_file=self.config.cache.synthesis_cache_enabled,
+                deadline=deadline,
+            ),
+            text,
+        )
+
+    async def _join_inflight(self, key: str, start: Callable[[], Awaitable[Any]], text: str) -> Any:
+        """key 相同的任务仍在进行中时加入等待，否则用 start 发起新任务；逐段发送的改写和分句合成也经由这里合并。"""
+        task = self._inflight_syntheses.get(key)
+        if task is None:
+            task = asyncio.create_task(start())
+            self._inflight_syntheses[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget_inflight_synthesis(key, done))
+        else:
+            self.ctx.logger.info("TTS 合并进行中的相同合成请求: %s", text[:80])
+        # shield 保证单个等待方被取消时不会连带取消共享任务；最后一个等待方也离开时才取消合成，不再占用后端
+        self._inflight_waiters[task] = self._inflight_waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            waiters = self._inflight_waiters.pop(task) - 1
+            if waiters:
+                self._inflight_waiters[task] = waiters
+            elif not task.done():
+                # 取消的同时从合并表移除，之后到达的相同请求会重新发起合成，而不是加入正在取消的任务
+                if self._inflight_syntheses.get(key) is task:
+                    del self._inflight_syntheses[key]
+                task.cancel()
+
+    def _forget_inflight_synthesis(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight_syntheses.get(key) is task:
+            del self._inflight_syntheses[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.ctx.logger.error("TTS 合成任务异常: %r", task.exception())
+
+    def _synthesis_flight_key(self, text: str, voice_id: Optional[str]) -> str:
+        vits_config = self.config.vits
+        spk_id, profile = self._resolve_voice(voice_id)
+        key_data = [
+            (text or "").strip(),
+            spk_id,
+            *astuple(profile or self._default_voice_profile()),
+            bool(vits_config.auto_language_rewrite),
+            vits_config.language_rewrite_model,
+            vits_config.audio_format or "wav",
+        ]
+        postprocess_signature = self._postprocess_signature()
+        if postprocess_signature is not None:
+            key_data.append(postprocess_signature)
+        return json.dumps(key_data, ensure_ascii=False)
+
+    def _segment_flight_key(self, segment: str, spk_id: int, profile: VoiceProfile) -> str:
+        """逐段发送时单个分段的合并键，分段文本已经过改写，不再包含改写相关的配置。"""
+        key_data = ["segment", segment, spk_id, *astuple(profile), self.config.vits.audio_format or "wav"]
+        postprocess_signature = self._postprocess_signature()
+        if postprocess_signature is not None:
+            key_data.append(postprocess_signature)
+        return json.dumps(key_data, ensure_ascii=False)
+
+    @staticmethod
+    def _resolve_speaker_id(voice_id: Optional[str], default_voice_id: str) -> int:
+        try:
+            return int(voice_id or default_voice_id)
+        except Exception:
+            return 0
+
+    def _configure_keyword_matcher(self) -> None:
+        phrases = _split_config_list(self.config.vits.keyword_trigger_phrases)
+        self._keyword_matcher = KeywordMatcher(phrases)
+        command_re = re.compile(_KEYWORD_COMMAND_PATTERN)
+        uncovered = [phrase for phrase in self._keyword_matcher.phrases if not command_re.search(phrase)]
+        if uncovered:
+            self.ctx.logger.warning(
+                "以下 TTS 触发词不在关键词命令的匹配范围内，重启插件后才会生效: %s", "，".join(uncovered)
+            )
+
+    def _extract_keyword_tts_text(self, raw_text: str) -> Optional[str]:
+        text = (raw_text or "").strip()
+        if not text or text.startswith("/"):
+            return None
+
+        if self._keyword_matcher is None:
+            self._configure_keyword_matcher()
+        match = self._keyword_matcher.find(text.lower())
+        if match is None:
+            return None
+        index, length = match
+
+        after_payload = self._normalize_keyword_payload(text[index + length :])
+        if after_payload:
+            return after_payload
+
+        before_payload = self._normalize_keyword_payload(text[:index], strip_leading=True)
+        if before_payload and not self._is_keyword_request_fluff(before_payload):
+            return before_payload
+
+        default_text = (self.config.vits.keyword_default_text or "").strip()
+        return default_text or None
+
+    @staticmethod
+    def _normalize_keyword_payload(text: str, strip_leading: bool = False) -> str:
+        value = (text or "").strip().strip(_KEYWORD_PUNCTUATION)
+        trie = _KEYWORD_LEADING_TRIE if strip_leading else _KEYWORD_PAYLOAD_TRIE
+        while True:
+            length = trie.longest_prefix(value)
+            if not length:
+                break
+            value = value[length:].strip(_KEYWORD_PUNCTUATION)
+
+        if GPTSoVITSV2TTSPlugin._is_keyword_request_fluff(value):
+            return ""
+        return value
+
+    @staticmethod
+    def _is_keyword_request_fluff(value: str) -> bool:
+        normalized = (value or "").strip().strip(_KEYWORD_PUNCTUATION)
+        return normalized in {
+            "",
+            "你",
+            "您",
+            "请",
+            "麻烦",
+            "帮我",
+            "帮忙",
+            "可以",
+            "能不能",
+            "能",
+            "你再",
+            "您再",
+            "再",
+            "吧",
+            "嘛",
+            "吗",
+            "啦",
+            "了",
+            "呗",
+            "啊",
+            "呀",
+            "呢",
+            "哈",
+            "欸",
+            "看看",
+            "试试",
+            "一下",
+            "下",
+            "一条",
+            "一句",
+        }
+
+    async def _ensure_session(self) -> None:
+        if self._session and not self._session.closed:
+            return
+        settings = self._connector_settings()
+        connector = aiohttp.TCPConnector(**settings)
+        timeout = self._client_timeout(max(1, int(self.config.vits.timeout)))
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        self._session_signature = self._session_settings_signature(settings)
+
+    async def _refresh_session(self) -> None:
+        """重载配置后按需更换会话：连接参数未变时保留现有连接池；
+        变化时新请求立即改用新会话，旧会话等进行中的请求结束后再关闭。"""
+        old_session = self._session
+        if old_session and not old_session.closed:
+            if self._session_signature == self._session_settings_signature(self._connector_settings()):
+                return
+            self.ctx.logger.info("TTS 连接参数已变化，新请求改用新的连接池")
+        self._session = None
+        await self._ensure_session()
+        if old_session and not old_session.closed:
+            self._retire_session(old_session)
+
+    def _retire_session(self, session: aiohttp.ClientSession) -> None:
+        # 单次请求最长不超过 timeout / deadline_seconds，等这么久后旧会话上不会再有进行中的请求
+        grace = max(float(self.config.vits.timeout), float(self.config.vits.deadline_seconds)) + 1.0
+
+        async def close_later() -> None:
+            try:
+                await asyncio.sleep(grace)
+            finally:
+                await session.close()
+
+        task = asyncio.create_task(close_later())
+        self._retiring_sessions.add(task)
+        task.add_done_callback(self._retiring_sessions.discard)
+
+    def _connector_settings(self) -> dict[str, Any]:
+        """连接池参数：每个后端的连接数与调度并发一致，另留两条给健康检查、模型切换等控制请求。"""
+        backends = self._backend_pool.backends
+        dns_cache_seconds = int(self.config.backends.dns_cache_seconds)
+        return {
+            "limit": sum(backend.max_concurrency + 2 for backend in backends) or 100,
+            "limit_per_host": max((backend.max_concurrency for backend in backends), default=0) + 2,
+            "keepalive_timeout": max(1.0, float(self.config.backends.keepalive_seconds)),
+            "use_dns_cache": dns_cache_seconds > 0,
+            "ttl_dns_cache": dns_cache_seconds if dns_cache_seconds > 0 else None,
+        }
+
+    def _session_settings_signature(self, settings: dict[str, Any]) -> tuple:
+        timeout = self._client_timeout(max(1, int(self.config.vits.timeout)))
+        return tuple(sorted(settings.items())), (timeout.total, timeout.sock_connect, timeout.sock_read)
+
+    def _client_timeout(self, total: float) -> aiohttp.ClientTimeout:
+        """总超时之外单独限制建立连接和读取数据的时间，后端宕机时尽快失败，而不是等满总超时。"""
+        connect_timeout = float(self.config.backends.connect_timeout)
+        read_timeout = float(self.config.backends.read_timeout)
+        return aiohttp.ClientTimeout(
+            total=total,
+            sock_connect=connect_timeout if connect_timeout > 0 else None,
+            sock_read=read_timeout if read_timeout > 0 else None,
+        )
+
+    async def _close_session(self) -> None:
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_signature = None
+        retiring = list(self._retiring_sessions)
+        for task in retiring:
+            task.cancel()
+        if retiring:
+            await asyncio.gather(*retiring, return_exceptions=True)
+
+    async def send_voice_file(self, audio_path: str, stream_id: str, text: str = "") -> bool:
+        try:
+            with self._stats.timer("file_read"):
+                audio_base64 = await self._read_file_base64(audio_path)
+        except Exception as exc:
+            self.ctx.logger.error("读取 TTS 音频失败: %s", exc)
+            self._cache_index.discard(audio_path)
+            return False
+
+        return await self._send_voice_payload(audio_base64, stream_id=stream_id, text=text)
+
+    async def _send_audio(self, audio: SynthesizedAudio, stream_id: str, text: str = "") -> bool:
+        if audio.audio_base64 is not None:
+            return await self._send_voice_payload(audio.audio_base64, stream_id=stream_id, text=text)
+        if not audio.path:
+            return False
+        return await self.send_voice_file(audio.path, stream_id=stream_id, text=text)
+
+    @staticmethod
+    async def _read_file_base64(path: str) -> str:
+        encoder = Base64Encoder()
+        async with aiofiles.open(path, "rb") as f:
+            while True:
+                block = await f.read(_STREAM_CHUNK_SIZE)
+                if not block:
+                    break
+                encoder.update(block)
+        return encoder.finish()
+
+    async def _send_voice_payload(self, audio_base64: str, stream_id: str, text: str = "") -> bool:
+        with self._stats.timer("send"):
+            sent = await self.ctx.send.custom(
+                "voice",
+                audio_base64,
+                stream_id,
+                processed_plain_text="[语音]" if not text else f"[语音] {text[:80]}",
+            )
+        if sent:
+            self._stats.incr("bytes_sent", len(audio_base64))
+        return bool(sent)
+
+    async def synthesize_voice(
+        self,
+        text: str,
+        voice_id: Optional[str] = None,
+        stream_id: str = "",
+        priority: int = PRIORITY_ACTION,
+    ) -> Optional[str]:
+        audio = self._lookup_canned_audio((text or "").strip(), voice_id)
+        if audio is None:
+            audio = await self._synthesize_audio(text, voice_id=voice_id, stream_id=stream_id, priority=priority)
+        return audio.path if audio else None
+
+    async def _synthesize_audio(
+        self,
+        text: str,
+        voice_id: Optional[str] = None,
+        stream_id: str = "",
+        priority: int = PRIORITY_ACTION,
+        write_file: bool = True,
+        deadline: Optional[float] = None,
+    ) -> Optional[SynthesizedAudio]:
+        deadline = deadline or self._synthesis_deadline()
+        chunked = (self.config.vits.long_text_mode or "").strip().lower() == "chunk"
+        resolved = await self._resolve_synthesis_voice(text, voice_id)
+        if resolved is None:
+            return None
+        text, spk_id, profile = resolved
+
+        async def render(tts_text: str) -> Optional[SynthesizedAudio]:
+            if chunked and len(tts_text) > max(1, int(self.config.vits.chunk_max_length)):
+                return await self._synthesize_chunked(
+                    tts_text, spk_id, profile, stream_id, priority, write_file=write_file, deadline=deadline
+                )
+            return await self._synthesize_segment(
+                tts_text, spk_id, profile, stream_id, priority, write_file=write_file, deadline=deadline
+            )
+
+        text_limit = self._synthesis_text_limit(chunked)
+        speculative_text = self._speculative_text(text, profile.language, text_limit)
+        if speculative_text is None:
+            tts_text = await self._rewrite_for_synthesis(text, profile, text_limit)
+            audio = await render(tts_text) if tts_text else None
+        else:
+            audio = await self._synthesize_speculatively(text, speculative_text, profile, text_limit, render)
+        return await self._postprocess_audio(audio) if audio else None
+
+    async def _synthesize_speculatively(
+        self,
+        text: str,
+        speculative_text: str,
+        profile: VoiceProfile,
+        text_limit: int,
+        render: Callable[[str], Awaitable[Optional[SynthesizedAudio]]],
+    ) -> Optional[SynthesizedAudio]:
+        """LLM 改写的同时先合成本地规范化后的原文；改写结果与之几乎相同时直接使用这份音频，否则取消它再合成改写结果。"""
+        started = time.perf_counter()
+        speculation = asyncio.create_task(render(speculative_text))
+        # 作废的推测合成不再有人等待，这里取走异常，避免退出时报告未处理的异常
+        speculation.add_done_callback(lambda task: task.cancelled() or task.exception())
+        self._stats.incr("speculative_started")
+        try:
+            tts_text = await self._rewrite_for_synthesis(text, profile, text_limit)
+        except BaseException:
+            speculation.cancel()
+            raise
+        if tts_text and self._texts_nearly_equal(speculative_text, tts_text):
+            self._stats.incr("speculative_hits")
+            self.ctx.logger.info("TTS 改写结果与推测合成的文本几乎相同，使用推测合成的音频")
+            return await speculation
+
+        speculation.cancel()
+        self._stats.incr("speculative_wasted")
+        self._stats.observe("speculative_wasted", time.perf_counter() - started)
+        if not tts_text:
+            return None
+        self.ctx.logger.info("TTS 改写结果与原文差异较大，放弃推测合成: %s", speculative_text[:80])
+        return await render(tts_text)
+
+    async def _prepare_synthesis(
+        self,
+        text: str,
+        voice_id: Optional[str],
+        allow_long_text: bool = False,
+    ) -> Optional[tuple[str, int, VoiceProfile]]:
+        """校验配置并完成语言改写，返回 (tts_text, speaker_id, 音色)。"""
+        resolved = await self._resolve_synthesis_voice(text, voice_id)
+        if resolved is None:
+            return None
+        text, spk_id, profile = resolved
+        tts_text = await self._rewrite_for_synthesis(text, profile, self._synthesis_text_limit(allow_long_text))
+        if not tts_text:
+            return None
+        return tts_text, spk_id, profile
+
+    async def _resolve_synthesis_voice(
+        self,
+        text: str,
+        voice_id: Optional[str],
+    ) -> Optional[tuple[str, int, VoiceProfile]]:
+        """校验会话、文本和参考音频，返回 (去掉首尾空白的文本, speaker_id, 音色)。"""
+        await self._ensure_session()
+        if not self._session:
+            return None
+
+        text = (text or "").strip()
+        if not text:
+            self.ctx.logger.warning("TTS 文本为空")
+            return None
+
+        spk_id, profile = self._resolve_voice(voice_id)
+        if profile is None:
+            self.ctx.logger.warning("未找到命名音色 %s，使用默认音色", voice_id)
+            profile = self._default_voice_profile()
+        ref_path = profile.ref_audio_path
+        if not ref_path:
+            self.ctx.logger.warning("未配置参考音频路径 vits.ref_audio_path")
+            return None
+        if self._ref_audio_stat(ref_path) is None:
+            self.ctx.logger.warning("参考音频不存在: %s", ref_path)
+            return None
+        return text, spk_id, profile
+
+    def _synthesis_text_limit(self, allow_long_text: bool) -> int:
+        max_text_length = max(1, int(self.config.vits.max_text_length))
+        if allow_long_text:
+            return max(max_text_length, int(self.config.vits.chunk_max_total_length))
+        return max_text_length
+
+    async def _rewrite_for_synthesis(self, text: str, profile: VoiceProfile, text_limit: int) -> Optional[str]:
+        tts_text = await self.prepare_tts_text(text, language=profile.language, max_text_length=text_limit)
+        if not tts_text:
+            self.ctx.logger.warning("TTS 文本语言改写失败，已阻止继续合成")
+            return None
+        self.ctx.logger.info("TTS 最终提交文本 language=%s text=%s", profile.language, tts_text[:160])
+        return tts_text
+
+    def _speculative_text(self, text: str, language: str, text_limit: int) -> Optional[str]:
+        """原文看起来已是目标语言、但仍需要 LLM 改写时，返回可以提前合成的本地规范化文本；否则返回 None。"""
+        vits_config = self.config.vits
+        if not vits_config.speculative_synthesis or not vits_config.auto_language_rewrite:
+            return None
+        target_code, _ = self._normalize_language(language)
+        if target_code in {"", "auto"}:
+            return None
+        detected, confidence = self._detect_text_language(text)
+        if detected != target_code or confidence < float(vits_config.speculative_min_confidence):
+            return None
+        if vits_config.local_language_detection and confidence >= float(vits_config.local_detection_confidence):
+            # 本地判断足够可信时本来就不调用 LLM
+            return None
+        if self.config.cache.rewrite_cache_enabled and self._rewrite_cache.get(
+            (text, target_code, str(vits_config.language_rewrite_model or ""))
+        ):
+            return None
+        return self._normalize_tts_symbols(text, target_code)[:text_limit] or None
+
+    def _texts_nearly_equal(self, first: str, second: str) -> bool:
+        """忽略空白和标点后，按归一化编辑距离（编辑次数 / 较长文本长度）判断两段文本是否几乎相同。"""
+        first = re.sub(r"[\W_]+", "", first).lower()
+        second = re.sub(r"[\W_]+", "", second).lower()
+        if first == second:
+            return True
+        limit = int(max(len(first), len(second)) * max(0.0, float(self.config.vits.speculative_max_edit_ratio)))
+        return self._bounded_edit_distance(first, second, limit) is not None
+
+    @staticmethod
+    def _bounded_edit_distance(first: str, second: str, limit: int) -> Optional[int]:
+        """编辑距离不超过 limit 时返回距离，否则返回 None；只计算宽 2 * limit + 1 的对角带。"""
+        if abs(len(first) - len(second)) > limit:
+            return None
+        over = limit + 1
+        previous = [j if j <= limit else over for j in range(len(second) + 1)]
+        for i in range(1, len(first) + 1):
+            current = [over] * (len(second) + 1)
+            if i <= limit:
+                current[0] = i
+            low, high = max(1, i - limit), min(len(second), i + limit)
+            for j in range(low, high + 1):
+                cost = 0 if first[i - 1] == second[j - 1] else 1
+                current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost, over)
+            if min(current[low - 1 : high + 1]) > limit:
+                return None
+            previous = current
+        return previous[-1] if previous[-1] <= limit else None
+
+    async def _synthesize_chunked(
+        self,
+        tts_text: str,
+        spk_id: int,
+        profile: VoiceProfile,
+        stream_id: str,
+        priority: int,
+        write_file: bool = True,
+        deadline: Optional[float] = None,
+    ) -> Optional[SynthesizedAudio]:
+        """按句切分长文本并行合成，再按原顺序拼接成一个 WAV。"""
+        segments = self._split_tts_text(tts_text, max(1, int(self.config.vits.chunk_max_length)))
+        if len(segments) <= 1:
+            return await self._synthesize_segment(
+                tts_text, spk_id, profile, stream_id, priority, write_file=write_file, deadline=deadline
+            )
+
+        audio_format = self.config.vits.audio_format or "wav"
+        payload = self._build_tts_payload(tts_text, spk_id, profile)
+        cache_path = await self._lookup_synthesis_cache(payload, audio_format, profile.weights)
+        if cache_path and cache_path in self._cache_index:
+            return SynthesizedAudio(path=cache_path)
+
+        self.ctx.logger.info("TTS 长文本分 %s 段合成", len(segments))
+        semaphore = asyncio.Semaphore(max(1, int(self.config.vits.chunk_parallelism)))
+
+        async def render(segment: str) -> Optional[SynthesizedAudio]:
+            async with semaphore:
+                # 拼接需要从文件读取 PCM，分段结果总是落盘
+                return await self._synthesize_segment(
+                    segment, spk_id, profile, stream_id, priority, deadline=deadline
+                )
+
+        tasks = [asyncio.create_task(render(segment)) for segment in segments]
+        try:
+            segment_audios = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        if not all(segment_audios):
+            self.ctx.logger.error("TTS 长文本分段合成失败: %s/%s 段成功", sum(1 for a in segment_audios if a), len(segments))
+            return None
+
+        segment_paths = [audio.path for audio in segment_audios]
+        try:
+            with self._cache_index.pinned(*segment_paths):
+                content = await asyncio.to_thread(
+                    self._join_wav_files,
+                    segment_paths,
+                    max(0, int(self.config.vits.chunk_silence_ms)),
+                )
+        except Exception as exc:
+            self.ctx.logger.error("TTS 分段音频拼接失败: %s", exc)
+            return None
+
+        filepath = cache_path
+        if filepath is None and write_file:
+            filepath = os.path.join(self._cache_dir, f"vits_{uuid.uuid4().hex[:8]}.{audio_format}")
+        if filepath:
+            temp_path = f"{filepath}.{uuid.uuid4().hex[:8]}.part"
+            async with aiofiles.open(temp_path, "wb") as f:
+                await f.write(content)
+            os.replace(temp_path, filepath)
+            self._register_cache_file(filepath, len(content))
+        self.ctx.logger.info("TTS 分段合成拼接完成: %s (%s 段)", filepath or "内存", len(segments))
+        audio_base64 = base64.b64encode(content).decode("ascii")
+        return SynthesizedAudio(path=filepath, audio_base64=audio_base64, size=len(content))
+
+    async def _synthesize_segment(
+        self,
+        tts_text: str,
+        spk_id: int,
+        profile: VoiceProfile,
+        stream_id: str,
+        priority: int,
+        write_file: bool = True,
+        deadline: Optional[float] = None,
+    ) -> Optional[SynthesizedAudio]:
+        if not self._session:
+            return None
+        deadline = deadline or self._synthesis_deadline()
+
+        retry_count = max(1, int(self.config.vits.retry_count))
+        audio_format = self.config.vits.audio_format or "wav"
+        payload = self._build_tts_payload(tts_text, spk_id, profile)
+
+        cache_path = await self._lookup_synthesis_cache(payload, audio_format, profile.weights)
+        if cache_path and cache_path in self._cache_index:
+            return SynthesizedAudio(path=cache_path)
+        filepath = cache_path
+        if filepath is None and write_file:
+            filepath = os.path.join(self._cache_dir, f"vits_{uuid.uuid4().hex[:8]}.{audio_format}")
+
+        last_error = None
+        failed_backends: set[str] = set()
+        for attempt in range(1, retry_count + 1):
+            try:
+                async with self._scheduler.slot(
+                    stream_id, priority, timeout=deadline - time.monotonic(), affinity=profile.name
+                ) as waited:
+                    self._stats.observe("scheduler_wait", waited)
+                    if attempt > 1:
+                        self._stats.incr("retries")
+                    if waited >= float(self.config.scheduler.slow_wait_log_seconds):
+                        self.ctx.logger.info(
+                            "TTS 请求排队 %.2fs, queued=%s, stream_id=%s", waited, self._scheduler.queue_depth, stream_id
+                        )
+                    backend = self._backend_pool.pick(avoid=failed_backends, weights=profile.weights)
+                    if backend is None:
+                        self.ctx.logger.warning("未配置 GPT-SoVITS API 地址 vits.api_url")
+                        return None
+                    # 选中后立即占用名额，同时调度的请求不会在切换模型或设置参考音频期间把它当成空闲后端
+                    with backend.claimed():
+                        async with self._backend_voice(backend, profile, deadline) as (voice_error, retryable):
+                            if voice_error is None:
+                                audio, last_error, retryable = await self._request_backend(
+                                    backend, payload, filepath, attempt, retry_count, deadline
+                                )
+                            else:
+                                audio, last_error = None, voice_error
+            except asyncio.TimeoutError:
+                last_error = "TTS 排队超过截止时间"
+                break
+            if audio is not None:
+                return audio
+            if not retryable or attempt >= retry_count:
+                break
+
+            failed_backends.add(backend.url)
+            delay = self._retry_delay(attempt)
+            if time.monotonic() + delay >= deadline:
+                self.ctx.logger.warning("TTS 剩余时间不足以重试，放弃: %s", last_error)
+                break
+            self.ctx.logger.info("TTS 将在 %.2fs 后重试 (%s/%s)", delay, attempt + 1, retry_count)
+            await asyncio.sleep(delay)
+
+        self.ctx.logger.error("TTS 合成失败，最后错误: %s", last_error)
+        return None
 
-        audio_path = await self.synthesize_voice(text, voice_id=voice_id)
-        if not audio_path:
-            return False, "语音合成失败", True
+    async def _request_backend(
+        self,
+        backend: BackendState,
+        payload: dict[str, Any],
+        filepath: Optional[str],
+        attempt: int,
+        retry_count: int,
+        deadline: float,
+    ) -> tuple[Optional[SynthesizedAudio], Optional[str], bool]:
+        """向单个后端发送合成请求，根路径 404 时尝试 /tts，并把结果计入该后端的熔断统计。
 
-        sent = await self.send_voice_file(audio_path, stream_id=stream_id, text=text)
-        asyncio.create_task(self.clean_cache_task())
-        if not sent:
-            return False, "语音已合成但发送失败", True
-        return True, "语音发送成功", True
+        返回 (音频, 错误信息, 是否值得重试)：超时、连接错误和 5xx 可以重试；
+        4xx 与非音频响应直接失败，除非失败的是之前记住的接口（后端可能已更换版本，需要重新识别）。
+        调用方负责用 backend.claimed() 占用该后端的并发名额。
+        """
+        last_error = None
+        remembered = backend.endpoint is not None
+        endpoints = await self._resolve_endpoints(backend)
+        for api_index, (api_url, flavor) in enumerate(endpoints):
+            started = time.monotonic()
+            try:
+                self.ctx.logger.info(
+                    "TTS 请求开始 attempt=%s/%s, url=%s, flavor=%s", attempt, retry_count, api_url, flavor
+                )
+                request_payload = self._payload_for_flavor(payload, flavor)
+                self._stats.incr(f"backend_requests:{backend.url}")
+                async with self._session.post(
+                    api_url,
+                    json=request_payload,
+                    timeout=self._attempt_timeout(deadline),
+                ) as resp:
+                    self._stats.observe("ttfb", time.monotonic() - started)
+                    status = resp.status
+                    if status == 200:
+                        audio, error = await self._receive_audio(resp, filepath)
+                    else:
+                        audio = None
+                        error = (await resp.content.read(2048)).decode("utf-8", errors="ignore")
+            except asyncio.TimeoutError:
+                last_error = f"TTS 请求超时: {api_url}"
+                self.ctx.logger.error(last_error)
+                self._record_backend_result(backend, healthy=False)
+                return None, last_error, True
+            except aiohttp.ClientError as exc:
+                last_error = repr(exc)
+                self.ctx.logger.error("TTS 合成出错: %s", last_error)
+                self._record_backend_result(backend, healthy=False)
+                return None, last_error, True
+            except Exception as exc:
+                last_error = repr(exc)
+                self.ctx.logger.error("TTS 合成出错: %s", last_error)
+                return None, last_error, False
 
-    def _extract_keyword_tts_text(self, raw_text: str) -> Optional[str]:
-        text = (raw_text or "").strip()
-        if not text or text.startswith("/"):
-            return None
+            if status != 200:
+                last_error = f"HTTP {status}: {error[:500]}"
+                self.ctx.logger.warning("TTS API 返回错误: %s", last_error)
+                if status == 404 and api_index < len(endpoints) - 1:
+                    self.ctx.logger.info("TTS API 路径 404，尝试备用地址: %s", endpoints[api_index + 1][0])
+                    continue
+                if status < 500:
+                    # 记住的接口返回 4xx，说明后端可能已更换版本，下次重新识别
+                    backend.forget_endpoint()
+                self._record_backend_result(backend, healthy=status < 500)
+                return None, last_error, status >= 500 or remembered
 
-        lowered = text.lower()
-        for phrase in self._keyword_trigger_phrases():
-            phrase_lower = phrase.lower()
-            index = lowered.find(phrase_lower)
-            if index < 0:
-                continue
+            if audio is None:
+                self.ctx.logger.warning(error)
+                backend.forget_endpoint()
+                self._record_backend_result(backend, healthy=True)
+                return None, error, remembered
 
-            after_payload = self._normalize_keyword_payload(text[index + len(phrase) :])
-            if after_payload:
-                return after_payload
+            self._remember_endpoint(backend, api_url, flavor)
+            self._record_backend_result(backend, healthy=True, latency=time.monotonic() - started)
+            self.ctx.logger.info("TTS 合成成功: %s (%s bytes)", audio.path or "内存", audio.size)
+            return audio, None, False
+        return None, last_error, False
 
-            before_payload = self._normalize_keyword_payload(text[:index], strip_leading=True)
-            if before_payload and not self._is_keyword_request_fluff(before_payload):
-                return before_payload
+    @asynccontextmanager
+    async def _backend_voice(
+        self,
+        backend: BackendState,
+        profile: VoiceProfile,
+        deadline: float,
+    ) -> AsyncIterator[tuple[Optional[str], bool]]:
+        """让后端准备好该音色：按需切换模型权重并设置参考音频，返回 (错误信息, 是否值得重试)。
 
-            default_text = (self.config.vits.keyword_default_text or "").strip()
-            return default_text or None
+        需要切换模型时先等该后端上使用其他模型的请求完成，避免它们中途被换掉模型；
+        等待超过截止时间时抛出 asyncio.TimeoutError。
+        """
+        weights = profile.weights
+        error: Optional[str] = None
+        retryable = False
+        holding = False
+        async with backend.voice_changed:
+            if weights is not None and backend.weights_supported is not False:
+                await asyncio.wait_for(
+                    backend.voice_changed.wait_for(lambda: backend.loaded_weights == weights or not backend.weight_users),
+                    max(0.0, deadline - time.monotonic()),
+                )
+                if backend.loaded_weights != weights:
+                    error, retryable = await self._switch_backend_weights(backend, weights, deadline)
+                if backend.loaded_weights == weights:
+                    backend.weight_users += 1
+                    holding = True
+            pin_key = (profile.ref_audio_path, profile.prompt_text, profile.language)
+            if (
+                error is None
+                and self.config.vits.pin_reference_audio
+                and backend.ref_pinning_supported is not False
+                and backend.pinned_ref != pin_key
+            ):
+                await self._pin_backend_reference(backend, profile, deadline)
+            if error is None:
+                backend.active_voice = profile.name
+        try:
+            yield error, retryable
+        finally:
+            if holding:
+                async with backend.voice_changed:
+                    backend.weight_users -= 1
+                    backend.voice_changed.notify_all()
 
-        return None
+    async def _switch_backend_weights(
+        self,
+        backend: BackendState,
+        weights: tuple[str, str],
+        deadline: float,
+    ) -> tuple[Optional[str], bool]:
+        """调用 api_v2.py 的 /set_gpt_weights、/set_sovits_weights 或 api.py 的 /set_model 切换模型。
 
-    def _keyword_trigger_phrases(self) -> list[str]:
-        raw = self.config.vits.keyword_trigger_phrases or ""
-        phrases = [item.strip() for item in re.split(r"[,，\n]+", raw) if item.strip()]
-        return sorted(set(phrases), key=len, reverse=True)
+        返回 (错误信息, 是否值得重试)；后端没有切换接口时记为不支持并忽略模型权重，不算失败。
+        """
+        api_url, flavor = (await self._resolve_endpoints(backend))[0]
+        gpt_weights, sovits_weights = weights
+        calls: list[tuple[str, str, dict[str, Any]]] = []
+        if flavor == "api_v2":
+            for path, value in (("set_gpt_weights", gpt_weights), ("set_sovits_weights", sovits_weights)):
+                if value:
+                    calls.append(("GET", urljoin(api_url, path), {"params": {"weights_path": value}}))
+        elif flavor == "api":
+            body = {"gpt_model_path": gpt_weights, "sovits_model_path": sovits_weights}
+            calls.append(("POST", urljoin(api_url, "set_model"), {"json": body}))
+        if not calls:
+            backend.weights_supported = False
+            self.ctx.logger.warning("TTS 后端接口类型 %s 不支持切换模型，忽略音色的模型权重: %s", flavor, backend.url)
+            return None, False
 
-    @staticmethod
-    def _normalize_keyword_payload(text: str, strip_leading: bool = False) -> str:
-        value = (text or "").strip().strip(" \t\r\n,，。.:：;；!！?？")
-        prefixes = (
-            "内容是",
-            "内容为",
-            "内容",
-            "说一下",
-            "说下",
-            "说",
-            "读一下",
-            "读下",
-            "读",
-            "念一下",
-            "念下",
-            "念",
-            "一下",
-            "下",
-            "一段",
-            "一句",
-            "这段话",
-            "这句话",
-            "这个",
+        started = time.monotonic()
+        # 切换到一半失败时后端加载的模型未知
+        backend.loaded_weights = None
+        for method, url, options in calls:
+            try:
+                async with self._session.request(
+                    method, url, timeout=self._attempt_timeout(deadline), **options
+                ) as resp:
+                    status = resp.status
+                    body_text = (await resp.content.read(2048)).decode("utf-8", errors="ignore")
+            except (asyncio.TimeoutError, aiohttp.ClientError) as exc:
+                self.ctx.logger.warning("TTS 切换模型出错: url=%s, %r", url, exc)
+                self._record_backend_result(backend, healthy=False)
+                return f"TTS 切换模型出错: {exc!r}", True
+            if status in {404, 405}:
+                backend.weights_supported = False
+                self.ctx.logger.warning("TTS 后端没有模型切换接口，忽略音色的模型权重: %s", url)
+                return None, False
+            if status != 200:
+                error = f"TTS 切换模型失败: HTTP {status}: {body_text[:500]}"
+                self.ctx.logger.warning(error)
+                if status >= 500:
+                    self._record_backend_result(backend, healthy=False)
+                return error, status >= 500
+
+        backend.loaded_weights = weights
+        backend.weights_supported = True
+        self._stats.incr("weight_switches")
+        self.ctx.logger.info(
+            "TTS 后端已切换模型 (%.2fs): %s gpt=%s sovits=%s",
+            time.monotonic() - started,
+            backend.url,
+            gpt_weights or "-",
+            sovits_weights or "-",
         )
-        if strip_leading:
-            prefixes = ("请", "麻烦", "帮我", "帮忙", "把", "将", "让", "来", "再", "能不能", "能") + prefixes
+        return None, False
 
-        changed = True
-        while changed:
-            changed = False
-            for prefix in prefixes:
-                if value.startswith(prefix):
-                    value = value[len(prefix) :].strip(" \t\r\n,，。.:：;；!！?？")
-                    changed = True
+    async def _pin_backend_reference(self, backend: BackendState, profile: VoiceProfile, deadline: float) -> None:
+        """在后端预先设置该音色的参考音频，后端可复用参考音频的预处理结果；失败只记录日志，不影响合成。"""
+        api_url, flavor = (await self._resolve_endpoints(backend))[0]
+        if flavor == "api_v2":
+            method, url = "GET", urljoin(api_url, "set_refer_audio")
+            options: dict[str, Any] = {"params": {"refer_audio_path": profile.ref_audio_path}}
+        elif flavor == "api" and profile.prompt_text:
+            # api.py 的 /change_refer 要求参考文本，没有参考文本时无法设置
+            method, url = "POST", urljoin(api_url, "change_refer")
+            options = {
+                "json": {
+                    "refer_wav_path": profile.ref_audio_path,
+                    "prompt_text": profile.prompt_text,
+                    "prompt_language": profile.language,
+                }
+            }
+        else:
+            backend.ref_pinning_supported = False
+            return
 
-        if GPTSoVITSV2TTSPlugin._is_keyword_request_fluff(value):
-            return ""
-        return value
+        try:
+            async with self._session.request(method, url, timeout=self._attempt_timeout(deadline), **options) as resp:
+                status = resp.status
+        except (asyncio.TimeoutError, aiohttp.ClientError) as exc:
+            self.ctx.logger.info("TTS 设置参考音频出错: url=%s, %r", url, exc)
+            return
+        if status != 200:
+            # 接口不存在或不接受参数，之后不再尝试，直到重新识别接口
+            backend.ref_pinning_supported = False
+            self.ctx.logger.info("TTS 后端不支持预先设置参考音频: url=%s, HTTP %s", url, status)
+            return
+        backend.pinned_ref = (profile.ref_audio_path, profile.prompt_text, profile.language)
+        backend.ref_pinning_supported = True
+        self._stats.incr("reference_pins")
+        self.ctx.logger.info("TTS 后端已设置参考音频: %s -> %s", backend.url, profile.ref_audio_path)
+
+    def _synthesis_deadline(self, requested_at: Optional[float] = None) -> float:
+        """返回本次合成的截止时间（monotonic），同时不晚于原消息的过期时间。"""
+        budget = float(self.config.vits.deadline_seconds) or float(self.config.vits.timeout)
+        deadline = time.monotonic() + max(1.0, budget)
+        stale_after = float(self.config.vits.stale_after_seconds)
+        if requested_at is not None and stale_after > 0:
+            deadline = min(deadline, time.monotonic() + requested_at + stale_after - time.time())
+        return deadline
+
+    def _attempt_timeout(self, deadline: float) -> aiohttp.ClientTimeout:
+        remaining = deadline - time.monotonic()
+        return self._client_timeout(max(0.1, min(float(self.config.vits.timeout), remaining)))
+
+    def _retry_delay(self, attempt: int) -> float:
+        """指数退避加随机抖动，避免多个失败请求同时重试压垮后端。"""
+        base = max(0.0, float(self.config.vits.retry_backoff_base))
+        delay = min(float(self.config.vits.retry_backoff_max), base * (2 ** (attempt - 1)))
+        return random.uniform(delay / 2, delay)
+
+    def _is_stale(self, requested_at: float) -> bool:
+        stale_after = float(self.config.vits.stale_after_seconds)
+        return stale_after > 0 and time.time() - requested_at > stale_after
 
     @staticmethod
-    def _is_keyword_request_fluff(value: str) -> bool:
-        normalized = (value or "").strip().strip(" \t\r\n,，。.:：;；!！?？")
-        return normalized in {
-            "",
-            "你",
-            "您",
-            "请",
-            "麻烦",
-            "帮我",
-            "帮忙",
-            "可以",
-            "能不能",
-            "能",
-            "你再",
-            "您再",
-            "再",
-            "吧",
-            "嘛",
-            "吗",
-            "啦",
-            "了",
-            "呗",
-            "啊",
-            "呀",
-            "呢",
-            "哈",
-            "欸",
-            "看看",
-            "试试",
-            "一下",
-            "下",
-            "一条",
-            "一句",
-        }
+    def _message_timestamp(kwargs: dict[str, Any]) -> float:
+        """尽量从组件参数中取出原消息的时间戳（秒或毫秒），取不到时以当前时间为准。"""
+        now = time.time()
+        sources: list[Any] = [kwargs]
+        if kwargs.get("message") is not None:
+            sources.append(kwargs["message"])
+        for source in sources:
+            for key in ("timestamp", "time", "message_time"):
+                value = source.get(key) if isinstance(source, dict) else getattr(source, key, None)
+                try:
+                    timestamp = float(value)
+                except (TypeError, ValueError):
+                    continue
+                if timestamp > 1e12:
+                    timestamp /= 1000.0
+                if 0 < timestamp <= now + 60:
+                    return timestamp
+        return now
 
-    async def _ensure_session(self) -> None:
-        if self._session and not self._session.closed:
-            return
-        timeout = aiohttp.ClientTimeout(total=max(1, int(self.config.vits.timeout)))
-        self._session = aiohttp.ClientSession(timeout=timeout)
+    @staticmethod
+    def _message_user_id(kwargs: dict[str, Any]) -> str:
+        """尽量从组件参数中取出发送者 ID，取不到时返回空字符串，此时只按聊天流限速。"""
 
-    async def _close_session(self) -> None:
-        if self._session and not self._session.closed:
-            await self._session.close()
-        self._session = None
+        def get(source: Any, key: str) -> Any:
+            return source.get(key) if isinstance(source, dict) else getattr(source, key, None)
 
-    async def send_voice_file(self, audio_path: str, stream_id: str, text: str = "") -> bool:
-        try:
-            async with aiofiles.open(audio_path, "rb") as f:
-                audio_base64 = base64.b64encode(await f.read()).decode("ascii")
-        except Exception as exc:
-            self.ctx.logger.error("读取 TTS 音频失败: %s", exc)
-            return False
+        sources: list[Any] = [kwargs]
+        message = kwargs.get("message")
+        if message is not None:
+            message_info = get(message, "message_info")
+            sources.extend(item for item in (message, get(message, "user_info"), message_info) if item is not None)
+            if message_info is not None and get(message_info, "user_info") is not None:
+                sources.append(get(message_info, "user_info"))
+        for source in sources:
+            for key in ("user_id", "sender_id"):
+                value = get(source, key)
+                if value not in (None, ""):
+                    return str(value)
+        return ""
 
-        return bool(
-            await self.ctx.send.custom(
-                "voice",
-                audio_base64,
-                stream_id,
-                processed_plain_text="[语音]" if not text else f"[语音] {text[:80]}",
-            )
-        )
+    async def _resolve_endpoints(self, backend: BackendState) -> list[tuple[str, str]]:
+        """返回本次请求依次尝试的 (接口地址, 接口类型)。已确认可用的接口会一直复用，直到出错或重载配置。"""
+        if backend.endpoint and backend.api_flavor:
+            return [(backend.endpoint, backend.api_flavor)]
 
-    async def synthesize_voice(self, text: str, voice_id: Optional[str] = None) -> Optional[str]:
-        await self._ensure_session()
+        flavor = (self.config.vits.api_flavor or "auto").strip().lower()
+        if flavor == "api":
+            return [(backend.url, "api")]
+        if flavor == "api_v2":
+            path = urlsplit(backend.url).path or "/"
+            return [(urljoin(backend.url, "tts") if path.rstrip("/") == "" else backend.url, "api_v2")]
+        if flavor == "auto" and not backend.flavor_probed:
+            backend.flavor_probed = True
+            backend.detected_endpoint = await self._detect_api_flavor(backend)
+        if flavor == "auto" and backend.detected_endpoint:
+            # 识别结果在请求成功前也会复用，切换模型等控制请求和随后的合成请求使用同一接口
+            return [backend.detected_endpoint]
+        return [(url, "compat") for url in self._candidate_api_urls(backend.url)]
+
+    async def _detect_api_flavor(self, backend: BackendState) -> Optional[tuple[str, str]]:
+        """读取后端的 FastAPI openapi.json 判断是 api_v2.py（/tts）还是 api.py（POST /）。"""
         if not self._session:
             return None
-
-        text = (text or "").strip()
-        if not text:
-            self.ctx.logger.warning("TTS 文本为空")
+        timeout = aiohttp.ClientTimeout(total=max(0.1, float(self.config.backends.health_check_timeout)))
+        try:
+            async with self._session.get(urljoin(backend.url, "openapi.json"), timeout=timeout) as resp:
+                if resp.status != 200:
+                    return None
+                schema = await resp.json(content_type=None)
+        except Exception as exc:
+            self.ctx.logger.info("TTS 接口类型识别失败，按兼容模式尝试: %r", exc)
             return None
 
-        api_urls = self._candidate_api_urls(self.config.vits.api_url)
-        ref_path = self.config.vits.ref_audio_path
-        language = self.config.vits.language
-        retry_count = max(1, int(self.config.vits.retry_count))
-        max_text_length = max(1, int(self.config.vits.max_text_length))
-
-        if not ref_path:
-            self.ctx.logger.warning("未配置参考音频路径 vits.ref_audio_path")
+        paths = schema.get("paths") if isinstance(schema, dict) else None
+        if not isinstance(paths, dict):
             return None
-        if not os.path.exists(ref_path):
-            self.ctx.logger.warning("参考音频不存在: %s", ref_path)
+        if "/tts" in paths:
+            detected = (urljoin(backend.url, "tts"), "api_v2")
+        elif isinstance(paths.get("/"), dict) and "post" in paths["/"]:
+            detected = (urljoin(backend.url, "./"), "api")
+        else:
             return None
+        self.ctx.logger.info("TTS 接口类型识别为 %s: %s", detected[1], detected[0])
+        return detected
+
+    def _remember_endpoint(self, backend: BackendState, api_url: str, flavor: str) -> None:
+        if backend.endpoint == api_url and backend.api_flavor == flavor:
+            return
+        backend.endpoint = api_url
+        backend.api_flavor = flavor
+        self.ctx.logger.info("TTS 后端接口已确认: %s (flavor=%s)", api_url, flavor)
+
+    def _payload_for_flavor(self, payload: dict[str, Any], flavor: str) -> dict[str, Any]:
+        """把通用请求参数转换为对应接口类型的请求体。"""
+        if flavor == "api_v2":
+            # 不请求 raw：裸 PCM 没有文件头，既无法校验也无法作为语音消息发送
+            media_type = (self.config.vits.audio_format or "wav").lower()
+            return {
+                "text": payload["text"],
+                "text_lang": payload["text_lang"],
+                "ref_audio_path": payload["ref_audio_path"],
+                "prompt_text": payload.get("prompt_text", ""),
+                "prompt_lang": payload["prompt_lang"],
+                "speed_factor": payload.get("speed", 1.0),
+                "media_type": media_type if media_type in {"wav", "ogg", "aac"} else "wav",
+                "streaming_mode": bool(payload.get("streaming_mode", False)),
+            }
+        if flavor == "api":
+            return {
+                "refer_wav_path": payload["ref_audio_path"],
+                "prompt_text": payload.get("prompt_text", ""),
+                "prompt_language": payload["prompt_lang"],
+                "text": payload["text"],
+                "text_language": payload["text_lang"],
+                "speed": payload.get("speed", 1.0),
+            }
+        return payload
+
+    async def _receive_audio(
+        self,
+        resp: aiohttp.ClientResponse,
+        filepath: Optional[str],
+    ) -> tuple[Optional[SynthesizedAudio], str]:
+        """分块读取响应体，边校验音频头边做 base64 编码，并可同时写入 filepath。"""
+        content_type = resp.headers.get("Content-Type", "")
+        lowered = content_type.lower()
+        if "application/json" in lowered or "text/" in lowered:
+            body = (await resp.content.read(2048)).decode("utf-8", errors="ignore")
+            return None, f"API 返回的不是音频: content_type={content_type}, body={body[:500]}"
 
+        encoder = Base64Encoder()
+        head = preview = b""
+        size = 0
+        temp_path = f"{filepath}.{uuid.uuid4().hex[:8]}.part" if filepath else None
+        f = None
+        started = time.perf_counter()
+        encode_seconds = write_seconds = 0.0
         try:
-            spk_id = int(voice_id or self.config.vits.default_voice_id)
-        except Exception:
-            spk_id = 0
+            async for data in resp.content.iter_chunked(_STREAM_CHUNK_SIZE):
+                if size == 0:
+                    # 先凑够文件头再校验，JSON 之类的错误响应在读到前几个字节时就放弃
+                    head += data
+                    if len(head) < 12:
+                        continue
+                    if not self._looks_like_audio(head):
+                        body = head[:500].decode("utf-8", errors="ignore")
+                        return None, f"API 返回的不是音频: content_type={content_type}, body={body}"
+                    data, head = head, b""
+                    preview = data[:500]
+                    if temp_path:
+                        f = await aiofiles.open(temp_path, "wb")
+                encode_started = time.perf_counter()
+                encoder.update(data)
+                encode_seconds += time.perf_counter() - encode_started
+                size += len(data)
+                if f is not None:
+                    write_started = time.perf_counter()
+                    await f.write(data)
+                    write_seconds += time.perf_counter() - write_started
 
-        tts_text = await self.prepare_tts_text(text, language=language, max_text_length=max_text_length)
-        if not tts_text:
-            self.ctx.logger.warning("TTS 文本语言改写失败，已阻止继续合成")
+            size = size or len(head)
+            if size <= 1000:
+                body = (preview or head)[:500].decode("utf-8", errors="ignore")
+                return None, f"音频内容过小: {size} bytes, body={body}"
+
+            if f is not None:
+                await f.close()
+                f = None
+                os.replace(temp_path, filepath)
+                temp_path = None
+                self._register_cache_file(filepath, size)
+            encode_started = time.perf_counter()
+            audio_base64 = encoder.finish()
+            encode_seconds += time.perf_counter() - encode_started
+
+            self._stats.incr("bytes_received", size)
+            self._stats.observe("base64_encode", encode_seconds)
+            if filepath:
+                self._stats.observe("disk_write", write_seconds)
+            self._stats.observe("download", time.perf_counter() - started - encode_seconds - write_seconds)
+            return SynthesizedAudio(path=filepath, audio_base64=audio_base64, size=size), ""
+        finally:
+            if f is not None:
+                await f.close()
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    @staticmethod
+    def _looks_like_audio(head: bytes) -> bool:
+        if head[:4] in {b"RIFF", b"OggS", b"fLaC"} or head[:3] == b"ID3":
+            return True
+        # 无 ID3 标签的 MP3 以帧同步字开头
+        return len(head) >= 2 and head[0] == 0xFF and (head[1] & 0xE0) == 0xE0
+
+    async def _postprocess_audio(self, audio: SynthesizedAudio) -> SynthesizedAudio:
+        """按 [postprocess] 处理合成结果，原音频有文件时处理结果也写入缓存目录复用；处理失败时返回原音频。"""
+        signature = self._postprocess_signature()
+        if signature is None:
+            return audio
+        stem = os.path.splitext(audio.path)[0] if audio.path else None
+        if stem:
+            cached_path = f"{stem}.{signature}.{self._output_format()}"
+            if self._cache_index.touch(cached_path):
+                return SynthesizedAudio(path=cached_path)
+
+        started = time.perf_counter()
+        try:
+            if audio.audio_base64 is not None:
+                data = base64.b64decode(audio.audio_base64)
+            else:
+                with self._cache_index.pinned(audio.path):
+                    async with aiofiles.open(audio.path, "rb") as f:
+                        data = await f.read()
+            content, output_format = await self._render_postprocessed(data)
+        except Exception as exc:
+            self.ctx.logger.warning("TTS 音频后处理失败，发送原始音频: %r", exc)
+            return audio
+        self._stats.observe("postprocess", time.perf_counter() - started)
+        self._stats.incr("postprocess_bytes_in", len(data))
+        self._stats.incr("postprocess_bytes_out", len(content))
+
+        filepath = None
+        if stem:
+            filepath = f"{stem}.{signature}.{output_format}"
+            await asyncio.to_thread(self._write_bytes_atomic, filepath, content)
+            self._register_cache_file(filepath, len(content))
+        return SynthesizedAudio(path=filepath, audio_base64=base64.b64encode(content).decode("ascii"), size=len(content))
+
+    async def _render_postprocessed(self, data: bytes) -> tuple[bytes, str]:
+        """返回 (处理后的音频, 格式)；转码失败时输出 numpy 处理后的 WAV。"""
+        if np is not None:
+            data = await asyncio.to_thread(self._process_wav, data, self.config.postprocess)
+        if self._postprocess_encoder is not None:
+            encoded = await self._encode_audio(data)
+            if encoded is not None:
+                return encoded, self._output_format()
+            if np is None:
+                raise RuntimeError("ffmpeg 转码失败")
+        return data, "wav"
+
+    async def _encode_audio(self, data: bytes) -> Optional[bytes]:
+        """通过 ffmpeg 的标准输入输出转码，不落临时文件；失败时返回 None。"""
+        config = self.config.postprocess
+        _, codec_args = _POSTPROCESS_CODECS[(config.output_codec or "").strip().lower()]
+        process = None
+        try:
+            process = await asyncio.create_subprocess_exec(
+                self._postprocess_encoder,
+                "-hide_banner",
+                "-loglevel",
+                "error",
+                "-i",
+                "pipe:0",
+                "-vn",
+                *codec_args,
+                "-b:a",
+                f"{max(6, int(config.bitrate_kbps))}k",
+                "pipe:1",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            stdout, stderr = await asyncio.wait_for(
+                process.communicate(data), timeout=max(1.0, float(self.config.vits.timeout))
+            )
+        except (OSError, asyncio.TimeoutError) as exc:
+            self.ctx.logger.warning("ffmpeg 转码出错: %r", exc)
+            return None
+        finally:
+            if process is not None and process.returncode is None:
+                # 超时或被取消时结束 ffmpeg 并回收子进程，避免留下僵尸进程和未关闭的管道
+                try:
+                    process.kill()
+                except ProcessLookupError:
+                    pass
+                await process.wait()
+        if process.returncode != 0 or not stdout:
+            self.ctx.logger.warning(
+                "ffmpeg 转码失败 (exit=%s): %s", process.returncode, stderr.decode("utf-8", errors="ignore")[:300]
+            )
             return None
-        self.ctx.logger.info("TTS 最终提交文本 language=%s text=%s", language, tts_text[:160])
+        return stdout
 
-        payload = {
+    @staticmethod
+    def _build_tts_payload(tts_text: str, spk_id: int, profile: VoiceProfile) -> dict[str, Any]:
+        """通用请求参数，同时也是兼容模式（compat）下直接发送的请求体。"""
+        return {
             "text": tts_text,
             "speaker_id": spk_id,
-            "text_lang": language,
-            "prompt_lang": language,
-            "ref_audio_path": ref_path,
-            "speed": 1.0,
+            "text_lang": profile.language,
+            "prompt_lang": profile.language,
+            "ref_audio_path": profile.ref_audio_path,
+            "prompt_text": profile.prompt_text,
+            "speed": profile.speed,
             "volume": 1.0,
         }
 
-        last_error = None
-        for attempt in range(1, retry_count + 1):
-            for api_index, api_url in enumerate(api_urls):
-                try:
-                    self.ctx.logger.info("TTS 请求开始 attempt=%s/%s, url=%s", attempt, retry_count, api_url)
-                    async with self._session.post(api_url, json=payload) as resp:
-                        content_type = resp.headers.get("Content-Type", "")
-                        content = await resp.read()
-
-                        if resp.status != 200:
-                            err_text = content.decode("utf-8", errors="ignore")
-                            last_error = f"HTTP {resp.status}: {err_text[:500]}"
-                            self.ctx.logger.warning("TTS API 返回错误: %s", last_error)
-                            if resp.status == 404 and api_index < len(api_urls) - 1:
-                                self.ctx.logger.info("TTS API 路径 404，尝试备用地址: %s", api_urls[api_index + 1])
-                                continue
-                            await asyncio.sleep(0.5)
-                            continue
-
-                        lowered = content_type.lower()
-                        if "application/json" in lowered or "text/" in lowered:
-                            err_text = content.decode("utf-8", errors="ignore")
-                            last_error = f"API 返回的不是音频: content_type={content_type}, body={err_text[:500]}"
-                            self.ctx.logger.warning(last_error)
-                            await asyncio.sleep(0.5)
-                            continue
-
-                        if len(content) <= 1000:
-                            err_text = content.decode("utf-8", errors="ignore")
-                            last_error = f"音频内容过小: {len(content)} bytes, body={err_text[:500]}"
-                            self.ctx.logger.warning(last_error)
-                            await asyncio.sleep(0.5)
-                            continue
-
-                        filename = f"vits_{uuid.uuid4().hex[:8]}.{self.config.vits.audio_format or 'wav'}"
-                        filepath = os.path.join(self._cache_dir, filename)
-                        async with aiofiles.open(filepath, "wb") as f:
-                            await f.write(content)
-
-                        if os.path.getsize(filepath) > 1000:
-                            self.ctx.logger.info("TTS 合成成功: %s", filepath)
-                            return filepath
-
-                        last_error = f"写入后的音频文件过小: {filepath}"
-                        self.ctx.logger.warning(last_error)
-
-                except asyncio.TimeoutError:
-                    last_error = "TTS 请求超时"
-                    self.ctx.logger.error(last_error)
-                    await asyncio.sleep(0.5)
-                except Exception as exc:
-                    last_error = repr(exc)
-                    self.ctx.logger.error("TTS 合成出错: %s", last_error)
-                    await asyncio.sleep(0.5)
+    async def _lookup_synthesis_cache(
+        self,
+        payload: dict[str, Any],
+        audio_format: str,
+        weights: Optional[tuple[str, str]] = None,
+    ) -> Optional[str]:
+        """返回该请求对应的缓存文件路径；未启用合成缓存时返回 None。"""
+        if not self.config.cache.synthesis_cache_enabled:
+            return None
 
-        self.ctx.logger.error("TTS 合成失败，最后错误: %s", last_error)
+        cache_key = await self._synthesis_cache_key(payload, audio_format, weights)
+        cache_path = os.path.join(self._cache_dir, f"vits_{cache_key}.{audio_format}")
+        if not self._cache_index.touch(cache_path):
+            self._synthesis_cache_misses += 1
+            self._stats.incr("synthesis_cache_misses")
+            return cache_path
+
+        self._synthesis_cache_hits += 1
+        self._stats.incr("synthesis_cache_hits")
+        self.ctx.logger.info(
+            "TTS 合成缓存命中: %s (hits=%s, misses=%s)",
+            cache_path,
+            self._synthesis_cache_hits,
+            self._synthesis_cache_misses,
+        )
+        return cache_path
+
+    async def _synthesis_cache_key(
+        self,
+        payload: dict[str, Any],
+        audio_format: str,
+        weights: Optional[tuple[str, str]] = None,
+    ) -> str:
+        ref_path = str(payload.get("ref_audio_path") or "")
+        key_data = {
+            "text": payload.get("text"),
+            "speaker_id": payload.get("speaker_id"),
+            "text_lang": payload.get("text_lang"),
+            "prompt_lang": payload.get("prompt_lang"),
+            "ref_audio_path": ref_path,
+            "ref_audio_sha256": await self._ref_audio_digest(ref_path),
+            "prompt_text": payload.get("prompt_text"),
+            "speed": payload.get("speed"),
+            "volume": payload.get("volume"),
+            "audio_format": audio_format,
+        }
+        if weights is not None:
+            # 只在指定了模型权重时加入，未使用命名音色的缓存键保持不变
+            key_data["weights"] = list(weights)
+        raw = json.dumps(key_data, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def _ref_audio_stat(self, ref_path: str) -> Optional[tuple[int, int]]:
+        """返回参考音频的 (mtime_ns, size)，文件不存在时返回 None；结果缓存 _REF_AUDIO_STAT_TTL 秒。"""
+        now = time.monotonic()
+        cached = self._ref_audio_stats.get(ref_path)
+        if cached and now - cached[0] < _REF_AUDIO_STAT_TTL:
+            return cached[1]
+        try:
+            stat = os.stat(ref_path)
+            result: Optional[tuple[int, int]] = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            result = None
+        self._ref_audio_stats[ref_path] = (now, result)
+        return result
+
+    async def _ref_audio_digest(self, ref_path: str) -> str:
+        stat = self._ref_audio_stat(ref_path)
+        if stat is None:
+            return ""
+
+        cached = self._ref_audio_digests.get(ref_path)
+        if cached and cached[:2] == stat:
+            return cached[2]
+
+        digest = await asyncio.to_thread(self._hash_file, ref_path)
+        self._ref_audio_digests[ref_path] = (*stat, digest)
+        return digest
+
+    @staticmethod
+    def _hash_file(path: str) -> str:
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(block)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def _split_tts_text(text: str, max_length: int) -> list[str]:
+        """在句末标点处切分文本，并把短句合并为不超过 max_length 的片段。"""
+        pieces: list[str] = []
+        for sentence in _SENTENCE_RE.findall(text):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if len(sentence) <= max_length:
+                pieces.append(sentence)
+                continue
+            for clause in _CLAUSE_RE.findall(sentence):
+                clause = clause.strip()
+                while len(clause) > max_length:
+                    pieces.append(clause[:max_length])
+                    clause = clause[max_length:].strip()
+                if clause:
+                    pieces.append(clause)
+
+        segments: list[str] = []
+        for piece in pieces:
+            if segments:
+                # 英文等用空格分词的文本合并时补回被 strip 掉的空格
+                joiner = " " if segments[-1][-1].isascii() and piece[0].isascii() else ""
+                if len(segments[-1]) + len(joiner) + len(piece) <= max_length:
+                    segments[-1] += joiner + piece
+                    continue
+            segments.append(piece)
+        return segments
+
+    @staticmethod
+    def _parse_wav(data: bytes) -> tuple[bytes, bytes]:
+        """返回 WAV 的 fmt 块内容与 PCM 数据；容忍流式接口写出的不正确 data 长度。"""
+        if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+            raise ValueError("不是 RIFF/WAVE 音频")
+
+        fmt_chunk = None
+        pos = 12
+        while pos + 8 <= len(data):
+            chunk_id = data[pos : pos + 4]
+            chunk_size = struct.unpack_from("<I", data, pos + 4)[0]
+            body_start = pos + 8
+            if chunk_id == b"data":
+                if fmt_chunk is None:
+                    break
+                body_end = body_start + chunk_size
+                if chunk_size == 0 or body_end > len(data):
+                    body_end = len(data)
+                return fmt_chunk, data[body_start:body_end]
+            if chunk_id == b"fmt ":
+                fmt_chunk = data[body_start : body_start + chunk_size]
+            pos = body_start + chunk_size + (chunk_size & 1)
+        raise ValueError("WAV 缺少 fmt 或 data 块")
+
+    @staticmethod
+    def _parse_wav_stream_header(header: bytes) -> Optional[tuple[bytes, int]]:
+        """解析流式 WAV 的头部，返回 (fmt 块内容, PCM 起始偏移)；数据不足时返回 None。"""
+        if len(header) >= 12 and (header[:4] != b"RIFF" or header[8:12] != b"WAVE"):
+            raise ValueError("不是 RIFF/WAVE 音频")
+
+        fmt_chunk = None
+        pos = 12
+        while pos + 8 <= len(header):
+            chunk_id = header[pos : pos + 4]
+            chunk_size = struct.unpack_from("<I", header, pos + 4)[0]
+            body_start = pos + 8
+            if chunk_id == b"data":
+                return (fmt_chunk, body_start) if fmt_chunk is not None else None
+            if body_start + chunk_size > len(header):
+                return None
+            if chunk_id == b"fmt ":
+                fmt_chunk = header[body_start : body_start + chunk_size]
+            pos = body_start + chunk_size + (chunk_size & 1)
         return None
 
+    @staticmethod
+    def _build_wav(fmt_chunk: bytes, pcm: bytes) -> bytes:
+        fmt_pad = b"\x00" if len(fmt_chunk) & 1 else b""
+        data_pad = b"\x00" if len(pcm) & 1 else b""
+        riff_size = 4 + 8 + len(fmt_chunk) + len(fmt_pad) + 8 + len(pcm) + len(data_pad)
+        return b"".join(
+            (
+                b"RIFF",
+                struct.pack("<I", riff_size),
+                b"WAVE",
+                b"fmt ",
+                struct.pack("<I", len(fmt_chunk)),
+                fmt_chunk,
+                fmt_pad,
+                b"data",
+                struct.pack("<I", len(pcm)),
+                pcm,
+                data_pad,
+            )
+        )
+
+    @classmethod
+    def _join_wav_files(cls, paths: list[str], silence_ms: int) -> bytes:
+        fmt_chunk = None
+        parts: list[bytes] = []
+        silence = b""
+        for index, path in enumerate(paths):
+            with open(path, "rb") as f:
+                chunk_fmt, pcm = cls._parse_wav(f.read())
+            if fmt_chunk is None:
+                fmt_chunk = chunk_fmt
+                _, _, sample_rate, _, block_align, bits = struct.unpack_from("<HHIIHH", fmt_chunk)
+                frames = sample_rate * silence_ms // 1000
+                silence = (b"\x80" if bits == 8 else b"\x00") * (frames * block_align)
+            elif chunk_fmt[:16] != fmt_chunk[:16]:
+                raise ValueError(f"分段音频格式不一致: {path}")
+            if index and silence:
+                parts.append(silence)
+            parts.append(pcm)
+        if fmt_chunk is None:
+            raise ValueError("没有可拼接的音频")
+        return cls._build_wav(fmt_chunk, b"".join(parts))
+
+    @classmethod
+    def _process_wav(cls, data: bytes, config: PostprocessConfig) -> bytes:
+        """用 numpy 裁剪首尾静音、混合为单声道、重采样并归一化音量，输出 16 位 PCM WAV；不是 PCM WAV 时抛出 ValueError。"""
+        fmt_chunk, pcm = cls._parse_wav(data)
+        format_tag, channels, sample_rate, _, block_align, bits = struct.unpack_from("<HHIIHH", fmt_chunk)
+        if format_tag == 0xFFFE and len(fmt_chunk) >= 26:
+            # WAVE_FORMAT_EXTENSIBLE 的实际编码在子格式 GUID 的前两个字节
+            format_tag = struct.unpack_from("<H", fmt_chunk, 24)[0]
+        pcm = pcm[: len(pcm) - len(pcm) % max(1, block_align)]
+        if format_tag == 1 and bits == 16:
+            samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768.0
+        elif format_tag == 1 and bits == 32:
+            samples = (np.frombuffer(pcm, dtype="<i4") / 2147483648.0).astype(np.float32)
+        elif format_tag == 3 and bits == 32:
+            samples = np.frombuffer(pcm, dtype="<f4").astype(np.float32)
+        elif format_tag == 1 and bits == 8:
+            samples = (np.frombuffer(pcm, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+        else:
+            raise ValueError(f"不支持的 WAV 编码: format={format_tag}, bits={bits}")
+        if channels < 1 or not samples.size:
+            raise ValueError("WAV 没有音频数据")
+        samples = samples.reshape(-1, channels)
+
+        if config.downmix_mono and channels > 1:
+            samples = samples.mean(axis=1, keepdims=True)
+        if config.trim_silence:
+            loud = np.flatnonzero(np.abs(samples).max(axis=1) > 10 ** (float(config.silence_threshold_db) / 20))
+            if loud.size:
+                keep = sample_rate * max(0, int(config.keep_silence_ms)) // 1000
+                samples = samples[max(0, loud[0] - keep) : loud[-1] + 1 + keep]
+        target_rate = int(config.sample_rate)
+        if target_rate > 0 and target_rate != sample_rate:
+            samples = cls._resample(samples, sample_rate, target_rate)
+            sample_rate = target_rate
+
+        mode = (config.normalize or "off").strip().lower()
+        peak = float(np.abs(samples).max())
+        if mode in {"peak", "rms"} and peak > 0:
+            gain = 10 ** (float(config.peak_target_db) / 20) / peak
+            if mode == "rms":
+                rms = float(np.sqrt(np.mean(np.square(samples, dtype=np.float64))))
+                gain = min(gain, 10 ** (float(config.loudness_target_db) / 20) / rms)
+            samples = samples * min(gain, _NORMALIZE_MAX_GAIN)
+
+        channels = samples.shape[1]
+        pcm16 = np.clip(np.rint(samples * 32767.0), -32768, 32767).astype("<i2")
+        fmt_chunk = struct.pack("<HHIIHH", 1, channels, sample_rate, sample_rate * channels * 2, channels * 2, 16)
+        return cls._build_wav(fmt_chunk, pcm16.tobytes())
+
+    @staticmethod
+    def _resample(samples: "np.ndarray", source_rate: int, target_rate: int) -> "np.ndarray":
+        """对 (帧数, 声道数) 的采样做线性插值重采样；降采样前先用加窗 sinc 低通滤波，避免高频混叠。"""
+        frames, channels = samples.shape
+        if target_rate < source_rate and frames > 2 * _RESAMPLE_HALF_TAPS + 1:
+            cutoff = 0.475 * target_rate / source_rate
+            taps = np.arange(-_RESAMPLE_HALF_TAPS, _RESAMPLE_HALF_TAPS + 1)
+            kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hanning(taps.size)
+            kernel /= kernel.sum()
+            samples = np.stack([np.convolve(samples[:, c], kernel, mode="same") for c in range(channels)], axis=1)
+        positions = np.arange(max(1, round(frames * target_rate / source_rate))) * (source_rate / target_rate)
+        indices = np.arange(frames)
+        return np.stack([np.interp(positions, indices, samples[:, c]) for c in range(channels)], axis=1).astype(np.float32)
+
     @staticmethod
     def _candidate_api_urls(api_url: str) -> list[str]:
         raw = (api_url or "").strip()
@@ -452,15 +3968,59 @@ class GPTSoVITSV2TTSPlugin(MaiBotPlugin):
         if not self.config.vits.auto_language_rewrite or target_code in {"", "auto"}:
             return text[:max_text_length]
 
+        if self.config.vits.local_language_detection:
+            detected, confidence = self._detect_text_language(text)
+            if detected == target_code and confidence >= float(self.config.vits.local_detection_confidence):
+                self._rewrites_avoided += 1
+                self._stats.incr("rewrite_skipped_local")
+                self.ctx.logger.info(
+                    "TTS 文本已是%s (置信度 %.2f)，跳过 LLM 改写，累计跳过 %s 次",
+                    target_name,
+                    confidence,
+                    self._rewrites_avoided,
+                )
+                return self._normalize_tts_symbols(text, target_code)[:max_text_length]
+
+        rewrite_model = self.config.vits.language_rewrite_model
+        cache_key = (text, target_code, str(rewrite_model or ""))
+        if self.config.cache.rewrite_cache_enabled:
+            cached = self._rewrite_cache.get(cache_key)
+            if cached:
+                self._stats.incr("rewrite_cache_hits")
+                self.ctx.logger.info("TTS 语言改写缓存命中: %s", cached[:120])
+                return cached[:max_text_length]
+
+        with self._stats.timer("llm_rewrite"):
+            if int(self.config.vits.rewrite_batch_window_ms) > 0 and int(self.config.vits.rewrite_batch_max_items) > 1:
+                rewritten = await self._batched_rewrite(text, target_code, target_name, rewrite_model, max_text_length)
+            else:
+                rewritten = await self._generate_rewrite(text, target_code, target_name, rewrite_model, max_text_length)
+        if not rewritten:
+            if self.config.vits.block_on_language_rewrite_failure:
+                return None
+            return text[:max_text_length]
+
+        if self.config.cache.rewrite_cache_enabled:
+            self._rewrite_cache.put(cache_key, rewritten)
+        if rewritten != text:
+            self.ctx.logger.info("TTS 文本已按 %s 改写: %s", target_code, rewritten[:120])
+        return rewritten[:max_text_length]
+
+    async def _generate_rewrite(
+        self,
+        text: str,
+        target_code: str,
+        target_name: str,
+        rewrite_model: str,
+        max_text_length: int,
+    ) -> str:
+        """单独请求 LLM 改写一条文本，失败时记录日志并返回空字符串。"""
         prompt = (
             "你是 TTS 朗读文本本地化器。请把原文改写为自然、口语、适合语音合成朗读的"
             f"{target_name}。\n"
             "要求：\n"
             "1. 只输出最终要交给 TTS 的文本，不要解释，不要引号，不要 Markdown。\n"
-            "2. 保留原文含义、角色口吻、情绪、称呼和语气，不要添加新信息。\n"
-            "3. 如果原文已经是目标语言，只做轻微口语化润色。\n"
-            "4. 如果目标语言是日语，必须输出标准自然日语，不要把中文按日语读音硬转写。\n"
-            "5. 数字、符号、缩写改成适合朗读的表达。\n\n"
+            f"{_REWRITE_RULES}\n"
             f"目标语言代码：{target_code}\n"
             f"目标语言：{target_name}\n"
             f"原文：{text}"
@@ -469,35 +4029,194 @@ class GPTSoVITSV2TTSPlugin(MaiBotPlugin):
         try:
             result = await self.ctx.llm.generate(
                 prompt,
-                model=self.config.vits.language_rewrite_model,
+                model=rewrite_model,
                 temperature=0.2,
-                max_tokens=max(128, min(1024, max_text_length * 2)),
+                max_tokens=max(128, min(4096, max_text_length * 2)),
             )
         except Exception as exc:
             self.ctx.logger.warning("TTS 语言改写失败: %s", exc)
-            if self.config.vits.block_on_language_rewrite_failure:
-                return None
-            return text[:max_text_length]
+            return ""
 
         rewritten = ""
         if isinstance(result, dict):
             rewritten = str(result.get("response") or "").strip()
             if not result.get("success", True):
                 self.ctx.logger.warning("TTS 语言改写返回失败: %s", result.get("error") or rewritten)
-                if self.config.vits.block_on_language_rewrite_failure:
-                    return None
-                return text[:max_text_length]
+                return ""
 
         rewritten = self._clean_llm_text(rewritten)
         if not rewritten:
             self.ctx.logger.warning("TTS 语言改写结果为空")
-            if self.config.vits.block_on_language_rewrite_failure:
-                return None
-            return text[:max_text_length]
+        return rewritten
 
-        if rewritten != text:
-            self.ctx.logger.info("TTS 文本已按 %s 改写: %s", target_code, rewritten[:120])
-        return rewritten[:max_text_length]
+    async def _batched_rewrite(
+        self,
+        text: str,
+        target_code: str,
+        target_name: str,
+        rewrite_model: str,
+        max_text_length: int,
+    ) -> str:
+        """把目标语言和模型相同的改写请求合并成一次 LLM 调用。
+
+        没有进行中的改写时立即请求，不为等待合并增加延迟；改写进行中到达的请求攒成一批，
+        在进行中的调用结束、攒满 rewrite_batch_max_items 条或等待满 rewrite_batch_window_ms 时发出。
+        """
+        key = (target_code, str(rewrite_model or ""))
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        item = (text, max_text_length, future)
+        if not self._rewrite_inflight.get(key) and key not in self._rewrite_batches:
+            self._start_rewrite_batch(target_code, target_name, rewrite_model, [item], delay=0.0, key=key)
+            return await future
+
+        batch = self._rewrite_batches.setdefault(key, [])
+        batch.append(item)
+        if len(batch) >= int(self.config.vits.rewrite_batch_max_items):
+            del self._rewrite_batches[key]
+            self._start_rewrite_batch(target_code, target_name, rewrite_model, batch, delay=0.0, key=key)
+        elif len(batch) == 1:
+            delay = int(self.config.vits.rewrite_batch_window_ms) / 1000
+            self._start_rewrite_batch(target_code, target_name, rewrite_model, batch, delay=delay, key=key)
+        return await future
+
+    def _start_rewrite_batch(
+        self,
+        target_code: str,
+        target_name: str,
+        rewrite_model: str,
+        batch: list[tuple[str, int, asyncio.Future]],
+        delay: float,
+        key: tuple[str, str],
+    ) -> None:
+        """发出一批改写；delay 大于 0 时先等待，等待期间已由其他路径发出的批次不再重复处理。"""
+        if not delay:
+            self._rewrite_inflight[key] = self._rewrite_inflight.get(key, 0) + 1
+
+        async def run() -> None:
+            if delay:
+                await asyncio.sleep(delay)
+                if self._rewrite_batches.get(key) is not batch:
+                    return
+                del self._rewrite_batches[key]
+                self._rewrite_inflight[key] = self._rewrite_inflight.get(key, 0) + 1
+            cancelled = False
+            try:
+                await self._run_rewrite_batch(target_code, target_name, rewrite_model, batch)
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+            except Exception as exc:
+                self.ctx.logger.error("TTS 合并语言改写出错: %s", exc)
+            finally:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_result("")
+                remaining = self._rewrite_inflight.get(key, 0) - 1
+                if remaining > 0:
+                    self._rewrite_inflight[key] = remaining
+                else:
+                    self._rewrite_inflight.pop(key, None)
+                # 进行中的调用结束后立即发出期间攒下的请求
+                pending = None if cancelled else self._rewrite_batches.pop(key, None)
+                if pending:
+                    self._start_rewrite_batch(target_code, target_name, rewrite_model, pending, delay=0.0, key=key)
+
+        task = asyncio.create_task(run())
+        self._rewrite_batch_tasks.add(task)
+        task.add_done_callback(self._rewrite_batch_tasks.discard)
+
+    async def _run_rewrite_batch(
+        self,
+        target_code: str,
+        target_name: str,
+        rewrite_model: str,
+        batch: list[tuple[str, int, asyncio.Future]],
+    ) -> None:
+        pending = [item for item in batch if not item[2].done()]
+        if not pending:
+            return
+        texts = list(dict.fromkeys(text for text, _, _ in pending))
+        max_text_length = max(length for _, length, _ in pending)
+
+        results: dict[str, str] = {}
+        if len(texts) > 1:
+            results = await self._generate_batch_rewrite(texts, target_code, target_name, rewrite_model, max_text_length)
+        # 只有一条或解析失败的条目单独请求
+        missing = [text for text in texts if not results.get(text)]
+        if missing:
+            singles = await asyncio.gather(
+                *(
+                    self._generate_rewrite(text, target_code, target_name, rewrite_model, max_text_length)
+                    for text in missing
+                )
+            )
+            results.update(zip(missing, singles))
+
+        for text, _, future in pending:
+            if not future.done():
+                future.set_result(results.get(text, ""))
+
+    async def _generate_batch_rewrite(
+        self,
+        texts: list[str],
+        target_code: str,
+        target_name: str,
+        rewrite_model: str,
+        max_text_length: int,
+    ) -> dict[str, str]:
+        """一次请求改写多条文本，返回成功解析的 {原文: 改写结果}。"""
+        prompt = (
+            "你是 TTS 朗读文本本地化器。请把下面 JSON 数组中的每一条原文分别改写为自然、口语、适合语音合成朗读的"
+            f"{target_name}。\n"
+            "要求：\n"
+            f"1. 只输出一个 JSON 字符串数组，共 {len(texts)} 个元素，按原顺序与原文一一对应，不要解释，不要 Markdown。\n"
+            f"{_REWRITE_RULES}\n"
+            f"目标语言代码：{target_code}\n"
+            f"目标语言：{target_name}\n"
+            f"原文：{json.dumps(texts, ensure_ascii=False)}"
+        )
+        self._rewrite_batch_calls += 1
+        self._rewrite_batched_items += len(texts)
+        self.ctx.logger.info(
+            "TTS 合并语言改写 %s 条 (累计 %s 次合并, %s 条)",
+            len(texts),
+            self._rewrite_batch_calls,
+            self._rewrite_batched_items,
+        )
+        try:
+            result = await self.ctx.llm.generate(
+                prompt,
+                model=rewrite_model,
+                temperature=0.2,
+                max_tokens=max(256, min(8192, max_text_length * 2 * len(texts))),
+            )
+        except Exception as exc:
+            self.ctx.logger.warning("TTS 合并语言改写失败，改为逐条请求: %s", exc)
+            return {}
+        if not isinstance(result, dict) or not result.get("success", True):
+            self.ctx.logger.warning("TTS 合并语言改写返回失败，改为逐条请求")
+            return {}
+
+        items = self._parse_batch_rewrite(str(result.get("response") or ""), len(texts))
+        parsed = {text: item for text, item in zip(texts, items) if item}
+        if len(parsed) < len(texts):
+            self.ctx.logger.warning("TTS 合并语言改写有 %s 条无法解析，改为逐条请求", len(texts) - len(parsed))
+        return parsed
+
+    @classmethod
+    def _parse_batch_rewrite(cls, response: str, count: int) -> list[str]:
+        """解析合并改写的结果；数量对不上时视为全部失败，返回空列表。"""
+        body = (response or "").strip()
+        start, end = body.find("["), body.rfind("]")
+        if start < 0 or end <= start:
+            return []
+        try:
+            items = json.loads(body[start : end + 1])
+        except ValueError:
+            return []
+        if not isinstance(items, list) or len(items) != count:
+            return []
+        return [cls._clean_llm_text(item) if isinstance(item, str) else "" for item in items]
 
     @staticmethod
     def _clean_llm_text(text: str) -> str:
@@ -511,6 +4230,57 @@ class GPTSoVITSV2TTSPlugin(MaiBotPlugin):
             cleaned = "\n".join(lines).strip()
         return cleaned.strip().strip('"').strip("'").strip("「」『』“”‘’").strip()
 
+    @staticmethod
+    def _detect_text_language(text: str) -> tuple[str, float]:
+        """按文字类别的占比粗略判断语言，返回 (语言代码, 置信度)；无法判断时返回 ("", 0.0)。"""
+        counts = {name: len(pattern.findall(text)) for name, pattern in _SCRIPT_RES.items()}
+        total = sum(counts.values())
+        if not total:
+            return "", 0.0
+
+        hiragana, han = counts["hiragana"], counts["han"]
+        kana = hiragana + counts["katakana"]
+        if hiragana:
+            # 日语句子几乎都带平假名助词；平假名很少时可能是夹了「の」之类的中文，也可能是汉字很多的日语，
+            # 两者都给低置信度，交给 LLM 判断
+            if hiragana >= 2 and hiragana / total >= 0.2:
+                return "ja", (kana + han) / total * min(1.0, hiragana / total / 0.3)
+            return "zh", 0.4 * han / total
+        if han:
+            # 只有片假名的多半是夹了外来词或日文名的中文；只有几个汉字时也无法区分中文和日文短语
+            share = han / total
+            return "zh", share * (1.0 if han >= 4 else 0.8)
+        if kana:
+            return "ja", kana / total
+        if counts["hangul"]:
+            return "ko", counts["hangul"] / total
+        if counts["cyrillic"]:
+            return "ru", counts["cyrillic"] / total
+
+        words = [word.lower() for word in _SCRIPT_RES["latin"].findall(text)]
+        if any(not word.isascii() for word in words):
+            # 带变音符号的拉丁字母多半是法语、德语等，不当作英语
+            return "", 0.0
+        hinted = sum(1 for word in words if word in _ENGLISH_HINT_WORDS)
+        share = counts["latin"] / total
+        if not hinted:
+            # 没有常见英语虚词时可能是西班牙语、法语等未带变音符号的文本
+            return "en", min(0.6, share)
+        return "en", share * min(1.0, hinted / len(words) / 0.15)
+
+    @staticmethod
+    def _normalize_tts_symbols(text: str, language: str) -> str:
+        """不经过 LLM 时的本地朗读规范化：去掉链接和 Markdown 标记，把常见符号换成读法。"""
+        value = _URL_RE.sub("", text)
+        value = _MARKDOWN_RE.sub("", value)
+        value = value.translate(_FULLWIDTH_DIGITS)
+        percent_words = {"ja": r"\1パーセント", "zh": r"百分之\1", "en": r"\1 percent", "ko": r"\1퍼센트"}
+        if language in percent_words:
+            value = _PERCENT_RE.sub(percent_words[language], value)
+        for symbol, word in _SYMBOL_WORDS.get(language, {}).items():
+            value = value.replace(symbol, word)
+        return re.sub(r"[ \t]{2,}", " ", value).strip()
+
     @staticmethod
     def _normalize_language(language: str) -> tuple[str, str]:
         code = (language or "").strip().lower().replace("_", "-")
@@ -539,61 +4309,91 @@ class GPTSoVITSV2TTSPlugin(MaiBotPlugin):
         }
         return code, names.get(code, code or "配置指定语言")
 
-    async def clean_cache_task(self, force: bool = False) -> None:
-        expire_seconds = int(self.config.cache.expire_minutes) * 60
-        max_size_bytes = int(self.config.cache.max_size_mb) * 1024 * 1024
-        now = time.time()
-
+    async def _rebuild_cache_index(self) -> None:
         try:
+            files = await asyncio.to_thread(AudioCacheIndex.scan, self._cache_dir)
+        except OSError as exc:
+            self.ctx.logger.error("扫描 TTS 缓存目录失败: %s", exc)
             files = []
-            for name in os.listdir(self._cache_dir):
-                path = os.path.join(self._cache_dir, name)
-                if not os.path.isfile(path):
-                    continue
-                try:
-                    stat = os.stat(path)
-                    files.append((path, stat.st_mtime, stat.st_size))
-                except FileNotFoundError:
-                    continue
+        self._cache_index.rebuild(files)
+        self.ctx.logger.info(
+            "TTS 缓存索引已建立: %s 个文件, %.1f MB", len(self._cache_index), self._cache_index.total_bytes / 1048576
+        )
 
-            if force:
-                for path, _, _ in files:
-                    try:
-                        os.remove(path)
-                    except FileNotFoundError:
-                        pass
-                self.ctx.logger.info("TTS 缓存已强制清理")
-                return
+    def _register_cache_file(self, path: str, size: int) -> None:
+        self._cache_index.add(path, size)
+        if self._cache_index.total_bytes > int(self.config.cache.max_size_mb) * 1024 * 1024:
+            self._janitor_wakeup.set()
 
-            alive_files = []
-            for path, mtime, size in files:
-                if now - mtime > expire_seconds:
-                    try:
-                        os.remove(path)
-                        self.ctx.logger.info("删除过期 TTS 缓存: %s", path)
-                    except FileNotFoundError:
-                        pass
-                else:
-                    alive_files.append((path, mtime, size))
+    def _start_cache_janitor(self) -> None:
+        if self._janitor_task is None or self._janitor_task.done():
+            self._janitor_task = asyncio.create_task(self._cache_janitor_loop())
 
-            total_size = sum(size for _, _, size in alive_files)
-            if total_size <= max_size_bytes:
-                return
+    async def _stop_cache_janitor(self) -> None:
+        task, self._janitor_task = self._janitor_task, None
+        if task is None:
+            return
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
 
-            alive_files.sort(key=lambda item: item[1])
-            for path, _, size in alive_files:
-                if total_size <= max_size_bytes:
-                    break
-                try:
-                    os.remove(path)
-                    total_size -= size
-                    self.ctx.logger.info("删除超额 TTS 缓存: %s", path)
-                except FileNotFoundError:
-                    pass
+    async def _cache_janitor_loop(self) -> None:
+        while True:
+            interval = max(1.0, float(self.config.cache.janitor_interval_seconds))
+            # 不用 wait_for：唤醒与取消同时发生时它可能吞掉取消，导致卸载时一直等待清理任务结束
+            wakeup = asyncio.ensure_future(self._janitor_wakeup.wait())
+            try:
+                await asyncio.wait({wakeup}, timeout=interval)
+            finally:
+                wakeup.cancel()
+            self._janitor_wakeup.clear()
+            await self.clean_cache_task()
 
+    async def clean_cache_task(self, force: bool = False) -> None:
+        """执行一轮缓存清理：淘汰决策基于内存索引，删除文件和回写访问时间放到线程中完成。"""
+        try:
+            if force:
+                victims = self._cache_index.drain()
+            else:
+                victims = self._cache_index.collect(
+                    expire_seconds=int(self.config.cache.expire_minutes) * 60,
+                    max_bytes=int(self.config.cache.max_size_mb) * 1024 * 1024,
+                )
+            touched = self._cache_index.take_touched()
+            if not victims and not touched:
+                return
+            removed = await asyncio.to_thread(self._apply_cache_changes, victims, touched)
+            if force:
+                self.ctx.logger.info("TTS 缓存已强制清理: 删除 %s 个文件", removed)
+            elif removed:
+                self.ctx.logger.info(
+                    "TTS 缓存清理: 删除 %s 个文件, 剩余 %s 个 (%.1f MB)",
+                    removed,
+                    len(self._cache_index),
+                    self._cache_index.total_bytes / 1048576,
+                )
         except Exception as exc:
             self.ctx.logger.error("TTS 缓存清理失败: %s", exc)
 
+    @staticmethod
+    def _apply_cache_changes(victims: list[str], touched: list[str]) -> int:
+        removed = 0
+        for path in victims:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        # 把命中时间写回 mtime，重启后重建索引时仍能按最近使用排序
+        for path in touched:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return removed
+
 
 def create_plugin() -> GPTSoVITSV2TTSPlugin:
     return GPTSoVITSV2TTSPlugin()